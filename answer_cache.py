@@ -0,0 +1,83 @@
+# answer_cache.py
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("LITERAGENT_ANSWER_CACHE_THRESHOLD", 0.95))  # similaridade de cosseno mínima
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("LITERAGENT_ANSWER_CACHE_MAX_ENTRIES", 2000))
+ANSWER_CACHE_TTL = int(os.getenv("LITERAGENT_ANSWER_CACHE_TTL", 24 * 3600))            # segundos
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class AnswerCache:
+    """Cache semântico de respostas, em memória, compartilhado entre as sessões.
+
+    Cada resposta é guardada junto com o embedding da pergunta que a gerou e um
+    escopo (modelo, temperatura e versão do índice). Uma consulta reaproveita a
+    resposta da pergunta mais parecida do mesmo escopo, desde que a similaridade
+    de cosseno chegue a `threshold`. Quando o índice muda, o escopo muda junto e as
+    respostas antigas deixam de ser encontradas, saindo do cache por LRU ou por
+    expirarem após `ttl` segundos. `hits` e `misses` contam as consultas.
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, max_entries=ANSWER_CACHE_MAX_ENTRIES,
+                 ttl=ANSWER_CACHE_TTL, clock=time.monotonic):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # id → (escopo, vetor, resposta, criação), do menos para o mais recente
+        self._scopes = {}               # escopo → ids das entradas
+        self._next_id = 0
+
+    def _remove(self, entry_id):
+        scope = self._entries.pop(entry_id)[0]
+        self._scopes[scope].discard(entry_id)
+        if not self._scopes[scope]:
+            del self._scopes[scope]
+
+    def lookup(self, scope, vector):
+        """Retorna a resposta guardada mais parecida com `vector` no escopo, ou None."""
+        query = _normalize(vector)
+        now = self._clock()
+        with self._lock:
+            for entry_id in [i for i in self._scopes.get(scope, ()) if now - self._entries[i][3] > self.ttl]:
+                self._remove(entry_id)
+            entry_ids = list(self._scopes.get(scope, ()))
+            if entry_ids:
+                similarities = np.stack([self._entries[i][1] for i in entry_ids]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._entries.move_to_end(entry_ids[best])
+                    self.hits += 1
+                    return self._entries[entry_ids[best]][2]
+            self.misses += 1
+            return None
+
+    def store(self, scope, vector, value):
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (scope, _normalize(vector), value, self._clock())
+            self._scopes.setdefault(scope, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
@@ -0,0 +1,220 @@
+# batch_qa.py
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from ingest import create_embeddings
+from ingestion import FAISS_INDEX_PATH
+from metrics import metrics
+from rag_chain import create_rag_chain
+from vector_index import index_exists, read_vector_store
+
+# --- CONSTANTES ---
+BATCH_MODEL = os.getenv("LITERAGENT_BATCH_MODEL", "gemini-2.5-flash")
+BATCH_TEMPERATURE = 0.0
+BATCH_CONCURRENCY = int(os.getenv("LITERAGENT_BATCH_CONCURRENCY", 8))   # perguntas respondidas ao mesmo tempo
+BATCH_MAX_RETRIES = 5          # novas tentativas por pergunta, além da primeira
+BACKOFF_BASE = 1.0             # segundos de espera antes da primeira nova tentativa; dobra a cada uma
+BACKOFF_MAX = 60.0
+BATCH_OUTPUT_FILE = "batch_answers.jsonl"
+
+# Erros de status HTTP que valem nova tentativa: 429 é limite de taxa ou cota, os outros são do servidor
+RATE_LIMIT_STATUS = 429
+TRANSIENT_STATUS = {500, 502, 503, 504}
+_RATE_LIMIT_TEXT = re.compile(r"\b429\b|RESOURCE_EXHAUSTED|rate limit", re.IGNORECASE)
+_RETRY_AFTER_TEXT = re.compile(r"retry in ([\d.]+)\s*s|retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE)
+
+logger = logging.getLogger("batch_qa")
+
+# --- NOVAS TENTATIVAS ---
+# O cliente do Gemini já repete algumas vezes por conta própria; o que escapa dele chega
+# aqui. Um 429 em uma pergunta quer dizer que a cota é de todas: a espera vale para o
+# lote inteiro (`RateLimitGate`), e não só para a pergunta que recebeu o erro.
+
+def _errors(error):
+    while error is not None:
+        yield error
+        error = error.__cause__ or error.__context__
+
+def classify_error(error):
+    """"rate_limit", "transient" ou None (erro definitivo, sem nova tentativa)."""
+    for e in _errors(error):
+        status = getattr(e, "code", None) or getattr(e, "status_code", None)
+        if status == RATE_LIMIT_STATUS or _RATE_LIMIT_TEXT.search(str(e)):
+            return "rate_limit"
+        if status in TRANSIENT_STATUS or isinstance(e, (TimeoutError, ConnectionError)):
+            return "transient"
+    return None
+
+def retry_after(error):
+    """Segundos de espera sugeridos pelo serviço na mensagem do erro, se houver."""
+    for e in _errors(error):
+        match = _RETRY_AFTER_TEXT.search(str(e))
+        if match:
+            return float(match.group(1) or match.group(2))
+    return None
+
+def backoff_delay(attempt, hint=None, base=BACKOFF_BASE, maximum=BACKOFF_MAX):
+    """Espera exponencial com jitter antes da tentativa `attempt + 1`, nunca menor que `hint`."""
+    delay = min(maximum, base * 2 ** attempt) * random.uniform(0.5, 1.0)
+    return max(delay, hint or 0.0)
+
+class RateLimitGate:
+    """Ponto de espera comum: depois de um 429, nenhuma pergunta do lote chama o serviço até `pause` passar."""
+
+    def __init__(self):
+        self._resume_at = 0.0
+
+    def pause(self, seconds):
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    async def wait(self):
+        delay = self._resume_at - time.monotonic()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self._resume_at - time.monotonic()  # outra pergunta pode ter estendido a pausa
+
+# --- LOTE ---
+
+def load_questions(path):
+    """Perguntas de `path`: uma por linha ou, em arquivos .jsonl, objetos com a chave "question".
+
+    Os demais campos de cada objeto (id, resposta esperada...) são copiados para a saída.
+    """
+    with open(path, encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    if path.endswith(".jsonl"):
+        return [json.loads(line) for line in lines]
+    return [{"question": line} for line in lines]
+
+def format_source(doc):
+    return {"id": doc.id, "file_name": doc.metadata.get("file_name"), "page": doc.metadata.get("page"),
+            "content": doc.page_content}
+
+async def _ask(chain, question, semaphore, gate, max_retries, registry):
+    """(resultado, erro, tentativas, segundos) de uma pergunta; só um dos dois primeiros não é None."""
+    async with semaphore:
+        start = time.perf_counter()
+        for attempt in range(max_retries + 1):
+            await gate.wait()
+            try:
+                with registry.timer("batch.question") as span:
+                    result = await chain.ainvoke({"input": question, "chat_history": []})
+                    span["items"] = len(result["context"])
+                return result, None, attempt + 1, time.perf_counter() - start
+            except Exception as e:
+                kind = classify_error(e)
+                if kind is None or attempt == max_retries:
+                    return None, e, attempt + 1, time.perf_counter() - start
+                delay = backoff_delay(attempt, retry_after(e))
+                registry.increment("batch.retries")
+                logger.warning("Tentativa %d falhou (%s), nova tentativa em %.1fs: %s", attempt + 1, kind, delay, e)
+                if kind == "rate_limit":
+                    registry.increment("batch.rate_limited")
+                    gate.pause(delay)
+                else:
+                    await asyncio.sleep(delay)
+
+async def answer_questions(chain, questions, output_path=None, concurrency=BATCH_CONCURRENCY,
+                           max_retries=BATCH_MAX_RETRIES, embeddings=None, registry=metrics):
+    """Responde `questions` com `chain`, até `concurrency` perguntas ao mesmo tempo.
+
+    `questions` são textos ou dicionários com a chave "question". Cada pergunta é
+    feita sem histórico. Perguntas repetidas são respondidas uma vez só, e, se
+    `embeddings` souber embedar consultas em lote (`CachedEmbeddings.embed_queries`),
+    todas as perguntas são embedadas antes, em poucas requisições, e a busca de cada
+    uma já encontra o vetor no cache.
+
+    Erros de limite de taxa e do servidor são repetidos até `max_retries` vezes, com
+    espera exponencial; os demais ficam registrados no campo "error" da pergunta.
+    Cada resultado vai para `output_path` (JSONL) assim que fica pronto, com "index"
+    (posição em `questions`); a lista retornada segue a ordem de `questions`.
+    """
+    items = [question if isinstance(question, dict) else {"question": question} for question in questions]
+    groups = {}
+    for i, item in enumerate(items):
+        groups.setdefault(item["question"], []).append(i)
+
+    if embeddings is not None and hasattr(embeddings, "embed_queries"):
+        try:
+            with registry.timer("batch.embed_queries", items=len(groups)):
+                await asyncio.to_thread(embeddings.embed_queries, list(groups))
+        except Exception as e:
+            logger.warning("Falha ao embedar as perguntas em lote; cada busca fará o seu embedding: %s", e)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    gate = RateLimitGate()
+    records = [None] * len(items)
+    output = open(output_path, "w", encoding="utf-8") if output_path else None
+
+    async def answer(question, indices):
+        result, error, attempts, seconds = await _ask(chain, question, semaphore, gate, max_retries, registry)
+        if error is None:
+            fields = {"answer": result["answer"], "sources": [format_source(doc) for doc in result["context"]],
+                      "error": None}
+        else:
+            registry.increment("batch.errors")
+            logger.error("Pergunta sem resposta: %r: %s", question, error)
+            fields = {"answer": None, "sources": [], "error": f"{type(error).__name__}: {error}"}
+        fields.update(attempts=attempts, seconds=round(seconds, 3))
+        for i in indices:
+            records[i] = {"index": i, **items[i], **fields}
+            if output:
+                output.write(json.dumps(records[i], ensure_ascii=False) + "\n")
+                output.flush()
+
+    try:
+        await asyncio.gather(*(answer(question, indices) for question, indices in groups.items()))
+    finally:
+        if output:
+            output.close()
+    return records
+
+def run_batch(chain, questions, **options):
+    """Versão síncrona de `answer_questions`."""
+    return asyncio.run(answer_questions(chain, questions, **options))
+
+# --- LINHA DE COMANDO ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Responde um lote de perguntas com o acervo indexado do LiterAgent.")
+    parser.add_argument("questions", help="Arquivo com uma pergunta por linha, ou .jsonl com a chave \"question\"")
+    parser.add_argument("--output", default=BATCH_OUTPUT_FILE, help="Respostas e fontes, uma por linha (JSONL)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Perguntas respondidas ao mesmo tempo")
+    parser.add_argument("--max-retries", type=int, default=BATCH_MAX_RETRIES, help="Novas tentativas por pergunta")
+    parser.add_argument("--model", default=BATCH_MODEL, help="Modelo Gemini das respostas")
+    parser.add_argument("--temperature", type=float, default=BATCH_TEMPERATURE)
+    parser.add_argument("--index", default=FAISS_INDEX_PATH, help="Pasta do índice")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        parser.error("GOOGLE_API_KEY não configurada (defina no .env ou no ambiente).")
+    if not index_exists(args.index):
+        parser.error(f"Índice não encontrado em {args.index}; sincronize o acervo antes (ingest.py).")
+
+    questions = load_questions(args.questions)
+    embeddings = create_embeddings(api_key)
+    vector_store = read_vector_store(args.index, embeddings, read_only=True)
+    chain = create_rag_chain(vector_store, api_key, args.temperature, args.model)
+    records = run_batch(chain, questions, output_path=args.output, concurrency=args.concurrency,
+                        max_retries=args.max_retries, embeddings=embeddings)
+    vector_store.docstore.close()
+
+    failed = sum(1 for record in records if record["error"])
+    logger.info("%d pergunta(s) respondida(s), %d com erro; resultados em %s", len(records) - failed, failed, args.output)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+# benchmark.py
+
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from fakes import FakeChatModel, FakeDriveService, add_synthetic_corpus, synthetic_text
+from ingest import run_sync
+from ingestion import read_json, write_json_atomic
+from rag_chain import build_rag_chain
+from retrieval import HybridRetriever
+from vector_index import read_vector_store
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# --- CONSTANTES ---
+BENCHMARK_SIZES = (10, 100, 1000, 10000)    # PDFs no acervo sintético
+BENCHMARK_RESULTS_FILE = "benchmark_results.json"
+BENCHMARK_QUERIES = 50                      # perguntas por medição de latência
+EMBEDDING_SIZE = 768                        # mesma dimensão do text-embedding-004
+REGRESSION_TOLERANCE = 0.2                  # piora relativa tolerada antes de apontar regressão
+CORPUS_FOLDER = "acervo"
+COLD_START_TIMEOUT = 600                    # segundos até desistir da medição de inicialização
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "literagent.py")
+
+# Roda a aplicação uma vez, em um interpretador novo, e mede até a página estar desenhada.
+# O processo sai com os._exit assim que o resultado é impresso: a thread que carrega o
+# índice em segundo plano ainda pode estar rodando, e o encerramento normal do
+# interpretador com ela no meio do carregamento pode falhar.
+COLD_START_SCRIPT = """
+import json, os, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1], default_timeout=300).run()
+print(json.dumps({"seconds": time.perf_counter() - start, "errors": [str(e.value) for e in app.exception]}), flush=True)
+os._exit(0)
+"""
+
+# Métricas em que um valor maior é melhor; nas demais, menor é melhor
+HIGHER_IS_BETTER = {"files_per_s", "chunks_per_s"}
+
+# --- MEDIÇÕES ---
+# Tudo roda sem rede: o Drive é um `FakeDriveService` com PDFs sintéticos, os embeddings
+# são determinísticos e o modelo de chat só espera a latência configurada. O que se mede
+# é o próprio LiterAgent: download, extração, chunking, índice, busca e a chain.
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, round(fraction * (len(values) - 1)))]
+
+def _peak_rss_mb(who):
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _latencies_ms(fn, inputs):
+    latencies = []
+    for value in inputs:
+        start = time.perf_counter()
+        fn(value)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def measure_cold_start(workdir):
+    """Segundos até a primeira renderização completa da aplicação, em um processo novo, com o índice de `workdir`.
+
+    Inclui os imports e a primeira execução do script; o índice e a chain continuam
+    carregando em segundo plano.
+    """
+    env = {**os.environ, "GOOGLE_API_KEY": "benchmark", "PYTHONPATH": os.path.dirname(APP_FILE),
+           "PYTHONWARNINGS": "ignore"}
+    result = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT, APP_FILE], cwd=workdir, env=env,
+                            capture_output=True, text=True, timeout=COLD_START_TIMEOUT)
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        raise RuntimeError(f"A medição da inicialização falhou (código {result.returncode}):\n{result.stderr[-4000:]}")
+    output = json.loads(lines[-1])
+    if output["errors"]:
+        raise RuntimeError(f"A aplicação falhou ao iniciar: {output['errors']}")
+    return output["seconds"]
+
+def measure(size, workdir, queries=BENCHMARK_QUERIES, llm_latency=0.0, extract_workers=None):
+    """Sincroniza um acervo sintético de `size` PDFs em `workdir` e mede o desempenho.
+
+    Retorna as métricas: vazão da sincronização, tempo de carga do índice, latência
+    da busca híbrida e da resposta completa (p50/p99, em ms), tempo de inicialização
+    da aplicação e o pico de memória.
+    """
+    previous_dir = os.getcwd()
+    os.chdir(workdir)  # manifesto, lock e status da sincronização ficam em `workdir`
+    try:
+        drive = FakeDriveService()
+        add_synthetic_corpus(drive, CORPUS_FOLDER, size)
+        embeddings = DeterministicFakeEmbedding(size=EMBEDDING_SIZE)
+
+        start = time.perf_counter()
+        summary = run_sync(CORPUS_FOLDER, embeddings, service_factory=lambda: drive, index_path="faiss_index",
+                           extract_workers=extract_workers)
+        sync_seconds = time.perf_counter() - start
+
+        gc.collect()
+        start = time.perf_counter()
+        vector_store = read_vector_store("faiss_index", embeddings, read_only=True)
+        index_load_ms = (time.perf_counter() - start) * 1000
+
+        questions = [synthetic_text(f"pergunta-{i}", 10) for i in range(queries)]
+        retriever = HybridRetriever(vector_store=vector_store)
+        retrieval = _latencies_ms(retriever.invoke, questions)
+        llm = FakeChatModel(responses=["Resposta sintética."], latency=llm_latency)
+        chain = build_rag_chain(llm, FakeChatModel(responses=["Pergunta reescrita."]), retriever)
+        answers = _latencies_ms(lambda question: chain.invoke({"input": question, "chat_history": []}), questions)
+        vector_store.docstore.close()
+        cold_start_ms = measure_cold_start(workdir) * 1000
+    finally:
+        os.chdir(previous_dir)
+
+    return {
+        "files": summary["processed"],
+        "chunks": summary["chunks"],
+        "failed": len(summary["failed"]),
+        "sync_s": round(sync_seconds, 3),
+        "files_per_s": round(summary["processed"] / sync_seconds, 2),
+        "chunks_per_s": round(summary["chunks"] / sync_seconds, 2),
+        "index_load_ms": round(index_load_ms, 2),
+        "retrieval_p50_ms": round(statistics.median(retrieval), 2),
+        "retrieval_p99_ms": round(_percentile(retrieval, 0.99), 2),
+        "answer_p50_ms": round(statistics.median(answers), 2),
+        "answer_p99_ms": round(_percentile(answers, 0.99), 2),
+        "cold_start_ms": round(cold_start_ms, 1),
+        "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        "peak_rss_children_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+    }
+
+def _measure_in_new_process(size, **options):
+    """Mede em um processo novo, para que o pico de memória seja só o desse tamanho de acervo."""
+    workdir = tempfile.mkdtemp(prefix=f"literagent-bench-{size}-")
+    try:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            return pool.submit(measure, size, workdir, **options).result()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# --- RESULTADOS ---
+
+def compare_results(previous, current, tolerance=REGRESSION_TOLERANCE):
+    """Lista as métricas que pioraram mais que `tolerance` em relação à execução anterior.
+
+    Cada item é (tamanho, métrica, valor anterior, valor atual). Só entram os tamanhos
+    e as métricas presentes nas duas execuções.
+    """
+    regressions = []
+    for size, metrics in current.items():
+        for name, value in metrics.items():
+            old = previous.get(size, {}).get(name)
+            if not old or value is None or name in ("files", "chunks", "failed", "sync_s"):
+                continue
+            change = (old - value) / old if name in HIGHER_IS_BETTER else (value - old) / old
+            if change > tolerance:
+                regressions.append((size, name, old, value))
+    return regressions
+
+def load_runs(path=BENCHMARK_RESULTS_FILE):
+    data = read_json(path)
+    return data["runs"] if data else []
+
+def save_run(results, options, path=BENCHMARK_RESULTS_FILE):
+    """Acrescenta uma execução ao histórico em `path`."""
+    runs = load_runs(path)
+    runs.append({
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "options": options,
+        "results": results,
+    })
+    write_json_atomic(path, {"runs": runs})
+
+def _print_table(results):
+    columns = ["files_per_s", "chunks_per_s", "index_load_ms", "retrieval_p50_ms", "retrieval_p99_ms",
+               "answer_p50_ms", "cold_start_ms", "peak_rss_mb"]
+    print(f"{'PDFs':>7} " + " ".join(f"{name:>16}" for name in columns))
+    for size, metrics in results.items():
+        print(f"{size:>7} " + " ".join(f"{str(metrics[name]):>16}" for name in columns))
+
+# --- LINHA DE COMANDO ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede o desempenho do LiterAgent com um acervo sintético, sem rede.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(BENCHMARK_SIZES), help="Quantidades de PDFs a medir")
+    parser.add_argument("--queries", type=int, default=BENCHMARK_QUERIES, help="Perguntas por medição de latência")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Segundos que o modelo de chat falso espera")
+    parser.add_argument("--extract-workers", type=int, help="Processos de extração de texto (padrão: um por núcleo)")
+    parser.add_argument("--output", default=BENCHMARK_RESULTS_FILE, help="Histórico de resultados (JSON)")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--fail-on-regression", action="store_true", help="Sai com código 1 se alguma métrica piorar")
+    args = parser.parse_args(argv)
+
+    options = {"queries": args.queries, "llm_latency": args.llm_latency, "extract_workers": args.extract_workers}
+    results = {}
+    for size in args.sizes:
+        print(f"Medindo {size} PDF(s)...", flush=True)
+        results[str(size)] = _measure_in_new_process(size, **options)
+    _print_table(results)
+
+    # Só faz sentido comparar com uma execução feita com as mesmas opções
+    previous = [run for run in load_runs(args.output) if run["options"] == options]
+    regressions = compare_results(previous[-1]["results"], results, args.tolerance) if previous else []
+    save_run(results, options, args.output)
+    for size, name, old, new in regressions:
+        print(f"REGRESSÃO: {size} PDFs, {name}: {old} -> {new}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+# chunk_store.py
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from collections.abc import Mapping
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+CHUNK_STORE_FILE = "chunks.sqlite"        # chunk store dos índices gravados antes do ponteiro abaixo
+CHUNK_STORE_POINTER = "chunks.current"     # nome do arquivo do chunk store publicado
+_CHUNK_STORE_NAME = re.compile(r"chunks(-[0-9a-f]+)?\.sqlite(-wal|-shm)?$")
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"   # ignora maiúsculas e acentos
+
+# Palavras frequentes demais para ajudar na busca por palavras-chave
+STOPWORDS = {
+    "de", "da", "do", "das", "dos", "em", "na", "no", "nas", "nos", "um", "uma", "uns", "umas",
+    "para", "por", "com", "sem", "que", "se", "ao", "aos", "as", "os", "ou", "mas", "como",
+    "qual", "quais", "quem", "onde", "quando", "sobre", "seu", "sua", "seus", "suas", "foi", "ser",
+    "the", "of", "and", "to", "in", "is", "what", "who", "how", "which", "about",
+}
+
+def published_chunk_store(index_path):
+    """Caminho do chunk store publicado em `index_path`, ou None se não houver."""
+    try:
+        with open(os.path.join(index_path, CHUNK_STORE_POINTER)) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        name = CHUNK_STORE_FILE
+    path = os.path.join(index_path, name)
+    return path if os.path.exists(path) else None
+
+def _publish(index_path, path):
+    """Aponta o ponteiro para `path` (troca atômica) e apaga os chunk stores anteriores."""
+    tmp_path = os.path.join(index_path, CHUNK_STORE_POINTER + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write(os.path.basename(path))
+    os.replace(tmp_path, os.path.join(index_path, CHUNK_STORE_POINTER))
+    current = os.path.basename(path)
+    for name in os.listdir(index_path):
+        if _CHUNK_STORE_NAME.match(name) and not name.startswith(current):
+            try:
+                os.remove(os.path.join(index_path, name))
+            except OSError:
+                pass  # ainda aberto por outro processo (Windows); sai na próxima publicação
+
+class ChunkStore(Docstore, AddableMixin):
+    """Docstore em SQLite: o texto e os metadados de um chunk só são lidos quando ele é retornado por uma busca.
+
+    Guarda também a tabela posição → id usada pelo índice FAISS e um pequeno
+    conjunto de metadados (por exemplo, qual arquivo de índice corresponde aos
+    chunks gravados). No modo de escrita as alterações ficam em uma transação
+    aberta até `commit()`. No modo `read_only`, a conexão mantém uma transação de
+    leitura aberta: enquanto o objeto viver, ele enxerga o mesmo retrato do banco,
+    coerente com o índice carregado junto, mesmo que uma sincronização grave por cima.
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self._publish_in = None
+        self._lock = threading.Lock()
+        if read_only:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False, isolation_level=None)
+            self._conn.execute("BEGIN")
+            self._conn.execute("SELECT COUNT(*) FROM meta").fetchone()  # fixa o retrato do banco
+            return
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, content TEXT NOT NULL, metadata TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS positions (position INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        if not self._has_keyword_index():
+            self._create_keyword_index()
+        self._conn.commit()
+
+    def _has_keyword_index(self):
+        return self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'").fetchone() is not None
+
+    def _create_keyword_index(self):
+        # Índice invertido (FTS5) sobre o próprio texto dos chunks, mantido por gatilhos:
+        # cresce junto com o índice FAISS a cada sincronização, sem duplicar o texto.
+        self._conn.executescript(f"""
+            CREATE VIRTUAL TABLE chunks_fts USING fts5(
+                content, content='chunks', content_rowid='rowid', tokenize='{FTS_TOKENIZER}');
+            CREATE TRIGGER chunks_fts_insert AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts (rowid, content) VALUES (new.rowid, new.content);
+            END;
+            CREATE TRIGGER chunks_fts_delete AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+            END;
+            INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild');
+        """)
+
+    @classmethod
+    def create(cls, index_path):
+        """Cria um chunk store vazio, em um arquivo novo de `index_path`.
+
+        O chunk store publicado continua intacto, e quem o lê não é afetado, até o
+        primeiro `commit()` do novo: só então o ponteiro passa a indicar o novo arquivo
+        (uma troca atômica, como a do arquivo do índice FAISS) e o anterior é apagado.
+        """
+        store = cls(os.path.join(index_path, f"chunks-{uuid.uuid4().hex[:12]}.sqlite"))
+        store._publish_in = index_path
+        return store
+
+    @classmethod
+    def open_published(cls, index_path, read_only=False):
+        """Abre o chunk store publicado em `index_path`."""
+        for attempt in range(3):
+            path = published_chunk_store(index_path)
+            if path is None:
+                raise FileNotFoundError(f"Nenhum chunk store em {index_path}")
+            try:
+                return cls(path, read_only=read_only)
+            except sqlite3.OperationalError:
+                if attempt == 2:
+                    raise  # senão, foi substituído entre a leitura do ponteiro e a abertura: tenta de novo
+
+    # --- Interface de Docstore ---
+
+    def add(self, texts):
+        rows = [(chunk_id, doc.page_content, json.dumps(doc.metadata)) for chunk_id, doc in texts.items()]
+        with self._lock:
+            try:
+                self._conn.executemany("INSERT INTO chunks (id, content, metadata) VALUES (?, ?, ?)", rows)
+            except sqlite3.IntegrityError as e:
+                raise ValueError(f"Tried to add ids that already exist: {e}")
+
+    def search(self, search):
+        with self._lock:
+            row = self._conn.execute("SELECT content, metadata FROM chunks WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def delete(self, ids):
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in ids])
+
+    def documents(self):
+        """Percorre todos os chunks armazenados."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, content, metadata FROM chunks").fetchall()
+        for chunk_id, content, metadata in rows:
+            yield Document(id=chunk_id, page_content=content, metadata=json.loads(metadata))
+
+    # --- Busca por palavras-chave ---
+
+    def keyword_search(self, query, k):
+        """Ids dos `k` chunks mais relevantes para os termos de `query`, por BM25.
+
+        Qualquer termo basta para um chunk entrar no resultado; o BM25 favorece os que
+        têm mais termos, e os mais raros no acervo. Retorna uma lista vazia se o chunk
+        store for de uma versão sem índice de palavras-chave.
+        """
+        terms = [term for term in dict.fromkeys(re.findall(r"\w+", query.lower()))
+                 if len(term) > 1 and term not in STOPWORDS]
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        with self._lock:
+            if not self._has_keyword_index():
+                return []
+            rows = self._conn.execute(
+                "SELECT chunks.id FROM chunks_fts JOIN chunks ON chunks.rowid = chunks_fts.rowid"
+                " WHERE chunks_fts MATCH ? ORDER BY rank LIMIT ?", (match, k)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    # --- Posições do índice e metadados ---
+
+    def get_chunk_id(self, position):
+        with self._lock:
+            row = self._conn.execute("SELECT chunk_id FROM positions WHERE position = ?", (position,)).fetchone()
+        return row[0] if row else None
+
+    def count_positions(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+
+    def load_positions(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT position, chunk_id FROM positions"))
+
+    def write_positions(self, index_to_docstore_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM positions")
+            self._conn.executemany("INSERT INTO positions (position, chunk_id) VALUES (?, ?)",
+                                   ((int(pos), chunk_id) for pos, chunk_id in index_to_docstore_id.items()))
+
+    def get_meta(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+            if self._publish_in is not None:
+                _publish(self._publish_in, self.path)
+                self._publish_in = None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class LazyPositions(Mapping):
+    """Mapeamento posição → id do chunk lido sob demanda do chunk store.
+
+    Substitui o dicionário `index_to_docstore_id` do FAISS no modo somente leitura,
+    para que a inicialização não precise carregar um id por vetor.
+    """
+
+    def __init__(self, store):
+        self._store = store
+        self._len = store.count_positions()
+
+    def __getitem__(self, position):
+        chunk_id = self._store.get_chunk_id(int(position))
+        if chunk_id is None:
+            raise KeyError(position)
+        return chunk_id
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return iter(range(self._len))
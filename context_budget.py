@@ -0,0 +1,114 @@
+# context_budget.py
+
+import logging
+import os
+import re
+
+from langchain_core.documents import Document
+from langchain_core.messages import trim_messages
+
+from chunk_store import STOPWORDS
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("LITERAGENT_CONTEXT_TOKEN_BUDGET", 2000))  # trechos recuperados
+HISTORY_TOKEN_BUDGET = int(os.getenv("LITERAGENT_HISTORY_TOKEN_BUDGET", 1000))  # histórico da conversa
+CHARS_PER_TOKEN = 4        # aproximação para textos em português e inglês
+MAX_OVERLAP_CHARS = 400    # o chunking usa 200 caracteres de sobreposição
+MIN_OVERLAP_CHARS = 20     # coincidências menores são acaso, não sobreposição do chunking
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+def estimate_tokens(text):
+    """Estimativa local do número de tokens, sem chamar a API do modelo."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def count_message_tokens(messages):
+    return sum(estimate_tokens(message.content) for message in messages)
+
+def _overlap(previous, text):
+    """Tamanho do maior final de `previous` que também começa `text` (0 se não houver).
+
+    Só conta como sobreposição um trecho de pelo menos `MIN_OVERLAP_CHARS` caracteres
+    que termina entre duas palavras: chunks vizinhos nem sempre se sobrepõem (o
+    chunking não repete nada depois de um parágrafo longo), e uma coincidência curta
+    como "a" cortaria o começo de uma palavra.
+    """
+    for size in range(min(len(previous), len(text), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if size < len(text) and text[size - 1].isalnum() and text[size].isalnum():
+            continue  # terminaria no meio de uma palavra
+        if previous.endswith(text[:size]):
+            return size
+    return 0
+
+def remove_chunk_overlap(documents):
+    """Remove de cada chunk o texto que ele repete do chunk anterior do mesmo arquivo.
+
+    Só chunks vizinhos (`chunk_index` consecutivos) se sobrepõem; a ordem dos
+    documentos é mantida.
+    """
+    by_position = {(doc.metadata.get("file_id"), doc.metadata.get("chunk_index")): doc for doc in documents}
+    result = []
+    for doc in documents:
+        file_id, chunk_index = doc.metadata.get("file_id"), doc.metadata.get("chunk_index")
+        previous = by_position.get((file_id, chunk_index - 1)) if chunk_index is not None else None
+        size = _overlap(previous.page_content, doc.page_content) if previous is not None else 0
+        if size:
+            doc = Document(id=doc.id, page_content=doc.page_content[size:].lstrip(), metadata=doc.metadata)
+        result.append(doc)
+    return result
+
+def trim_to_relevant_sentences(text, query, max_tokens):
+    """Reduz `text` às frases que mais compartilham termos com `query`, até `max_tokens`.
+
+    As frases escolhidas voltam na ordem original; o texto não é alterado se já couber.
+    Se nenhuma frase inteira couber (versos, tabelas e OCR costumam não ter pontuação),
+    o texto é cortado no limite, para o trecho não sumir do contexto.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    terms = {term for term in re.findall(r"\w+", query.lower()) if term not in STOPWORDS}
+    sentences = _SENTENCE_END.split(text)
+    scores = [len(terms.intersection(re.findall(r"\w+", sentence.lower()))) for sentence in sentences]
+    kept, used = set(), 0
+    for i in sorted(range(len(sentences)), key=lambda i: (-scores[i], i)):
+        tokens = estimate_tokens(sentences[i]) + 1
+        if used + tokens > max_tokens:
+            continue
+        kept.add(i)
+        used += tokens
+    if not kept:
+        return text[:max_tokens * CHARS_PER_TOKEN].rstrip()
+    return " ".join(sentences[i] for i in sorted(kept))
+
+def fit_context(documents, query, max_tokens=CONTEXT_TOKEN_BUDGET):
+    """Remove sobreposições e corta os trechos até caberem em `max_tokens`.
+
+    Os documentos vêm em ordem de relevância; o orçamento que um trecho curto não usa
+    passa para os seguintes.
+    """
+    documents = remove_chunk_overlap(documents)
+    if sum(estimate_tokens(doc.page_content) for doc in documents) <= max_tokens:
+        return documents
+    result = []
+    remaining = max_tokens
+    for position, doc in enumerate(documents):
+        share = remaining // (len(documents) - position)
+        text = trim_to_relevant_sentences(doc.page_content, query, share)
+        if text:
+            result.append(Document(id=doc.id, page_content=text, metadata=doc.metadata))
+        remaining -= estimate_tokens(text)
+    return result
+
+def fit_history(messages, max_tokens=HISTORY_TOKEN_BUDGET):
+    """Mantém só as mensagens mais recentes do histórico que cabem em `max_tokens`."""
+    if count_message_tokens(messages) <= max_tokens:
+        return messages
+    return trim_messages(messages, max_tokens=max_tokens, token_counter=count_message_tokens,
+                         strategy="last", start_on="human")
+
+def log_prompt_tokens(prompt_value):
+    """Registra o tamanho estimado do prompt enviado ao modelo e o repassa sem alterações."""
+    messages = prompt_value.to_messages()
+    logger.info("prompt: ~%d tokens (%d mensagens)", count_message_tokens(messages), len(messages))
+    return prompt_value
@@ -0,0 +1,161 @@
+# embedding_cache.py
+
+import hashlib
+import inspect
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_FILE = "embedding_cache.sqlite"
+EMBEDDING_CACHE_MAX_ENTRIES = 1_000_000   # ~3 GB com vetores de 768 dimensões
+EMBEDDING_BATCH_SIZE = 100                # limite de textos por requisição da API de embeddings
+EMBEDDING_TOUCH_INTERVAL = 3600           # segundos: um acerto só regrava `last_used` mais velho que isso
+_SQL_BATCH = 500                          # parâmetros por consulta SQL
+
+def _hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings com cache persistente em SQLite, endereçado por (modelo, hash do texto).
+
+    Textos já vistos nunca voltam para a API, mesmo que o arquivo de origem tenha mudado
+    ou o índice seja reconstruído do zero; só os que faltam são enviados, em lotes
+    completos. Quando o cache passa de `max_entries`, os vetores usados há mais tempo
+    são descartados. `hits` e `misses` contam os textos atendidos por cada caminho.
+
+    A data de uso de um vetor só é atualizada quando tem mais de `touch_interval`
+    segundos: ler do cache não vira uma escrita no SQLite a cada consulta, e a ordem de
+    descarte fica precisa o bastante.
+    """
+
+    def __init__(self, embeddings, model_name, path=EMBEDDING_CACHE_FILE,
+                 max_entries=EMBEDDING_CACHE_MAX_ENTRIES, batch_size=EMBEDDING_BATCH_SIZE,
+                 touch_interval=EMBEDDING_TOUCH_INTERVAL):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _lookup(self, model, hashes):
+        found = {}
+        stale = []
+        now = time.time()
+        for start in range(0, len(hashes), _SQL_BATCH):
+            batch = hashes[start:start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT hash, vector, last_used FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                [model, *batch],
+            ).fetchall()
+            for h, vector, last_used in rows:
+                found[h] = np.frombuffer(vector, dtype=np.float32).tolist()
+                if last_used < now - self.touch_interval:
+                    stale.append(h)
+        if stale:
+            self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                                   [(now, model, h) for h in stale])
+        return found
+
+    def _store(self, model, items):
+        now = time.time()
+        # Outra thread ou processo pode já ter guardado o mesmo texto: só as linhas novas contam
+        added = self._conn.executemany(
+            "INSERT OR IGNORE INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?)",
+            [(model, h, np.asarray(vector, dtype=np.float32).tobytes(), now) for h, vector in items],
+        ).rowcount
+        if added < len(items):
+            self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                                   [(now, model, h) for h, _ in items])
+        self._entries += added
+        if self._entries > self.max_entries:
+            # O arquivo é compartilhado entre processos: recontado antes de descartar
+            self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if self._entries > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN"
+                " (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (self._entries - self.max_entries,),
+            )
+            self._entries = self.max_entries
+
+    def _embed_cached(self, model, texts, embed_fn):
+        hashes = [_hash(text) for text in texts]
+        with self._lock:
+            found = self._lookup(model, list(dict.fromkeys(hashes)))
+            self._conn.commit()
+            missing = {}
+            for h, text in zip(hashes, texts):
+                if h not in found:
+                    missing.setdefault(h, text)
+            # A mesma instância atende todas as sessões da aplicação e as threads do lote
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        missing = list(missing.items())
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            vectors = embed_fn([text for _, text in batch])
+            # Arredonda para float32 já na primeira vez, como o vetor que vem do cache
+            computed = [(h, np.asarray(vector, dtype=np.float32).tolist()) for (h, _), vector in zip(batch, vectors)]
+            found.update(computed)
+            with self._lock:
+                self._store(model, computed)
+                self._conn.commit()
+        return [found[h] for h in hashes]
+
+    def embed_documents(self, texts):
+        return self._embed_cached(self.model_name, texts, self.embeddings.embed_documents)
+
+    def cached_documents(self, texts):
+        """Vetores de `texts` que já estão no cache (None nos que faltam), sem chamar a API."""
+        hashes = [_hash(text) for text in texts]
+        with self._lock:
+            found = self._lookup(self.model_name, list(dict.fromkeys(hashes)))
+            self._conn.commit()
+        return [found.get(h) for h in hashes]
+
+    def embed_query(self, text):
+        # Consultas usam outro tipo de tarefa no modelo e geram vetores diferentes
+        return self._embed_cached(f"{self.model_name}#query", [text],
+                                  lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+    def embed_queries(self, texts):
+        """Embeddings de várias consultas, em lotes de `batch_size` por requisição.
+
+        Os vetores vão para o mesmo cache de `embed_query`: depois de embedar um lote
+        de perguntas assim, a busca de cada uma não chama mais a API.
+        """
+        return self._embed_cached(f"{self.model_name}#query", texts, self._embed_query_batch)
+
+    def _embed_query_batch(self, texts):
+        if "task_type" in inspect.signature(self.embeddings.embed_documents).parameters:
+            return self.embeddings.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+        return [self.embeddings.embed_query(text) for text in texts]
+
+    def stats(self):
+        with self._lock:
+            hits, misses, entries = self.hits, self.misses, self._entries
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
@@ -0,0 +1,241 @@
+# fakes.py
+
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import fitz  # PyMuPDF
+import httplib2
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from gdrive import FOLDER_MIME_TYPE, PDF_MIME_TYPE
+
+# Vocabulário do acervo sintético: nomes e termos que a busca por palavras-chave encontra
+WORDS = (
+    "capitu bentinho escobar machado assis romance narrador ciúme memória casamento seminário "
+    "alienista bacamarte itaguaí loucura ciência vereador barbeiro revolta casa verde "
+    "sertão jagunço riobaldo diadorim travessia vereda amor guerra destino palavra "
+    "cidade campo viagem carta família herança segredo tempo noite rio mar pedra livro"
+).split()
+
+class _Request:
+    def __init__(self, fn, **kwargs):
+        self._fn = fn
+        self._kwargs = kwargs
+
+    def execute(self, num_retries=0):
+        return self._fn(**self._kwargs)
+
+class FakeDriveService:
+    """Serviço do Google Drive em memória, para testes e benchmarks sem rede.
+
+    Implementa só o que o LiterAgent usa da API v3: `files().list` (com filtro por
+    pasta-mãe, lixeira e tipo) e `changes().getStartPageToken`/`changes().list`.
+    Cada alteração feita pelos métodos `add_*`, `update_file`, `move`, `trash` e
+    `delete` entra no log de alterações, como no Drive de verdade. `calls` conta as
+    requisições por método e `page_sizes` registra o `pageSize` de cada listagem.
+
+    `files().get_media` serve o conteúdo passado em `add_file` ou, se não houver,
+    o gerado por `content_factory(file_id)`, em partes, como o download real.
+    """
+
+    def __init__(self, content_factory=None):
+        self.items = {}
+        self.contents = {}
+        self.content_factory = content_factory
+        self.log = []
+        self.calls = Counter()
+        self.page_sizes = []
+        self._clock = datetime(2024, 1, 1)
+        self._lock = threading.Lock()
+
+    # --- Alterações na pasta ---
+
+    def _touch(self, item_id):
+        self._clock += timedelta(seconds=1)
+        self.log.append(item_id)
+        return self._clock.isoformat(timespec="milliseconds") + "Z"
+
+    def add_folder(self, folder_id, parent=None, name=None):
+        self.items[folder_id] = {"id": folder_id, "name": name or folder_id, "mimeType": FOLDER_MIME_TYPE,
+                                 "parents": [parent] if parent else [], "trashed": False}
+        self.items[folder_id]["modifiedTime"] = self._touch(folder_id)
+
+    def add_file(self, file_id, parent, name=None, mime_type=PDF_MIME_TYPE, content=None):
+        self.items[file_id] = {"id": file_id, "name": name or f"{file_id}.pdf", "mimeType": mime_type,
+                               "parents": [parent], "trashed": False}
+        if content is not None:
+            self.contents[file_id] = content
+        self.items[file_id]["modifiedTime"] = self._touch(file_id)
+
+    def update_file(self, file_id, content=None):
+        if content is not None:
+            self.contents[file_id] = content
+        self.items[file_id]["modifiedTime"] = self._touch(file_id)
+
+    def move(self, item_id, new_parent):
+        self.items[item_id]["parents"] = [new_parent]
+        self._touch(item_id)
+
+    def trash(self, item_id):
+        self.items[item_id]["trashed"] = True
+        self._touch(item_id)
+
+    def delete(self, item_id):
+        del self.items[item_id]
+        self._touch(item_id)
+
+    # --- API ---
+
+    def files(self):
+        return _FakeFiles(self)
+
+    def changes(self):
+        return _FakeChanges(self)
+
+class _FakeFiles:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, q, pageSize=100, fields=None, pageToken=None):
+        return _Request(self._list_files, q=q, page_size=pageSize, page_token=pageToken)
+
+    def _list_files(self, q, page_size, page_token):
+        service = self._service
+        parent = re.search(r"'([^']+)' in parents", q).group(1)
+        mime_types = re.findall(r"mimeType='([^']+)'", q)
+        with service._lock:
+            service.calls["files.list"] += 1
+            service.page_sizes.append(page_size)
+            matches = [
+                {key: item[key] for key in ("id", "name", "mimeType", "modifiedTime")}
+                for item in service.items.values()
+                if parent in item["parents"]
+                and not ("trashed=false" in q and item["trashed"])
+                and (not mime_types or item["mimeType"] in mime_types)
+            ]
+        return _page(matches, "files", page_size, page_token)
+
+    def get_media(self, fileId):
+        return _FakeMediaRequest(self._service, fileId)
+
+class _FakeMediaRequest:
+    """Requisição de download no formato que `MediaIoBaseDownload` espera (uri, headers, http)."""
+
+    def __init__(self, service, file_id):
+        self.uri = f"fake://drive/files/{file_id}?alt=media"
+        self.headers = {}
+        self.http = self
+        self._service = service
+        self._file_id = file_id
+
+    def request(self, uri, method="GET", headers=None, **kwargs):
+        service = self._service
+        with service._lock:
+            service.calls["files.get_media"] += 1
+            content = service.contents.get(self._file_id)
+        if content is None:
+            content = service.content_factory(self._file_id)
+        first, last = map(int, re.match(r"bytes=(\d+)-(\d+)", headers["range"]).groups())
+        part = content[first:last + 1]
+        response = httplib2.Response({"status": 206, "content-range": f"bytes {first}-{first + len(part) - 1}/{len(content)}"})
+        return response, part
+
+class _FakeChanges:
+    def __init__(self, service):
+        self._service = service
+
+    def getStartPageToken(self):
+        return _Request(self._start_page_token)
+
+    def _start_page_token(self):
+        with self._service._lock:
+            self._service.calls["changes.getStartPageToken"] += 1
+            return {"startPageToken": str(len(self._service.log))}
+
+    def list(self, pageToken, pageSize=100, includeRemoved=True, spaces=None, fields=None):
+        return _Request(self._list_changes, page_token=pageToken, page_size=pageSize)
+
+    def _list_changes(self, page_token, page_size):
+        service = self._service
+        with service._lock:
+            service.calls["changes.list"] += 1
+            service.page_sizes.append(page_size)
+            start = int(page_token)
+            item_ids = service.log[start:start + page_size]
+            changes = []
+            for item_id in item_ids:
+                item = service.items.get(item_id)
+                if item is None:
+                    changes.append({"fileId": item_id, "removed": True})
+                else:
+                    changes.append({"fileId": item_id, "removed": False, "file": dict(item)})
+            end = start + len(item_ids)
+            result = {"changes": changes}
+            if end < len(service.log):
+                result["nextPageToken"] = str(end)
+            else:
+                result["newStartPageToken"] = str(end)
+            return result
+
+def _page(items, key, page_size, page_token):
+    start = int(page_token or 0)
+    result = {key: items[start:start + page_size]}
+    if start + page_size < len(items):
+        result["nextPageToken"] = str(start + page_size)
+    return result
+
+# --- ACERVO SINTÉTICO ---
+
+def synthetic_text(seed, words=400):
+    """Texto pseudoaleatório e reprodutível, em frases, a partir do vocabulário `WORDS`."""
+    rng = random.Random(seed)
+    sentences = []
+    while words > 0:
+        size = min(words, rng.randint(6, 18))
+        sentences.append(" ".join(rng.choice(WORDS) for _ in range(size)).capitalize() + ".")
+        words -= size
+    return " ".join(sentences)
+
+def synthetic_pdf(seed, pages=3, words_per_page=400):
+    """PDF com `pages` páginas de texto sintético; o mesmo `seed` gera sempre o mesmo arquivo."""
+    with fitz.open() as doc:
+        for number in range(pages):
+            page = doc.new_page()
+            page.insert_textbox(page.rect + (54, 54, -54, -54), synthetic_text(f"{seed}:{number}", words_per_page), fontsize=9)
+        return doc.tobytes()
+
+def add_synthetic_corpus(service, root, count, files_per_folder=100, pages=3):
+    """Cria em `service` uma pasta `root` com `count` PDFs sintéticos, distribuídos em subpastas.
+
+    O conteúdo dos arquivos só é gerado quando eles são baixados.
+    """
+    service.add_folder(root)
+    service.content_factory = lambda file_id: synthetic_pdf(file_id, pages)
+    for i in range(count):
+        folder = f"{root}-{i // files_per_folder:04d}"
+        if i % files_per_folder == 0:
+            service.add_folder(folder, root)
+        service.add_file(f"{root}-file{i:06d}", folder)
+
+# --- MODELO DE CHAT ---
+
+class FakeChatModel(FakeListChatModel):
+    """`FakeListChatModel` que espera `latency` segundos antes de responder.
+
+    Simula o tempo até o primeiro token de um modelo remoto; `sleep` continua
+    controlando o intervalo entre os tokens no streaming.
+    """
+
+    latency: float = 0.0
+
+    def _call(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super()._call(*args, **kwargs)
+
+    def _stream(self, *args, **kwargs):
+        time.sleep(self.latency)
+        yield from super()._stream(*args, **kwargs)
@@ -0,0 +1,205 @@
+# gdrive.py
+
+import logging
+import os
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import metrics
+
+# Os clientes do Google (googleapiclient, google.oauth2) são importados só dentro das
+# funções que os usam: a aplicação importa este módulo na inicialização, mas só fala
+# com o Drive quando alguém sincroniza.
+
+CREDENTIALS_FILE = "credentials.json"
+SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+PDF_MIME_TYPE = 'application/pdf'
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+LIST_PAGE_SIZE = 1000   # máximo aceito por files.list e changes.list
+LIST_WORKERS = 8        # pastas listadas em paralelo
+DRIVE_RETRIES = 3       # novas tentativas, com backoff, em erros 5xx/429 e falhas de rede
+
+class _RetryCounter(logging.Handler):
+    """Conta as novas tentativas do cliente do Drive, que só as reporta no log."""
+
+    def emit(self, record):
+        if record.getMessage().startswith("Sleeping"):
+            metrics.increment("drive.retries")
+
+logging.getLogger("googleapiclient.http").addHandler(_RetryCounter())
+
+def authenticate_gdrive():
+    """Autentica na API do Google Drive e retorna um cliente do serviço.
+
+    O cliente não é thread-safe: cada thread que acessa o Drive deve criar o seu.
+    """
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
+
+    if not os.path.exists(CREDENTIALS_FILE):
+        raise FileNotFoundError(f"Arquivo '{CREDENTIALS_FILE}' não encontrado.")
+    creds = service_account.Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=SCOPES)
+    return build('drive', 'v3', credentials=creds)
+
+def get_folder_id_from_url(url):
+    match = re.search(r'/folders/([a-zA-Z0-9_-]+)', url)
+    return match.group(1) if match else None
+
+def _list_folder(service, folder_id):
+    """Lista as subpastas e os PDFs de uma única pasta, percorrendo todas as páginas."""
+    items = []
+    page_token = None
+    with metrics.timer("drive.list") as span:
+        while True:
+            results = service.files().list(
+                q=f"'{folder_id}' in parents and trashed=false"
+                  f" and (mimeType='{FOLDER_MIME_TYPE}' or mimeType='{PDF_MIME_TYPE}')",
+                pageSize=LIST_PAGE_SIZE,
+                fields="nextPageToken, files(id, name, mimeType, modifiedTime)",
+                pageToken=page_token
+            ).execute(num_retries=DRIVE_RETRIES)
+            items.extend(results.get('files', []))
+            span["items"] = len(items)
+            page_token = results.get('nextPageToken', None)
+            if page_token is None:
+                return items
+
+def _crawl(service_factory, root_ids, folders, workers):
+    """Busca em largura concorrente a partir de `root_ids`, uma pasta por tarefa.
+
+    Registra em `folders` cada subpasta encontrada (id → pasta-mãe) e retorna os PDFs.
+    """
+    local = threading.local()
+
+    def list_folder(folder_id):
+        if not hasattr(local, "service"):
+            local.service = service_factory()
+        return folder_id, _list_folder(local.service, folder_id)
+
+    files = {}
+    seen = set(root_ids)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(list_folder, folder_id) for folder_id in root_ids}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                parent, items = future.result()
+                for item in items:
+                    if item['mimeType'] == FOLDER_MIME_TYPE:
+                        folders[item['id']] = parent
+                        if item['id'] not in seen:  # uma pasta pode estar em mais de um lugar
+                            seen.add(item['id'])
+                            pending.add(pool.submit(list_folder, item['id']))
+                    else:
+                        files[item['id']] = {'name': item['name'], 'modified_time': item['modifiedTime'], 'parent': parent}
+    return files
+
+def list_gdrive_files_recursively(service_factory, folder_id, workers=LIST_WORKERS):
+    """Lista os PDFs de uma pasta do Drive e de todas as suas subpastas.
+
+    As pastas de um mesmo nível são listadas em paralelo (`service_factory` cria um
+    cliente por thread). Retorna `(files, folders)`: os PDFs, com nome, data de
+    modificação e pasta-mãe, e a árvore de pastas (id → pasta-mãe), usada depois
+    para interpretar as alterações de `get_gdrive_changes`.
+    """
+    folders = {folder_id: None}
+    files = _crawl(service_factory, [folder_id], folders, workers)
+    return files, folders
+
+def get_start_page_token(service):
+    """Token a partir do qual `get_gdrive_changes` passa a reportar alterações."""
+    return service.changes().getStartPageToken().execute(num_retries=DRIVE_RETRIES)['startPageToken']
+
+def list_gdrive_changes(service, page_token):
+    """Lê o log de alterações do Drive desde `page_token`.
+
+    Retorna `(changes, new_page_token)`, onde `changes` guarda o estado mais recente de
+    cada arquivo alterado (None se ele foi apagado ou ficou inacessível).
+    """
+    changes = {}
+    with metrics.timer("drive.changes") as span:
+        while True:
+            results = service.changes().list(
+                pageToken=page_token,
+                pageSize=LIST_PAGE_SIZE,
+                includeRemoved=True,
+                spaces='drive',
+                fields="nextPageToken, newStartPageToken,"
+                       " changes(fileId, removed, file(id, name, mimeType, modifiedTime, parents, trashed))"
+            ).execute(num_retries=DRIVE_RETRIES)
+            for change in results.get('changes', []):
+                changes[change['fileId']] = None if change.get('removed') else change.get('file')
+            span["items"] = len(changes)
+            if 'newStartPageToken' in results:
+                return changes, results['newStartPageToken']
+            page_token = results['nextPageToken']
+
+def _prune_folders(folders, root_id):
+    """Mantém só as pastas que ainda descendem de `root_id`."""
+    kept = {root_id: None}
+    for folder_id in folders:
+        chain = []
+        while folder_id not in kept and folder_id in folders and folder_id not in chain:
+            chain.append(folder_id)
+            folder_id = folders[folder_id]
+        if folder_id in kept:
+            kept.update((c, folders[c]) for c in chain)
+    return kept
+
+def _tracked_parent(item, folders):
+    return next((parent for parent in item.get('parents', []) if parent in folders), None)
+
+def get_gdrive_changes(service_factory, root_id, page_token, folders, workers=LIST_WORKERS):
+    """Calcula o que mudou na árvore de `root_id` desde `page_token`.
+
+    `folders` é a árvore de pastas conhecida (ver `list_gdrive_files_recursively`).
+    Pastas criadas ou movidas para dentro da árvore são listadas por inteiro, já que
+    o log de alterações só reporta a própria pasta, e não o que ela contém.
+
+    Retorna `(changed_files, removed_ids, folders, new_page_token)`: os PDFs novos ou
+    alterados dentro da árvore, os ids que saíram dela (apagados, enviados para a
+    lixeira ou movidos para fora), a árvore de pastas atualizada e o próximo token.
+    """
+    changes, new_page_token = list_gdrive_changes(service_factory(), page_token)
+
+    folder_changes = {
+        file_id: item for file_id, item in changes.items()
+        if file_id != root_id and (file_id in folders or (item is not None and item['mimeType'] == FOLDER_MIME_TYPE))
+    }
+    updated = {folder_id: parent for folder_id, parent in folders.items() if folder_id not in folder_changes}
+    # A pasta-mãe de uma pasta nova pode ser nova também: a árvore só é podada no fim
+    candidates = set(updated) | set(folder_changes)
+    for folder_id, item in folder_changes.items():
+        if item is not None and item['mimeType'] == FOLDER_MIME_TYPE and not item.get('trashed'):
+            updated[folder_id] = next((parent for parent in item.get('parents', []) if parent in candidates), None)
+    updated = _prune_folders(updated, root_id)
+
+    changed_files, removed_ids = {}, set()
+    for file_id, item in changes.items():
+        if item is not None and item['mimeType'] == FOLDER_MIME_TYPE:
+            continue
+        parent = _tracked_parent(item, updated) if item is not None else None
+        if item is None or item.get('trashed') or item['mimeType'] != PDF_MIME_TYPE or parent is None:
+            removed_ids.add(file_id)
+        else:
+            changed_files[file_id] = {'name': item['name'], 'modified_time': item['modifiedTime'], 'parent': parent}
+
+    new_folders = [folder_id for folder_id in updated if folder_id not in folders]
+    if new_folders:
+        changed_files.update(_crawl(service_factory, new_folders, updated, workers))
+    removed_ids -= changed_files.keys()
+    return changed_files, removed_ids, updated, new_page_token
+
+def download_gdrive_file(service, file_id, fh):
+    """Baixa o conteúdo de um arquivo do Drive para o objeto de arquivo `fh`, em partes."""
+    from googleapiclient.http import MediaIoBaseDownload
+
+    request = service.files().get_media(fileId=file_id)
+    downloader = MediaIoBaseDownload(fh, request, chunksize=DOWNLOAD_CHUNK_SIZE)
+    done = False
+    with metrics.timer("drive.download", items=1) as span:
+        while not done:
+            status, done = downloader.next_chunk(num_retries=DRIVE_RETRIES)
+            span["bytes"] = status.resumable_progress
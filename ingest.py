@@ -0,0 +1,196 @@
+# ingest.py
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from filelock import FileLock, Timeout
+
+from embedding_cache import CachedEmbeddings
+from gdrive import authenticate_gdrive, get_folder_id_from_url
+from ingestion import FAISS_INDEX_PATH, get_drive_delta, load_manifest, read_json, sync_drive_files, write_json_atomic
+from metrics import metrics, to_prometheus
+from page_cache import PageCache
+from pdf_extraction import OCR_BACKEND, OCR_BACKENDS, get_ocr_backend
+
+# --- CONSTANTES ---
+EMBEDDING_MODEL = "models/text-embedding-004"
+GDRIVE_FOLDER_URL = "https://drive.google.com/drive/folders/1wYDn0Bvscp8zMmIJwf3q-uPT4VowDCU8?usp=drive_link"
+SYNC_LOCK_FILE = "faiss_index.lock"
+SYNC_STATUS_FILE = "sync_status.json"
+SYNC_INTERVAL = int(os.getenv("LITERAGENT_SYNC_INTERVAL", 15 * 60))   # segundos entre sincronizações no modo daemon
+SYNC_METRIC_PREFIXES = ("drive.", "sync.")
+SYNC_LOCK_TIMEOUT = 5      # segundos à espera do lock (a aplicação o segura por instantes ao consultar o andamento)
+SYNC_START_GRACE = 60      # segundos para o processo disparado pela aplicação começar a sincronizar
+
+logger = logging.getLogger("ingest")
+
+class SyncInProgress(Exception):
+    """Outra sincronização já está gravando o índice."""
+
+def create_embeddings(api_key):
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings  # import lento, feito só quando necessário
+
+    return CachedEmbeddings(GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=api_key), EMBEDDING_MODEL)
+
+# --- ESTADO DA SINCRONIZAÇÃO ---
+# Só um processo sincroniza por vez: quem grava o índice e o manifesto segura o lock
+# SYNC_LOCK_FILE. O andamento vai para SYNC_STATUS_FILE, que a aplicação lê para mostrar
+# o progresso; o índice novo ela descobre sozinha, pela versão publicada no chunk store.
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+def read_sync_status():
+    return read_json(SYNC_STATUS_FILE)
+
+def is_sync_running():
+    lock = FileLock(SYNC_LOCK_FILE)
+    try:
+        lock.acquire(timeout=0)
+    except Timeout:
+        return True
+    lock.release()
+    return False
+
+def is_status_stale(status):
+    """O status diz que há uma sincronização em andamento, mas nenhum processo está sincronizando?
+
+    Um "starting" só é considerado abandonado depois de `SYNC_START_GRACE` segundos,
+    o tempo de o processo disparado pela aplicação chegar a pegar o lock.
+    """
+    if status["state"] == "starting":
+        started_at = datetime.fromisoformat(status["started_at"])
+        if (datetime.now(timezone.utc) - started_at).total_seconds() < SYNC_START_GRACE:
+            return False
+    elif status["state"] != "running":
+        return False
+    return not is_sync_running()
+
+def _finish_pending_start(state, **fields):
+    """Encerra o "starting" de `start_background_sync` quando a sincronização não chega a começar."""
+    status = read_sync_status()
+    if status and status["state"] == "starting":
+        write_json_atomic(SYNC_STATUS_FILE, {**status, "state": state, "updated_at": _now(), **fields})
+
+def run_sync(folder_id, embeddings, service_factory=authenticate_gdrive, index_path=FAISS_INDEX_PATH, **sync_options):
+    """Sincroniza a pasta do Drive com o índice local, com o lock do índice.
+
+    Levanta `SyncInProgress` se outro processo já estiver sincronizando. Retorna o
+    resumo de `sync_drive_files`. As métricas de cada estágio (ver `metrics`) recomeçam
+    a cada sincronização e vão para o status ao final.
+    """
+    lock = FileLock(SYNC_LOCK_FILE)
+    try:
+        lock.acquire(timeout=SYNC_LOCK_TIMEOUT)
+    except Timeout:
+        raise SyncInProgress("Já existe uma sincronização em andamento.")
+    started_at = _now()
+
+    def report(state, **fields):
+        write_json_atomic(SYNC_STATUS_FILE, {"state": state, "started_at": started_at, "updated_at": _now(), **fields})
+
+    try:
+        metrics.reset(SYNC_METRIC_PREFIXES)
+        report("running", done=0, total=0)
+        manifest = load_manifest(index_path)
+        files_to_process, removed_files, drive_state = get_drive_delta(service_factory, folder_id, manifest)
+        logger.info("%d arquivo(s) para processar, %d removido(s)", len(files_to_process), len(removed_files))
+        summary = sync_drive_files(
+            service_factory, files_to_process, manifest, embeddings, removed_files=removed_files,
+            on_progress=lambda done, total: report("running", done=done, total=total),
+            index_path=index_path, drive_state=drive_state, **sync_options
+        )
+        report("finished", summary=summary, metrics=metrics.snapshot())
+        return summary
+    except Exception as e:
+        report("error", error=str(e), metrics=metrics.snapshot())
+        raise
+    finally:
+        lock.release()
+
+def start_background_sync(api_key):
+    """Dispara este script em um processo separado, sem esperar que ele termine.
+
+    Não faz nada (e retorna None) se outra sincronização já estiver em andamento.
+    """
+    if is_sync_running():
+        return None
+    write_json_atomic(SYNC_STATUS_FILE, {"state": "starting", "started_at": _now(), "updated_at": _now()})
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__)], env={**os.environ, "GOOGLE_API_KEY": api_key},
+                            start_new_session=True)
+
+def write_metrics_file(path):
+    """Grava as métricas no formato texto do Prometheus (para o textfile collector do node_exporter)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(to_prometheus(metrics.snapshot()))
+    os.replace(tmp_path, path)
+
+# --- LINHA DE COMANDO ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sincroniza a pasta do Google Drive com o índice local do LiterAgent.")
+    parser.add_argument("--folder-url", default=GDRIVE_FOLDER_URL, help="URL da pasta do Drive")
+    parser.add_argument("--daemon", action="store_true", help="Sincroniza continuamente, a cada --interval segundos")
+    parser.add_argument("--interval", type=int, default=SYNC_INTERVAL)
+    parser.add_argument("--download-workers", type=int, help="Downloads simultâneos do Drive")
+    parser.add_argument("--extract-workers", type=int, help="Processos de extração de texto (padrão: um por núcleo)")
+    parser.add_argument("--ocr", choices=sorted(OCR_BACKENDS), default=OCR_BACKEND,
+                        help="OCR das páginas digitalizadas (padrão: LITERAGENT_OCR_BACKEND, ou \"none\")")
+    parser.add_argument("--metrics-file", help="Grava as métricas da última sincronização neste arquivo, no formato do Prometheus")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    # Falhas antes da sincronização também vão para o status, senão a aplicação que
+    # disparou este processo ficaria mostrando "starting" para sempre
+    def fail(message):
+        _finish_pending_start("error", error=message)
+        parser.error(message)
+
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        fail("GOOGLE_API_KEY não configurada (defina no .env ou no ambiente).")
+    folder_id = get_folder_id_from_url(args.folder_url)
+    if not folder_id:
+        fail(f"URL de pasta inválida: {args.folder_url}")
+    try:
+        get_ocr_backend(args.ocr)  # o padrão vem do ambiente, e o argparse não confere `choices` no padrão
+    except ValueError as e:
+        fail(str(e))
+
+    try:
+        sync_options = {"extract_workers": args.extract_workers, "ocr_backend": args.ocr, "page_cache": PageCache()}
+        if args.download_workers:
+            sync_options["download_workers"] = args.download_workers
+        embeddings = create_embeddings(api_key)
+    except Exception as e:
+        _finish_pending_start("error", error=str(e))
+        raise
+    while True:
+        try:
+            summary = run_sync(folder_id, embeddings, **sync_options)
+            logger.info("Sincronização concluída: %s", summary)
+            exit_code = 1 if summary["failed"] else 0
+        except SyncInProgress as e:
+            logger.warning("%s", e)
+            _finish_pending_start("skipped", message=str(e))
+            exit_code = 0
+        except Exception:
+            logger.exception("Falha na sincronização")
+            exit_code = 1
+        if args.metrics_file:
+            write_metrics_file(args.metrics_file)
+        if not args.daemon:
+            return exit_code
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,445 @@
+# ingestion.py
+
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from bisect import bisect_right
+from datetime import datetime
+from itertools import groupby
+
+from langchain_core.documents import Document
+
+from gdrive import download_gdrive_file, get_gdrive_changes, get_start_page_token, list_gdrive_files_recursively
+from metrics import metrics
+from page_cache import PageCache
+from pdf_extraction import (EXTRACTION_VERSION, OCR_BACKEND, PAGES_PER_TASK, content_hash,
+                            count_pdf_pages, get_ocr_backend, page_ranges, pages_to_documents, timed_extract_pages)
+from vector_index import (create_vector_store, delete_vectors, index_exists, maybe_upgrade_index, read_vector_store,
+                          rebuild_vector_store_index, target_backend, write_vector_store)
+
+# --- CONSTANTES ---
+FAISS_INDEX_PATH = "faiss_index"
+FAISS_MANIFEST_FILE = "faiss_manifest.json"
+MANIFEST_SCHEMA = 2
+
+DOWNLOAD_WORKERS = 4          # downloads simultâneos do Drive
+EMBED_BATCH_SIZE = 100        # chunks por chamada ao modelo de embeddings
+QUEUE_SIZE = 8                # arquivos em espera entre um estágio e o próximo
+CHECKPOINT_INTERVAL = 60      # segundos entre gravações do índice e do manifesto
+COMPACTION_THRESHOLD = 0.25   # fração de vetores removidos que dispara a compactação
+
+_DONE = object()
+
+# --- MANIFESTO ---
+# O manifesto descreve o índice em disco: para cada arquivo do Drive, a versão indexada
+# e quantos chunks ela gerou. Os ids dos chunks são derivados do id do arquivo
+# (ver `chunk_ids_for`), o que permite remover os vetores de uma versão antiga sem
+# guardar a lista de ids no manifesto. Em "drive" fica o ponto do log de alterações
+# do Drive em que a última sincronização completa parou, junto com a árvore de pastas.
+
+def read_json(path):
+    """Conteúdo de um arquivo JSON, ou None se ele não existir."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def write_json_atomic(path, data):
+    """Grava `data` em um temporário e o renomeia sobre `path`: quem lê nunca vê um arquivo pela metade."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def new_manifest():
+    return {"schema": MANIFEST_SCHEMA, "index_version": 0, "deleted_since_rebuild": 0, "files": {}}
+
+def load_manifest(index_path=FAISS_INDEX_PATH):
+    """Carrega o manifesto da última sincronização.
+
+    Um manifesto no formato antigo (sem o registro de chunks) ou sem índice
+    correspondente em disco não descreve o índice atual; nesse caso retorna um
+    manifesto vazio, e a próxima sincronização reconstrói o índice do zero.
+    """
+    data = read_json(FAISS_MANIFEST_FILE)
+    if data is None or data.get("schema") != MANIFEST_SCHEMA or not index_exists(index_path):
+        return new_manifest()
+    return data
+
+def save_manifest(data):
+    write_json_atomic(FAISS_MANIFEST_FILE, data)
+
+def get_files_to_process(drive_files, manifest):
+    """Seleciona os arquivos do Drive que são novos ou foram modificados desde a última sincronização."""
+    indexed = manifest["files"]
+    return {
+        fid: finfo for fid, finfo in drive_files.items()
+        if fid not in indexed
+        or datetime.fromisoformat(finfo['modified_time'][:-1]) > datetime.fromisoformat(indexed[fid]['modified_time'][:-1])
+    }
+
+def get_removed_files(drive_files, manifest):
+    """Lista os arquivos indexados que não existem mais na pasta do Drive."""
+    return [fid for fid in manifest["files"] if fid not in drive_files]
+
+def get_drive_delta(service_factory, folder_id, manifest):
+    """Descobre o que mudou na pasta do Drive desde a última sincronização.
+
+    Na primeira sincronização (ou se a pasta configurada mudou) lista a árvore inteira;
+    nas seguintes, lê só o log de alterações a partir do token salvo no manifesto.
+    Retorna `(files_to_process, removed_files, drive_state)`. `drive_state` deve ser
+    repassado a `sync_drive_files`, que só o grava se nenhum arquivo falhar: do
+    contrário, a próxima sincronização relê as mesmas alterações e tenta de novo.
+    """
+    indexed = manifest["files"]
+    state = manifest.get("drive")
+    if state is None or state["folder_id"] != folder_id:
+        # O token é obtido antes da listagem para não perder o que mudar durante ela
+        page_token = get_start_page_token(service_factory())
+        drive_files, folders = list_gdrive_files_recursively(service_factory, folder_id)
+        removed_files = get_removed_files(drive_files, manifest)
+    else:
+        drive_files, removed_ids, folders, page_token = get_gdrive_changes(
+            service_factory, folder_id, state["page_token"], state["folders"])
+        # Além dos arquivos apagados, saem os que estavam em pastas que deixaram a árvore
+        removed_files = [
+            fid for fid, entry in indexed.items()
+            if fid in removed_ids or (fid not in drive_files and entry.get("parent") not in folders)
+        ]
+
+    # Arquivos movidos entre pastas não são reprocessados, mas a pasta registrada muda
+    for fid, finfo in drive_files.items():
+        if fid in indexed:
+            indexed[fid]["parent"] = finfo["parent"]
+    files_to_process = get_files_to_process(drive_files, manifest)
+    return files_to_process, removed_files, {"folder_id": folder_id, "page_token": page_token, "folders": folders}
+
+def chunk_ids_for(file_id, entry):
+    return [f"{file_id}:{chunk_index}" for chunk_index in range(entry["chunks"])]
+
+def get_dead_ratio(vector_store, manifest):
+    """Fração dos vetores removidos desde a última reconstrução do índice.
+
+    As remoções deslocam os vetores mas não devolvem a memória alocada e, nos índices
+    IVF/PQ, deixam os centroides treinados cada vez menos representativos do corpus.
+    """
+    deleted = manifest["deleted_since_rebuild"]
+    total = vector_store.index.ntotal + deleted
+    return deleted / total if total else 0.0
+
+# --- CHUNKING ---
+
+def get_text_chunks(documents):
+    """Divide as páginas em chunks, um arquivo por vez, sem nunca misturar dois arquivos.
+
+    As páginas consecutivas de um mesmo arquivo são unidas antes da divisão, para que
+    um trecho que atravessa a quebra de página não seja cortado. Cada chunk herda o id
+    e o nome do arquivo, a página em que começa, sua posição no arquivo e o próprio hash.
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter  # só é preciso ao sincronizar
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=2500, chunk_overlap=200, length_function=len, add_start_index=True)
+    for _, pages in groupby(documents, key=lambda doc: doc.metadata["file_id"]):
+        pages = list(pages)
+        page_offsets = []
+        offset = 0
+        for page in pages:
+            page_offsets.append(offset)
+            offset += len(page.page_content)
+        text = "".join(page.page_content for page in pages)
+
+        for chunk_index, chunk in enumerate(text_splitter.create_documents([text])):
+            page = pages[bisect_right(page_offsets, chunk.metadata["start_index"]) - 1]
+            yield Document(id=f"{page.metadata['file_id']}:{chunk_index}", page_content=chunk.page_content, metadata={
+                "file_id": page.metadata["file_id"],
+                "file_name": page.metadata["file_name"],
+                "page": page.metadata["page"],
+                "chunk_index": chunk_index,
+                "content_hash": content_hash(chunk.page_content),
+            })
+
+# --- PIPELINE DE SINCRONIZAÇÃO ---
+# Três estágios ligados por filas limitadas:
+#   1. downloads do Drive em um pool de threads, gravando cada PDF em um arquivo temporário;
+#   2. extração de texto com PyMuPDF em um pool de processos;
+#   3. chunking e embeddings em lotes, na thread que chamou o pipeline.
+# Como as filas têm tamanho fixo, um estágio lento segura os anteriores e o uso de
+# memória e disco não depende do tamanho da pasta.
+
+def _put(q, item, stop):
+    """Coloca `item` na fila, desistindo se o pipeline for interrompido."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _download_stage(service_factory, file_ids, out_queue, tmp_dir, workers, stop, is_cached):
+    local = threading.local()
+
+    def download(file_id):
+        if stop.is_set():
+            return
+        if is_cached(file_id):
+            # Todas as páginas desta versão já foram extraídas: nem precisa baixar
+            metrics.increment("sync.download.skipped")
+            _put(out_queue, (file_id, None, None), stop)
+            return
+        if not hasattr(local, "service"):
+            local.service = service_factory()
+        path = os.path.join(tmp_dir, f"{file_id}.pdf")
+        try:
+            with open(path, "wb") as fh:
+                download_gdrive_file(local.service, file_id, fh)
+        except Exception as e:
+            _put(out_queue, (file_id, None, e), stop)
+            return
+        _put(out_queue, (file_id, path, None), stop)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(download, file_ids))
+    finally:
+        _put(out_queue, _DONE, stop)
+
+def _extract_stage(in_queue, out_queue, submit_extraction, stop):
+    try:
+        while not stop.is_set():
+            item = in_queue.get()
+            if item is _DONE:
+                break
+            file_id, path, error = item
+            futures, texts = [], {}
+            if error is None:
+                try:
+                    futures, texts = submit_extraction(file_id, path)
+                except Exception as e:
+                    error = e
+            if not _put(out_queue, (file_id, path, futures, texts, error), stop):
+                break
+    finally:
+        _put(out_queue, _DONE, stop)
+
+def _save_drive_state(manifest, drive_state):
+    if drive_state is not None:
+        manifest["drive"] = drive_state
+        save_manifest(manifest)
+
+def _start_thread(target, *args):
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+def sync_drive_files(service_factory, files_to_process, manifest, embeddings, removed_files=(),
+                     index_path=FAISS_INDEX_PATH, on_progress=None, download_workers=DOWNLOAD_WORKERS,
+                     extract_workers=None, embed_batch_size=EMBED_BATCH_SIZE, queue_size=QUEUE_SIZE,
+                     checkpoint_interval=CHECKPOINT_INTERVAL, compaction_threshold=COMPACTION_THRESHOLD,
+                     drive_state=None, page_cache=None, ocr_backend=OCR_BACKEND, pages_per_task=PAGES_PER_TASK):
+    """Baixa, extrai e indexa `files_to_process`, atualizando o índice FAISS e o manifesto.
+
+    Antes de indexar, remove do índice os chunks das versões antigas dos arquivos
+    modificados e dos arquivos em `removed_files` (apagados da pasta do Drive).
+
+    `service_factory` cria um cliente do Drive (uma instância por thread de download).
+    O índice e o manifesto são gravados juntos a cada `checkpoint_interval` segundos e ao
+    final, sempre entre dois arquivos. Assim, uma sincronização interrompida recomeça
+    exatamente pelos arquivos que ainda não estão no manifesto. Ao final, se a fração de
+    vetores removidos passar de `compaction_threshold`, o índice é compactado.
+
+    `drive_state` (ver `get_drive_delta`) é gravado no manifesto ao final, se nenhum
+    arquivo tiver falhado.
+
+    A extração divide cada PDF em intervalos de até `pages_per_task` páginas, lidos em
+    paralelo pelos processos de extração; páginas que são só imagem passam pelo OCR
+    `ocr_backend` (ver `pdf_extraction.OCR_BACKENDS`). O texto de cada página vai para
+    `page_cache` (ver `PageCache`): numa próxima vez, as páginas da mesma versão do
+    arquivo não são lidas de novo, e o arquivo nem é baixado se todas estiverem lá. Sem
+    `page_cache`, o cache só vale durante esta sincronização.
+
+    Retorna um resumo com os arquivos processados, os que falharam, o total de chunks
+    novos e o de chunks removidos.
+    """
+    ocr = get_ocr_backend(ocr_backend)  # antes de qualquer alteração no índice
+    summary = {"processed": 0, "failed": {}, "chunks": 0, "deleted": 0}
+    total = len(files_to_process)
+    if not total and not removed_files:
+        _save_drive_state(manifest, drive_state)
+        return summary
+
+    indexed = manifest["files"]
+    page_cache = page_cache or PageCache(":memory:")
+    page_cache.forget(removed_files)
+    vector_store = None
+    if indexed and index_exists(index_path):
+        vector_store = read_vector_store(index_path, embeddings)
+
+    # Remove de uma vez os chunks que deixaram de valer: a remoção percorre o índice
+    # inteiro, então um único lote sai bem mais barato que uma remoção por arquivo.
+    stale_ids = [
+        chunk_id
+        for fid in [*files_to_process, *removed_files] if fid in indexed
+        for chunk_id in chunk_ids_for(fid, indexed.pop(fid))
+    ]
+    dirty = bool(stale_ids)
+    if vector_store is not None:
+        existing_ids = set(vector_store.index_to_docstore_id.values())
+        stale_ids = [chunk_id for chunk_id in stale_ids if chunk_id in existing_ids]
+        # Chunks que o manifesto não conhece: a sincronização anterior foi interrompida
+        # depois de gravar o índice e antes de gravar o manifesto
+        expected_ids = {chunk_id for fid, entry in indexed.items() for chunk_id in chunk_ids_for(fid, entry)}
+        stale_ids += sorted(existing_ids - expected_ids - set(stale_ids))
+        if stale_ids:
+            with metrics.timer("sync.index_delete", items=len(stale_ids)):
+                delete_vectors(vector_store, stale_ids)
+            dirty = True
+        manifest["deleted_since_rebuild"] += len(stale_ids)
+        summary["deleted"] = len(stale_ids)
+
+    pending_chunks = []
+    completed_files = []
+    last_checkpoint = time.monotonic()
+
+    def flush(full_batches_only=False):
+        nonlocal vector_store
+        count = len(pending_chunks)
+        if full_batches_only:
+            count -= count % embed_batch_size
+        for start in range(0, count, embed_batch_size):
+            batch = pending_chunks[start:start + embed_batch_size]
+            texts = [doc.page_content for doc in batch]
+            with metrics.timer("sync.embedding", items=len(batch), nbytes=sum(len(text.encode()) for text in texts)):
+                vectors = embeddings.embed_documents(texts)
+            with metrics.timer("sync.index_add", items=len(batch)):
+                if vector_store is None:
+                    vector_store = create_vector_store(index_path, batch, embeddings, vectors)
+                else:
+                    vector_store.add_embeddings(zip(texts, vectors), metadatas=[doc.metadata for doc in batch],
+                                                ids=[doc.id for doc in batch])
+        del pending_chunks[:count]
+
+    def checkpoint():
+        nonlocal last_checkpoint, dirty
+        flush()
+        if completed_files or dirty:
+            manifest["index_version"] += 1
+            if vector_store is not None:
+                with metrics.timer("sync.index_save", items=vector_store.index.ntotal):
+                    manifest["index_version"] = write_vector_store(vector_store, index_path, manifest["index_version"])
+            for fid, chunk_count in completed_files:
+                indexed[fid] = {**files_to_process[fid], "chunks": chunk_count}
+            save_manifest(manifest)
+            completed_files.clear()
+            dirty = False
+        last_checkpoint = time.monotonic()
+
+    extraction_version = f"{EXTRACTION_VERSION}:{ocr_backend}"  # ativar o OCR relê as páginas em branco
+
+    def modified_time(file_id):
+        return files_to_process[file_id].get("modified_time")
+
+    def is_cached(file_id):
+        return modified_time(file_id) is not None and page_cache.is_complete(file_id, modified_time(file_id),
+                                                                            extraction_version)
+
+    def submit_extraction(file_id, path):
+        """Envia ao pool as páginas que faltam no cache; retorna os futures e as páginas já em cache."""
+        modified = modified_time(file_id)
+        page_count, texts = page_cache.get(file_id, modified, extraction_version) if modified else (None, {})
+        if path is None:
+            return [], texts
+        if page_count is None:
+            page_count = count_pdf_pages(path)
+            if modified:
+                page_cache.store(file_id, modified, extraction_version, page_count=page_count)
+        return [pool.submit(timed_extract_pages, path, start, end, ocr)
+                for start, end in page_ranges(page_count, texts, pages_per_task)], texts
+
+    stop = threading.Event()
+    download_queue = queue.Queue(maxsize=queue_size)
+    extract_queue = queue.Queue(maxsize=queue_size)
+    tmp_dir = tempfile.mkdtemp(prefix="literagent-sync-")
+    pool = ProcessPoolExecutor(max_workers=extract_workers or os.cpu_count(),
+                               mp_context=multiprocessing.get_context("spawn"))
+    try:
+        _start_thread(_download_stage, service_factory, list(files_to_process), download_queue,
+                      tmp_dir, download_workers, stop, is_cached)
+        _start_thread(_extract_stage, download_queue, extract_queue, submit_extraction, stop)
+
+        done = 0
+        while True:
+            item = extract_queue.get()
+            if item is _DONE:
+                break
+            file_id, path, futures, texts, error = item
+            if error is None:
+                try:
+                    if texts:
+                        metrics.increment("sync.extract.cached_pages", len(texts))
+                    for future in futures:
+                        extracted, ocr_pages, seconds = future.result()
+                        metrics.observe("sync.extract", seconds, items=len(extracted))
+                        if ocr_pages:
+                            metrics.increment("sync.extract.ocr_pages", len(ocr_pages))
+                        if modified_time(file_id):
+                            page_cache.store(file_id, modified_time(file_id), extraction_version, extracted)
+                        texts.update(extracted)
+                    pages = pages_to_documents(file_id, files_to_process[file_id]['name'], texts)
+                except Exception as e:
+                    metrics.increment("sync.extract.errors")
+                    error = e
+            if path is not None:
+                os.remove(path)
+
+            done += 1
+            if error is not None:
+                # O arquivo fica fora do manifesto e será tentado de novo na próxima sincronização
+                summary["failed"][file_id] = str(error)
+            else:
+                with metrics.timer("sync.chunking") as span:
+                    chunks = list(get_text_chunks(pages))
+                    span["items"] = len(chunks)
+                pending_chunks.extend(chunks)
+                # Só envia lotes completos; o restante espera pelos chunks do próximo arquivo
+                flush(full_batches_only=True)
+                completed_files.append((file_id, len(chunks)))
+                summary["processed"] += 1
+                summary["chunks"] += len(chunks)
+
+            if time.monotonic() - last_checkpoint >= checkpoint_interval:
+                checkpoint()
+            if on_progress:
+                on_progress(done, total)
+
+        checkpoint()
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if vector_store is not None:
+        if get_dead_ratio(vector_store, manifest) > compaction_threshold:
+            # Compactação: reconstrói o índice só com os vetores vivos (e retreina IVF/PQ)
+            with metrics.timer("sync.compaction", items=vector_store.index.ntotal):
+                rebuild_vector_store_index(vector_store, target_backend(vector_store.index.ntotal))
+            manifest["deleted_since_rebuild"] = 0
+            dirty = True
+        elif maybe_upgrade_index(vector_store):
+            dirty = True
+        if dirty:
+            checkpoint()
+    if not summary["failed"]:
+        _save_drive_state(manifest, drive_state)
+    return summary
@@ -2,41 +2,38 @@
 
 import os
 import streamlit as st
-import fitz  # PyMuPDF
-import io
+import itertools
 import json
-import re
-from datetime import datetime
+import logging
+import threading
+from concurrent.futures import Future
 from dotenv import load_dotenv
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from langchain_community.vectorstores import FAISS
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_community.chat_message_histories import StreamlitChatMessageHistory
-from langchain_core.runnables.history import RunnableWithMessageHistory
-
-# --- GOOGLE DRIVE IMPORTS ---
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseDownload
+from answer_cache import AnswerCache
+from metrics import metrics, to_json, to_prometheus
+from rag_chain import get_conversational_rag_chain
+
+# --- GOOGLE DRIVE E INGESTÃO ---
+from vector_index import get_index_version, read_vector_store
+from gdrive import CREDENTIALS_FILE
+from ingestion import FAISS_INDEX_PATH
+from ingest import create_embeddings, is_status_stale, is_sync_running, read_sync_status, start_background_sync
 
 # --- VOICE INPUT IMPORTS ---
-import speech_recognition as sr
+from voice import Transcriber, TranscriptionError, audio_hash
 from streamlit.errors import StreamlitSecretNotFoundError
 
 # Carrega as variáveis de ambiente do arquivo .env (para desenvolvimento local)
 load_dotenv()
 
+# Tamanho dos prompts e demais diagnósticos da chain vão para o log do servidor
+logging.basicConfig(format="%(asctime)s %(name)s %(levelname)s %(message)s")
+for logger_name in ("rag_chain", "context_budget"):
+    logging.getLogger(logger_name).setLevel(logging.INFO)
+
 # --- CONSTANTES ---
-FAISS_INDEX_PATH = "faiss_index"
-FAISS_MANIFEST_FILE = "faiss_manifest.json"
-CREDENTIALS_FILE = "credentials.json"
-SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
-GDRIVE_FOLDER_URL = "https://drive.google.com/drive/folders/1wYDn0Bvscp8zMmIJwf3q-uPT4VowDCU8?usp=drive_link"
+SYNC_STATUS_REFRESH = 3   # segundos entre atualizações do andamento da sincronização
+VOICE_POLL_INTERVAL = 1   # segundos entre verificações de uma transcrição em andamento
 
 # --- CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(page_title="LiterAgent", page_icon="📚", layout="wide")
@@ -56,113 +53,140 @@ def manage_secrets():
         pass
     return os.getenv("GOOGLE_API_KEY")
 
-# --- LÓGICA DE DADOS ---
-
-def authenticate_gdrive():
-    """Autentica na API do Google Drive."""
-    if not os.path.exists(CREDENTIALS_FILE):
-        st.error(f"Arquivo '{CREDENTIALS_FILE}' não encontrado.")
-        return None
-    try:
-        creds = service_account.Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=SCOPES)
-        return build('drive', 'v3', credentials=creds)
-    except Exception as e:
-        st.error(f"Falha na autenticação com o Google Drive: {e}")
-        return None
-
-def get_folder_id_from_url(url):
-    match = re.search(r'/folders/([a-zA-Z0-9_-]+)', url)
-    return match.group(1) if match else None
+# --- FUNÇÕES CORE ---
 
-def list_gdrive_files_recursively(service, folder_id):
-    """Lista arquivos PDF recursivamente a partir de uma pasta no Google Drive."""
-    all_files = {}
-    try:
-        page_token = None
-        while True:
-            query = f"'{folder_id}' in parents and trashed=false"
-            results = service.files().list(
-                q=query,
-                pageSize=100,
-                fields="nextPageToken, files(id, name, mimeType, modifiedTime)",
-                pageToken=page_token
-            ).execute()
-            
-            items = results.get('files', [])
-            for item in items:
-                if item['mimeType'] == 'application/vnd.google-apps.folder':
-                    # Se é uma pasta, chama a função recursivamente para a subpasta
-                    all_files.update(list_gdrive_files_recursively(service, item['id']))
-                elif item['mimeType'] == 'application/pdf':
-                    # Se é um PDF, adiciona ao dicionário
-                    all_files[item['id']] = {'name': item['name'], 'modified_time': item['modifiedTime']}
-            
-            page_token = results.get('nextPageToken', None)
-            if page_token is None:
-                break
-        return all_files
-    except HttpError as e:
-        st.error(f"Erro ao listar arquivos do Drive: {e}")
-        return {}
-
-def download_gdrive_files_as_streams(service, file_ids):
-    streams = []
-    for file_id in file_ids:
-        request = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            _, done = downloader.next_chunk()
-        fh.seek(0)
-        streams.append(fh)
-    return streams
-
-def load_manifest():
-    return json.load(open(FAISS_MANIFEST_FILE, 'r')) if os.path.exists(FAISS_MANIFEST_FILE) else {}
-
-def save_manifest(data):
-    with open(FAISS_MANIFEST_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+def format_sources(documents):
+    """Lista, sem repetição, os arquivos e páginas dos trechos usados em uma resposta."""
+    sources = []
+    for doc in documents:
+        if "file_name" not in doc.metadata:
+            continue  # chunks indexados antes dos metadados de origem
+        source = f"{doc.metadata['file_name']} (p. {doc.metadata['page']})"
+        if source not in sources:
+            sources.append(source)
+    return "; ".join(sources)
+
+def stream_answer(stream, on_sources):
+    """Repassa os tokens da resposta conforme chegam do modelo.
+
+    A chain emite primeiro os trechos recuperados (chave "context") e só depois os
+    tokens da resposta; `on_sources` é chamado com os trechos assim que a busca termina.
+    """
+    for chunk in stream:
+        if "context" in chunk:
+            on_sources(chunk["context"])
+        if "answer" in chunk:
+            yield chunk["answer"]
+
+def stage_rows(snapshot):
+    """Linhas da tabela de diagnóstico: uma por estágio, com os tempos em milissegundos."""
+    return [
+        {"estágio": stage, "execuções": entry["count"], "p50 (ms)": round(entry["p50_s"] * 1000, 1),
+         "p95 (ms)": round(entry["p95_s"] * 1000, 1), "total (s)": round(entry["total_s"], 2),
+         "itens": entry["items"], "bytes": entry["bytes"]}
+        for stage, entry in snapshot["stages"].items()
+    ]
 
-# --- FUNÇÕES CORE ---
+def show_diagnostics(api_key):
+    """Painel com os tempos por estágio, os contadores e os caches deste servidor e da última sincronização."""
+    snapshot = metrics.snapshot()
+    st.caption("Respostas (todas as sessões deste servidor)")
+    if snapshot["stages"]:
+        st.dataframe(stage_rows(snapshot), hide_index=True)
+    st.json({**snapshot["counters"], "answer_cache": get_answer_cache().stats(),
+             "embedding_cache": get_embeddings(api_key).stats(), "voice": get_transcriber().stats()}, expanded=False)
+
+    sync_metrics = (read_sync_status() or {}).get("metrics")
+    if sync_metrics:
+        st.caption("Última sincronização")
+        st.dataframe(stage_rows(sync_metrics), hide_index=True)
+        if sync_metrics["counters"]:
+            st.json(sync_metrics["counters"], expanded=False)
+
+    exported = {"app": snapshot, "sync": sync_metrics}
+    st.download_button("Exportar JSON", to_json(exported), file_name="literagent-metrics.json", mime="application/json")
+    st.download_button("Exportar Prometheus", to_prometheus(snapshot), file_name="literagent-metrics.prom", mime="text/plain")
+
+# --- RECURSOS COMPARTILHADOS ENTRE SESSÕES ---
+# O índice, o cliente de embeddings e a chain vivem no cache de processo do Streamlit
+# e são compartilhados (somente leitura) por todas as sessões. O índice só é relido
+# quando a versão em disco muda; a chain só é recriada quando modelo ou temperatura mudam.
+
+@st.cache_resource(show_spinner=False)
+def get_embeddings(api_key):
+    return create_embeddings(api_key)
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_vector_store(api_key, index_version):
+    # Índice mapeado em memória e chunks lidos do SQLite sob demanda: a inicialização
+    # não copia vetores nem textos para a RAM
+    return read_vector_store(FAISS_INDEX_PATH, get_embeddings(api_key), read_only=True)
+
+@st.cache_resource(show_spinner=False)
+def get_transcriber():
+    return Transcriber()
+
+@st.cache_resource(show_spinner=False)
+def get_answer_cache():
+    return AnswerCache()
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def load_conversational_rag_chain(api_key, index_version, temperature, model_name):
+    vector_store = load_vector_store(api_key, index_version)
+    # As respostas guardadas valem só para o modelo, a temperatura e a versão do índice da chain
+    return get_conversational_rag_chain(vector_store, api_key, temperature, model_name,
+                                        answer_cache=get_answer_cache(), index_version=index_version)
+
+@st.cache_resource(show_spinner=False)
+def _shared_index_state():
+    return {"version": None, "lock": threading.Lock()}
+
+def get_shared_conversation(api_key, index_version, temperature, model_name):
+    """Retorna a chain compartilhada para a versão `index_version` do índice (None se não houver índice)."""
+    if index_version is None:
+        return None
+    state = _shared_index_state()
+    with state["lock"]:
+        if state["version"] != index_version:
+            # Descarta as cópias da versão anterior para não manter dois índices em memória
+            load_conversational_rag_chain.clear()
+            load_vector_store.clear()
+            state["version"] = index_version
+    return load_conversational_rag_chain(api_key, index_version, temperature, model_name)
+
+# O índice e a chain são carregados em uma thread, enquanto a página é desenhada: a
+# interface aparece sem esperar pelo carregamento, e só uma pergunta precisa dele.
+
+def warm_up_conversation(api_key, index_version, temperature, model_name):
+    """Começa a carregar, em segundo plano, a chain de `get_shared_conversation`; retorna um Future.
+
+    O carregamento é desta sessão, em uma thread só dela (sem contexto de script: os
+    caches usados não desenham nada), e só recomeça quando a versão do índice, o modelo
+    ou a temperatura mudam, ou depois de uma falha. O trabalho pesado continua
+    compartilhado entre as sessões pelos caches de `get_shared_conversation`.
+    """
+    key = (index_version, temperature, model_name)
+    current = st.session_state.get("warm_up")
+    if current is not None and current[0] == key and not (current[1].done() and current[1].exception()):
+        return current[1]
+
+    future = Future()
+
+    def load():
+        try:
+            future.set_result(get_shared_conversation(api_key, *key))
+        except Exception as e:
+            future.set_exception(e)
 
-def get_pdf_text(pdf_docs_streams):
-    text = ""
-    for pdf_stream in pdf_docs_streams:
-        with fitz.open(stream=pdf_stream.read(), filetype="pdf") as doc:
-            text += "".join(page.get_text() for page in doc)
-    return text
-
-def get_text_chunks(text):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=2500, chunk_overlap=200, length_function=len)
-    return text_splitter.split_text(text)
-
-def get_conversational_rag_chain(vector_store, api_key, temperature, model_name):
-    llm = ChatGoogleGenerativeAI(model=model_name, google_api_key=api_key, temperature=temperature)
-    retriever = vector_store.as_retriever()
-    contextualize_q_prompt = ChatPromptTemplate.from_messages([
-        ("system", "Dada uma conversa e uma pergunta de acompanhamento, reformule a pergunta de acompanhamento para ser uma pergunta independente, em seu idioma original."),
-        MessagesPlaceholder("chat_history"),
-        ("human", "{input}")
-    ])
-    history_aware_retriever = create_history_aware_retriever(llm, retriever, contextualize_q_prompt)
-    qa_prompt = ChatPromptTemplate.from_messages([
-        ("system", "Você é um assistente de resposta a perguntas. Use somente o contexto fornecido para responder à pergunta. Se a resposta não estiver no contexto, diga que você não tem a informação. Não use conhecimento externo.\n\nContexto: {context}"),
-        MessagesPlaceholder("chat_history"),
-        ("human", "{input}")
-    ])
-    question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
-    rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
-    return RunnableWithMessageHistory(rag_chain, lambda s_id: StreamlitChatMessageHistory(key="chat_history"), input_messages_key="input", history_messages_key="chat_history", output_messages_key="answer")
+    threading.Thread(target=load, name="literagent-warm-up", daemon=True).start()
+    st.session_state.warm_up = (key, future)
+    return future
 
 # --- INTERFACE DO STREAMLIT ---
 
 st.header("LiterAgent 📚")
 st.write("Converse com seus documentos do Google Drive.")
 
-if "conversation" not in st.session_state:
-    st.session_state.conversation = None
 if "user_question" not in st.session_state:
     st.session_state.user_question = ""
 
@@ -180,17 +204,41 @@ with st.sidebar:
     st.subheader("Digitação por Voz")
     audio_data = st.audio_input("Grave sua pergunta aqui...")
 
+    # A transcrição roda fora do script, em um pool de threads. Cada gravação é enviada
+    # uma única vez (pelo hash do áudio): os reruns seguintes, com o mesmo áudio ainda no
+    # widget, não a transcrevem nem a perguntam de novo.
     if audio_data is not None:
-        with st.spinner("Transcrevendo áudio..."):
-            r = sr.Recognizer()
-            try:
-                with sr.AudioFile(io.BytesIO(audio_data.read())) as source:
-                    audio = r.record(source)
-                st.session_state.user_question = r.recognize_google(audio, language='pt-BR')
-            except sr.UnknownValueError:
-                st.warning("Não foi possível entender o áudio.")
-            except sr.RequestError as e:
-                st.error(f"Erro na requisição ao Google Speech Recognition: {e}")
+        audio_bytes = audio_data.getvalue()
+        digest = audio_hash(audio_bytes)
+        if digest != st.session_state.get("voice_hash"):
+            st.session_state.voice_hash = digest
+            st.session_state.voice_future = get_transcriber().submit(audio_bytes, language='pt-BR')
+
+    @st.fragment(run_every=VOICE_POLL_INTERVAL)
+    def show_transcription():
+        future = st.session_state.voice_future
+        if not future.done():
+            st.caption("Transcrevendo áudio...")
+            return
+        st.session_state.voice_future = None
+        try:
+            transcript = future.result()
+        except TranscriptionError as e:
+            st.session_state.voice_message = ("error", f"Erro na requisição ao reconhecimento de fala: {e}")
+        except Exception as e:
+            st.session_state.voice_message = ("error", f"Erro ao transcrever o áudio: {e}")
+        else:
+            if transcript is None:
+                st.session_state.voice_message = ("warning", "Não foi possível entender o áudio.")
+            else:
+                st.session_state.user_question = transcript
+        st.rerun()
+
+    if st.session_state.get("voice_future") is not None:
+        show_transcription()
+    if st.session_state.get("voice_message"):
+        kind, message = st.session_state.pop("voice_message")
+        getattr(st, kind)(message)
 
     st.subheader("Ajustes do Modelo")
     
@@ -207,64 +255,47 @@ with st.sidebar:
     )
 
     # --- Lógica de Carregamento e Criação da Chain ---
-    vector_store = None
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004", google_api_key=api_key)
-    
-    if os.path.exists(FAISS_INDEX_PATH):
-        try:
-            vector_store = FAISS.load_local(FAISS_INDEX_PATH, embeddings, allow_dangerous_deserialization=True)
-        except Exception as e:
-            st.error(f"Erro ao carregar base local: {e}")
-            st.stop()
-    
-    if vector_store:
-        st.session_state.conversation = get_conversational_rag_chain(
-            vector_store, api_key, model_temperature, selected_model
-        )
+    st.session_state.index_version = get_index_version(FAISS_INDEX_PATH)
+    conversation_future = warm_up_conversation(api_key, st.session_state.index_version,
+                                               model_temperature, selected_model)
 
     # --- Sincronização ---
+    # A indexação roda em um processo separado (ingest.py); a aplicação só acompanha
+    # o andamento e passa a usar o índice novo quando ele é publicado.
     st.subheader("Sincronizar com Google Drive")
     st.info("Pasta do Drive definida no código.")
 
-    if st.button("Sincronizar"):
-        folder_id = get_folder_id_from_url(GDRIVE_FOLDER_URL)
-        if not folder_id:
-            st.error("URL da pasta inválida no código.")
+    if st.button("Sincronizar", disabled=is_sync_running()):
+        start_background_sync(api_key)
+
+    @st.fragment(run_every=SYNC_STATUS_REFRESH)
+    def show_sync_status():
+        status = read_sync_status()
+        if status is None:
+            return
+        if is_status_stale(status):
+            st.warning("A última sincronização foi interrompida antes do fim.")
+        elif status["state"] in ("starting", "running"):
+            done, total = status.get("done", 0), status.get("total", 0)
+            st.progress(done / total if total else 0.0, text=f"Sincronizando... {done}/{total} arquivo(s)")
+        elif status["state"] == "error":
+            st.error(f"Falha na última sincronização: {status['error']}")
+        elif status["state"] == "skipped":
+            st.info(status["message"])
+        elif status["summary"]["failed"]:
+            st.warning(f"{len(status['summary']['failed'])} arquivo(s) não puderam ser processados e serão tentados na próxima sincronização.")
         else:
-            with st.spinner("Sincronizando com Google Drive..."):
-                gdrive_service = authenticate_gdrive()
-                if gdrive_service:
-                    drive_files = list_gdrive_files_recursively(gdrive_service, folder_id)
-                    manifest = load_manifest()
-                    files_to_process = {fid: finfo for fid, finfo in drive_files.items() if fid not in manifest or datetime.fromisoformat(finfo['modified_time'][:-1]) > datetime.fromisoformat(manifest[fid]['modified_time'][:-1])}
-                    
-                    if not files_to_process:
-                        st.success("Base de conhecimento já está atualizada!")
-                    else:
-                        st.write(f"Baixando {len(files_to_process)} novo(s) arquivo(s)...")
-                        new_pdf_streams = download_gdrive_files_as_streams(gdrive_service, files_to_process.keys())
-                        new_raw_text = get_pdf_text(new_pdf_streams)
-                        new_text_chunks = get_text_chunks(new_raw_text)
-                        
-                        st.write("Atualizando a base de conhecimento...")
-                        # Carrega o vector store existente para adicionar novos textos
-                        if os.path.exists(FAISS_INDEX_PATH):
-                            vector_store_to_update = FAISS.load_local(FAISS_INDEX_PATH, embeddings, allow_dangerous_deserialization=True)
-                            vector_store_to_update.add_texts(new_text_chunks)
-                            vector_store_to_update.save_local(FAISS_INDEX_PATH)
-                        else: # Cria um novo se não existir
-                            new_vector_store = FAISS.from_texts(new_text_chunks, embedding=embeddings)
-                            new_vector_store.save_local(FAISS_INDEX_PATH)
-                        
-                        save_manifest(drive_files)
-                        st.success("Base de conhecimento atualizada!")
-                        st.rerun()
+            st.caption(f"Última sincronização: {status['updated_at']}")
+        if get_index_version(FAISS_INDEX_PATH) != st.session_state.index_version:
+            st.rerun()  # há um índice novo: recarrega a página inteira para usá-lo
+
+    show_sync_status()
 
 
 # --- ÁREA DE CHAT ---
 st.subheader("Chat")
 
-if st.session_state.conversation is None:
+if st.session_state.index_version is None:
     st.info("Sincronize com o Google Drive para carregar a base de conhecimento.")
 
 for msg in st.session_state.get("chat_history", []):
@@ -286,12 +317,34 @@ else:
     question = ""
 
 if question:
+    try:
+        with st.spinner("Carregando base de conhecimento..."):
+            st.session_state.conversation = conversation_future.result()
+    except Exception as e:
+        st.error(f"Erro ao carregar base local: {e}")
+        st.stop()
     if st.session_state.conversation:
         with st.chat_message("user"): st.markdown(question)
         config = {"configurable": {"session_id": "streamlit_user"}}
         with st.chat_message("assistant"):
+            answer_area = st.empty()
+            sources_area = st.empty()
+
+            def show_sources(documents):
+                sources = format_sources(documents)
+                if sources:
+                    sources_area.caption(f"Fontes: {sources}")
+
+            # O histórico da conversa é gravado pela própria chain quando o stream termina
             with st.spinner("Pensando..."):
-                response = st.session_state.conversation.invoke({"input": question}, config)
-                st.markdown(response["answer"])
+                stream = stream_answer(st.session_state.conversation.stream({"input": question}, config), show_sources)
+                first_token = next(stream, "")
+            answer_area.write_stream(itertools.chain([first_token], stream))
     else:
         st.warning("A base de conhecimento não está carregada. Sincronize com o Drive.")
+
+# --- DIAGNÓSTICO ---
+# No fim do script, para já incluir os tempos da pergunta que acabou de ser respondida
+with st.sidebar:
+    if st.toggle("Mostrar diagnóstico", help="Tempo de cada estágio, tokens usados e caches."):
+        show_diagnostics(api_key)
@@ -0,0 +1,220 @@
+# metrics.py
+
+import json
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from context_budget import count_message_tokens, estimate_tokens
+
+# --- CONSTANTES ---
+METRICS_WINDOW = 1000          # durações recentes guardadas por estágio, para os percentis
+PROMETHEUS_PREFIX = "literagent"
+
+# Execuções da chain (pelo `run_name`) medidas como estágios da resposta
+CHAT_STAGES = {
+    "retrieval_chain": "chat.answer",
+    "rewrite_llm": "chat.rewrite",
+    "retrieve_documents": "chat.retrieval",
+    "answer_llm": "chat.generation",
+}
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, round(fraction * (len(values) - 1)))]
+
+class _Stage:
+    def __init__(self, window):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.items = 0
+        self.bytes = 0
+        self.recent = deque(maxlen=window)
+
+class Metrics:
+    """Durações por estágio e contadores, em memória e seguros entre threads.
+
+    Cada estágio acumula o número de execuções, o tempo total e máximo, os itens e
+    bytes processados e as últimas `window` durações (para p50/p95). Os contadores
+    guardam o resto: erros, tokens, acertos de cache.
+    """
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = Counter()
+
+    def observe(self, stage, seconds, items=0, nbytes=0):
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = _Stage(self.window)
+            entry.count += 1
+            entry.total += seconds
+            entry.max = max(entry.max, seconds)
+            entry.items += items
+            entry.bytes += nbytes
+            entry.recent.append(seconds)
+
+    @contextmanager
+    def timer(self, stage, items=0, nbytes=0):
+        """Mede o bloco como uma execução de `stage`.
+
+        O bloco recebe um dicionário em que pode informar "items" e "bytes" quando só
+        os conhece no final. Se o bloco levantar uma exceção, conta `<stage>.errors`.
+        """
+        span = {"items": items, "bytes": nbytes}
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException:
+            self.increment(f"{stage}.errors")
+            raise
+        self.observe(stage, time.perf_counter() - start, span["items"], span["bytes"])
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def reset(self, prefixes=None):
+        """Zera tudo, ou só os estágios e contadores cujo nome começa com um de `prefixes`."""
+        with self._lock:
+            if prefixes is None:
+                self._stages.clear()
+                self._counters.clear()
+                return
+            prefixes = tuple(prefixes)
+            for table in (self._stages, self._counters):
+                for name in [name for name in table if name.startswith(prefixes)]:
+                    del table[name]
+
+    def snapshot(self):
+        """Retrato serializável em JSON: {"stages": {...}, "counters": {...}}, tempos em segundos."""
+        with self._lock:
+            stages = {}
+            for name, entry in sorted(self._stages.items()):
+                recent = sorted(entry.recent)
+                stages[name] = {
+                    "count": entry.count,
+                    "total_s": round(entry.total, 6),
+                    "mean_s": round(entry.total / entry.count, 6),
+                    "p50_s": round(_percentile(recent, 0.5), 6),
+                    "p95_s": round(_percentile(recent, 0.95), 6),
+                    "max_s": round(entry.max, 6),
+                    "items": entry.items,
+                    "bytes": entry.bytes,
+                }
+            return {"stages": stages, "counters": dict(sorted(self._counters.items()))}
+
+# Registro do processo: a sincronização e a chain registram aqui
+metrics = Metrics()
+
+# --- EXPORTAÇÃO ---
+
+def to_json(snapshot):
+    return json.dumps(snapshot, indent=2, ensure_ascii=False)
+
+def _metric_name(name):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", f"{PROMETHEUS_PREFIX}_{name}")
+
+def to_prometheus(snapshot):
+    """Formato texto de exposição do Prometheus (um resumo por estágio e um contador por nome)."""
+    stages = snapshot["stages"]
+    lines = []
+    if stages:
+        name = _metric_name("stage_seconds")
+        lines += [f"# HELP {name} Duração dos estágios da sincronização e da resposta.", f"# TYPE {name} summary"]
+        for stage, entry in stages.items():
+            lines += [
+                f'{name}{{stage="{stage}",quantile="0.5"}} {entry["p50_s"]}',
+                f'{name}{{stage="{stage}",quantile="0.95"}} {entry["p95_s"]}',
+                f'{name}_sum{{stage="{stage}"}} {entry["total_s"]}',
+                f'{name}_count{{stage="{stage}"}} {entry["count"]}',
+            ]
+        for field in ("items", "bytes"):
+            name = _metric_name(f"stage_{field}_total")
+            lines += [f"# TYPE {name} counter"]
+            lines += [f'{name}{{stage="{stage}"}} {entry[field]}' for stage, entry in stages.items()]
+    for counter, value in snapshot["counters"].items():
+        name = _metric_name(f"{counter}_total")
+        lines += [f"# TYPE {name} counter", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+# --- CHAIN ---
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Mede os estágios da chain de resposta (ver `CHAT_STAGES`) e conta os tokens.
+
+    Os tokens vêm de `usage_metadata` quando o modelo os informa; senão, são
+    estimados localmente, como no orçamento do prompt. `chat.first_token` é o tempo
+    entre o início da geração e o primeiro token no streaming.
+    """
+
+    def __init__(self, registry=metrics):
+        self.registry = registry
+        self._runs = {}
+
+    def _start(self, run_id, name, **extra):
+        stage = CHAT_STAGES.get(name)
+        if stage is not None:
+            self._runs[run_id] = {"stage": stage, "start": time.perf_counter(), **extra}
+
+    def _end(self, run_id, items=0):
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            self.registry.observe(run["stage"], time.perf_counter() - run["start"], items)
+        return run
+
+    def _error(self, run_id):
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            self.registry.increment(f"{run['stage']}.errors")
+
+    def on_chain_start(self, serialized, inputs, *, run_id, name=None, **kwargs):
+        self._start(run_id, name)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._error(run_id)
+
+    def on_retriever_start(self, serialized, query, *, run_id, name=None, **kwargs):
+        self._start(run_id, name)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, items=len(documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._error(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, name=None, **kwargs):
+        self._start(run_id, name, input_tokens=sum(count_message_tokens(batch) for batch in messages), streamed=False)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and not run["streamed"]:
+            run["streamed"] = True
+            self.registry.observe("chat.first_token", time.perf_counter() - run["start"])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._end(run_id)
+        if run is None:
+            return
+        generation = response.generations[0][0]
+        usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+        if usage:
+            input_tokens, output_tokens = usage["input_tokens"], usage["output_tokens"]
+        else:
+            input_tokens, output_tokens = run["input_tokens"], estimate_tokens(generation.text)
+        prefix = run["stage"].replace("chat.", "tokens.")
+        self.registry.increment(f"{prefix}.input", input_tokens)
+        self.registry.increment(f"{prefix}.output", output_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._error(run_id)
@@ -0,0 +1,87 @@
+# page_cache.py
+
+import sqlite3
+import threading
+
+PAGE_CACHE_FILE = "page_cache.sqlite"
+
+class PageCache:
+    """Texto extraído de cada página, em SQLite, por (id do arquivo, página, modifiedTime).
+
+    Só a versão mais recente de cada arquivo é guardada: gravar páginas de uma versão
+    nova (outro `modified_time` ou outra `version` da extração) apaga as da anterior.
+    Páginas sem texto também ficam guardadas, para não serem lidas de novo. `hits`
+    conta as páginas servidas pelo cache.
+    """
+
+    def __init__(self, path=PAGE_CACHE_FILE):
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " file_id TEXT PRIMARY KEY, modified_time TEXT NOT NULL, version TEXT NOT NULL, page_count INTEGER)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " file_id TEXT NOT NULL, page INTEGER NOT NULL, text TEXT NOT NULL, PRIMARY KEY (file_id, page))"
+        )
+        self._conn.commit()
+
+    def _page_count(self, file_id, modified_time, version):
+        row = self._conn.execute(
+            "SELECT page_count FROM files WHERE file_id = ? AND modified_time = ? AND version = ?",
+            (file_id, modified_time, version),
+        ).fetchone()
+        return (True, row[0]) if row else (False, None)
+
+    def get(self, file_id, modified_time, version):
+        """(número de páginas ou None, {página: texto}) guardados para esta versão do arquivo."""
+        with self._lock:
+            found, page_count = self._page_count(file_id, modified_time, version)
+            if not found:
+                return None, {}
+            texts = dict(self._conn.execute("SELECT page, text FROM pages WHERE file_id = ?", (file_id,)))
+            self.hits += len(texts)
+        return page_count, texts
+
+    def is_complete(self, file_id, modified_time, version):
+        """Todas as páginas desta versão do arquivo estão no cache?"""
+        with self._lock:
+            found, page_count = self._page_count(file_id, modified_time, version)
+            if not found or page_count is None:
+                return False
+            stored = self._conn.execute("SELECT COUNT(*) FROM pages WHERE file_id = ?", (file_id,)).fetchone()[0]
+        return stored == page_count
+
+    def store(self, file_id, modified_time, version, texts=None, page_count=None):
+        """Guarda {página: texto} (e o número de páginas, se conhecido) desta versão do arquivo."""
+        with self._lock:
+            found, known_count = self._page_count(file_id, modified_time, version)
+            if not found:
+                self._conn.execute("DELETE FROM pages WHERE file_id = ?", (file_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (file_id, modified_time, version, page_count) VALUES (?, ?, ?, ?)",
+                (file_id, modified_time, version, page_count if page_count is not None else known_count),
+            )
+            if texts:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO pages (file_id, page, text) VALUES (?, ?, ?)",
+                    [(file_id, page, text) for page, text in texts.items()],
+                )
+            self._conn.commit()
+
+    def forget(self, file_ids):
+        """Descarta as páginas dos arquivos (removidos do Drive)."""
+        with self._lock:
+            for table in ("files", "pages"):
+                self._conn.executemany(f"DELETE FROM {table} WHERE file_id = ?", [(fid,) for fid in file_ids])
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            files, pages = (self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                            for table in ("files", "pages"))
+            hits = self.hits
+        return {"hits": hits, "files": files, "pages": pages}
@@ -0,0 +1,211 @@
+# pdf_extraction.py
+
+import hashlib
+import logging
+import os
+import time
+from functools import lru_cache
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# --- CONSTANTES ---
+EXTRACTION_VERSION = 2            # muda quando o texto extraído muda, invalidando o cache de páginas
+PAGES_PER_TASK = 32               # páginas por tarefa no pool de extração
+WIDE_BLOCK_FRACTION = 0.6         # blocos mais largos que isso (da página) cruzam as colunas: títulos, rodapés
+OCR_BACKEND = os.getenv("LITERAGENT_OCR_BACKEND", "none")        # ver OCR_BACKENDS; "tesseract" liga o OCR
+OCR_LANGUAGE = os.getenv("LITERAGENT_OCR_LANGUAGE", "por")       # idiomas do Tesseract, como "por+eng"
+OCR_DPI = 300
+OCR_MIN_CHARS = 20                # páginas com imagens e menos texto que isso são tratadas como digitalizadas
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _open_pdf(source):
+    import fitz  # PyMuPDF, carregado só quando algum PDF é aberto
+
+    if isinstance(source, str):
+        return fitz.open(source)
+    data = source if isinstance(source, bytes) else source.read()
+    return fitz.open(stream=data, filetype="pdf")
+
+# --- LAYOUT ---
+# O texto de cada página sai dos blocos do PyMuPDF (parágrafos, com hifenização desfeita),
+# na ordem de leitura: em páginas com várias colunas, cada coluna é lida de cima a baixo
+# antes da seguinte, em vez de as linhas das colunas saírem intercaladas.
+
+def _spans_columns(block, blocks):
+    """O bloco fica sobre duas colunas, isto é, cruza horizontalmente dois blocos que não se cruzam?"""
+    overlapping = [other for other in blocks if other is not block and other[0] < block[2] and block[0] < other[2]]
+    return bool(overlapping) and min(other[2] for other in overlapping) <= max(other[0] for other in overlapping)
+
+def order_blocks(blocks, page_width):
+    """Ordena os blocos de texto (x0, y0, x1, y1, texto, ...) de uma página na ordem de leitura.
+
+    Blocos largos ou que atravessam colunas (títulos, rodapés, texto de uma coluna só)
+    dividem a página em faixas; dentro de cada faixa, os demais blocos são agrupados
+    em colunas pela sobreposição horizontal, e as colunas são lidas da esquerda para a
+    direita.
+    """
+    wide = {id(block) for block in blocks
+            if block[2] - block[0] > WIDE_BLOCK_FRACTION * page_width or _spans_columns(block, blocks)}
+    ordered = []
+    band = []
+
+    def flush_band():
+        columns = []
+        for block in sorted(band, key=lambda b: b[0]):
+            if columns and block[0] < columns[-1]["right"]:
+                columns[-1]["blocks"].append(block)
+                columns[-1]["right"] = max(columns[-1]["right"], block[2])
+            else:
+                columns.append({"right": block[2], "blocks": [block]})
+        for column in columns:
+            ordered.extend(sorted(column["blocks"], key=lambda b: b[1]))
+        band.clear()
+
+    for block in sorted(blocks, key=lambda b: (b[1], b[0])):
+        if id(block) in wide:
+            flush_band()
+            ordered.append(block)
+        else:
+            band.append(block)
+    flush_band()
+    return ordered
+
+def page_text(page, textpage=None):
+    """Texto da página (ou da camada de OCR em `textpage`), bloco a bloco, na ordem de leitura."""
+    import fitz
+
+    blocks = page.get_text("blocks", flags=fitz.TEXTFLAGS_BLOCKS | fitz.TEXT_DEHYPHENATE, textpage=textpage)
+    blocks = [block for block in blocks if block[6] == 0 and block[4].strip()]  # só blocos de texto
+    # Parágrafos separados por linha em branco, onde o chunking prefere dividir; a página
+    # termina em uma quebra de linha simples, porque o texto pode continuar na seguinte
+    text = "\n\n".join(block[4].strip() for block in order_blocks(blocks, page.rect.width))
+    return text + "\n" if text else text
+
+# --- OCR ---
+# Um backend recebe a página do PyMuPDF e os idiomas e retorna o texto reconhecido, ou
+# None se não puder reconhecer. Só as páginas que são apenas imagem (livros digitalizados)
+# passam por ele. "tesseract" usa o OCR embutido no PyMuPDF, que precisa do Tesseract
+# instalado localmente; sem ele, as páginas digitalizadas continuam sem texto.
+
+@lru_cache(maxsize=1)
+def _tessdata():
+    import fitz
+
+    try:
+        return fitz.get_tessdata()
+    except RuntimeError as e:
+        logger.warning("OCR indisponível, páginas digitalizadas ficarão sem texto: %s", e)
+        return None
+
+def ocr_tesseract(page, language):
+    tessdata = _tessdata()
+    if tessdata is None:
+        return None
+    textpage = page.get_textpage_ocr(language=language, dpi=OCR_DPI, full=True, tessdata=tessdata)
+    return page_text(page, textpage)
+
+OCR_BACKENDS = {"tesseract": ocr_tesseract, "none": None}
+
+def register_ocr_backend(name, recognize):
+    """Disponibiliza `recognize(page, language)` como backend de OCR `name`.
+
+    A função é enviada aos processos de extração, então precisa ser definida no nível
+    de um módulo importável.
+    """
+    OCR_BACKENDS[name] = recognize
+
+def get_ocr_backend(name):
+    """Função de OCR do backend `name` (None para "none"); ValueError se ele não existir."""
+    if name not in OCR_BACKENDS:
+        raise ValueError(f"Backend de OCR desconhecido: {name!r} (opções: {', '.join(sorted(OCR_BACKENDS))})")
+    return OCR_BACKENDS[name]
+
+def is_image_only(page, text):
+    return len(text.strip()) < OCR_MIN_CHARS and bool(page.get_images())
+
+def _extract_page(page, ocr, language):
+    """(texto, passou pelo OCR?) de uma página."""
+    text = page_text(page)
+    if ocr is not None and is_image_only(page, text):
+        recognized = ocr(page, language)
+        if recognized is not None:
+            return recognized, True
+    return text, False
+
+# --- EXTRAÇÃO ---
+
+def pages_to_documents(file_id, file_name, texts):
+    """Um `Document` por página com texto, a partir de {número da página: texto}."""
+    return [
+        Document(page_content=text, metadata={
+            "file_id": file_id,
+            "file_name": file_name,
+            "page": number,
+            "content_hash": content_hash(text),
+        })
+        for number, text in sorted(texts.items()) if text.strip()
+    ]
+
+def get_pdf_text(pdf_docs, ocr=OCR_BACKENDS.get(OCR_BACKEND), language=OCR_LANGUAGE):
+    """Gera um `Document` por página com texto, arquivo por arquivo.
+
+    `pdf_docs` é um iterável de tuplas (file_id, file_name, origem), em que a origem é
+    um caminho, os bytes do PDF ou um stream. Cada página traz nos metadados o id e o
+    nome do arquivo, o número da página (a partir de 1) e o hash do conteúdo. Páginas
+    que são só imagem passam pelo OCR `ocr` (ver `OCR_BACKENDS`), se houver.
+    """
+    for file_id, file_name, source in pdf_docs:
+        with _open_pdf(source) as doc:
+            for page in doc:
+                text, _ = _extract_page(page, ocr, language)
+                yield from pages_to_documents(file_id, file_name, {page.number + 1: text})
+
+def count_pdf_pages(path):
+    with _open_pdf(path) as doc:
+        return doc.page_count
+
+def page_ranges(page_count, done=(), pages_per_task=PAGES_PER_TASK):
+    """Intervalos [início, fim) de páginas (a partir de 1) que faltam em `done`, com até `pages_per_task` páginas."""
+    ranges = []
+    for number in range(1, page_count + 1):
+        if number in done:
+            continue
+        if ranges and ranges[-1][1] == number and number - ranges[-1][0] < pages_per_task:
+            ranges[-1][1] = number + 1
+        else:
+            ranges.append([number, number + 1])
+    return [tuple(r) for r in ranges]
+
+def extract_pages(path, start, stop, ocr=None, language=OCR_LANGUAGE):
+    """Texto das páginas [start, stop) de um PDF em disco: ({página: texto}, páginas que passaram pelo OCR).
+
+    Páginas sem texto também entram (com ""), para que o cache saiba que já foram lidas.
+    Roda nos processos de extração do pipeline de sincronização, por isso recebe um
+    caminho (barato de enviar entre processos) em vez dos bytes do arquivo.
+    """
+    texts = {}
+    ocr_pages = []
+    with _open_pdf(path) as doc:
+        for number in range(start, stop):
+            text, used_ocr = _extract_page(doc[number - 1], ocr, language)
+            texts[number] = text
+            if used_ocr:
+                ocr_pages.append(number)
+    return texts, ocr_pages
+
+def timed_extract_pages(path, start, stop, ocr=None, language=OCR_LANGUAGE):
+    """Como `extract_pages`, mas retorna também os segundos gastos, medidos no processo de extração."""
+    began = time.perf_counter()
+    texts, ocr_pages = extract_pages(path, start, stop, ocr, language)
+    return texts, ocr_pages, time.perf_counter() - began
+
+def extract_pdf_file(path, file_id, file_name, ocr=None):
+    """Extrai as páginas com texto de um PDF salvo em disco."""
+    with _open_pdf(path) as doc:
+        page_count = doc.page_count
+    texts, _ = extract_pages(path, 1, page_count + 1, ocr)
+    return pages_to_documents(file_id, file_name, texts)
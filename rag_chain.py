@@ -0,0 +1,165 @@
+# rag_chain.py
+
+import logging
+import os
+import re
+from functools import lru_cache
+
+from langchain_core.messages import convert_to_messages
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableBranch, RunnableLambda, RunnablePassthrough
+from langchain_community.chat_message_histories import StreamlitChatMessageHistory
+from langchain_core.runnables.history import RunnableWithMessageHistory
+
+from context_budget import (CONTEXT_TOKEN_BUDGET, HISTORY_TOKEN_BUDGET, estimate_tokens, fit_context, fit_history,
+                            log_prompt_tokens)
+from metrics import MetricsCallbackHandler, metrics
+from retrieval import HybridRetriever
+
+logger = logging.getLogger(__name__)
+
+# --- CONSTANTES ---
+REWRITE_MODEL = os.getenv("LITERAGENT_REWRITE_MODEL", "gemini-2.5-flash-lite")
+REWRITE_HISTORY_MESSAGES = 6   # mensagens mais recentes consideradas na reformulação
+REWRITE_CACHE_SIZE = 1024      # reformulações memorizadas por chain
+MIN_STANDALONE_WORDS = 5       # perguntas mais curtas quase sempre dependem do contexto
+
+# Palavras que indicam que a pergunta se apoia na conversa anterior
+_FOLLOW_UP_WORDS = {
+    "ele", "ela", "eles", "elas", "dele", "dela", "deles", "delas", "nele", "nela",
+    "isso", "isto", "disso", "disto", "nisso", "nisto", "aquilo", "daquilo",
+    "esse", "essa", "esses", "essas", "desse", "dessa", "nesse", "nessa",
+    "este", "esta", "estes", "estas", "deste", "desta", "neste", "nesta",
+    "aquele", "aquela", "daquele", "daquela", "mesmo", "mesma", "anterior", "acima",
+    "também", "outro", "outra", "outros", "outras", "lhe", "continue", "continua",
+    "it", "its", "this", "that", "these", "those", "he", "she", "they", "them", "his", "her", "their",
+}
+_FOLLOW_UP_OPENERS = ("e ", "mas ", "então ", "ou ", "and ", "but ", "so ", "what about")
+
+CONTEXTUALIZE_Q_SYSTEM_PROMPT = "Dada uma conversa e uma pergunta de acompanhamento, reformule a pergunta de acompanhamento para ser uma pergunta independente, em seu idioma original."
+QA_SYSTEM_PROMPT = "Você é um assistente de resposta a perguntas. Use somente o contexto fornecido para responder à pergunta. Se a resposta não estiver no contexto, diga que você não tem a informação. Não use conhecimento externo.\n\nContexto: {context}"
+
+def is_standalone(question):
+    """Heurística barata: a pergunta pode ser buscada sem o histórico da conversa?
+
+    Perguntas longas o bastante, sem pronomes ou demonstrativos que apontem para
+    mensagens anteriores e que não comecem como continuação ("e...", "mas...") são
+    consideradas independentes.
+    """
+    text = question.strip().lower()
+    words = re.findall(r"\w+", text)
+    if len(words) < MIN_STANDALONE_WORDS or text.startswith(_FOLLOW_UP_OPENERS):
+        return False
+    return not _FOLLOW_UP_WORDS.intersection(words)
+
+def create_question_rewriter(rewrite_llm, registry=metrics):
+    """Retorna uma função que transforma {"input", "chat_history"} na consulta para o retriever.
+
+    A reformulação só chama o modelo quando há histórico e a pergunta não é
+    independente, e usa apenas as últimas mensagens da conversa. O resultado é
+    memorizado por (histórico recente, pergunta).
+    """
+    contextualize_q_prompt = ChatPromptTemplate.from_messages([
+        ("system", CONTEXTUALIZE_Q_SYSTEM_PROMPT),
+        MessagesPlaceholder("chat_history"),
+        ("human", "{input}")
+    ])
+    rewrite_chain = contextualize_q_prompt | rewrite_llm.with_config(run_name="rewrite_llm") | StrOutputParser()
+
+    @lru_cache(maxsize=REWRITE_CACHE_SIZE)
+    def rewrite(history, question):
+        return rewrite_chain.invoke({"input": question, "chat_history": convert_to_messages(list(history))})
+
+    def contextualize(inputs):
+        question = inputs["input"]
+        history = inputs.get("chat_history") or []
+        if not history or is_standalone(question):
+            registry.increment("chat.rewrite.skipped")
+            return question
+        recent = tuple((message.type, message.content) for message in history[-REWRITE_HISTORY_MESSAGES:])
+        return rewrite(recent, question)
+
+    return contextualize
+
+def build_rag_chain(llm, rewrite_llm, retriever, embeddings=None, answer_cache=None, cache_scope=None,
+                    context_token_budget=CONTEXT_TOKEN_BUDGET, history_token_budget=HISTORY_TOKEN_BUDGET,
+                    registry=metrics):
+    """Monta a chain de busca + resposta; `rewrite_llm` só reformula perguntas de acompanhamento.
+
+    Com `answer_cache`, a pergunta já reformulada é convertida em embedding (o mesmo
+    que a busca usa depois, sem calculá-lo de novo) e, se uma pergunta parecida
+    já foi respondida no mesmo `cache_scope`, a resposta guardada volta sem busca nem
+    geração. As respostas novas são guardadas quando a geração termina.
+
+    Antes da geração, os trechos perdem a sobreposição entre vizinhos e são reduzidos
+    às frases mais relevantes, e o histórico às mensagens mais recentes, até caberem
+    em `context_token_budget` e `history_token_budget` (ver `context_budget`).
+
+    A duração de cada estágio (reformulação, busca, geração) e os tokens usados são
+    registrados em `registry` (ver `metrics`).
+    """
+    qa_prompt = ChatPromptTemplate.from_messages([
+        ("system", QA_SYSTEM_PROMPT),
+        MessagesPlaceholder("chat_history"),
+        ("human", "{input}")
+    ])
+
+    def fit_prompt_inputs(inputs):
+        # Trechos e histórico são cortados para caber no orçamento de tokens antes do prompt
+        context = fit_context(inputs["context"], inputs["query"], context_token_budget)
+        history = fit_history(inputs["chat_history"], history_token_budget)
+        logger.info("contexto: ~%d → ~%d tokens; histórico: %d → %d mensagens",
+                    sum(estimate_tokens(doc.page_content) for doc in inputs["context"]),
+                    sum(estimate_tokens(doc.page_content) for doc in context),
+                    len(inputs["chat_history"]), len(history))
+        return {**inputs, "context": "\n\n".join(doc.page_content for doc in context), "chat_history": history}
+
+    question_answer_chain = (
+        RunnableLambda(fit_prompt_inputs) | qa_prompt | RunnableLambda(log_prompt_tokens)
+        | llm.with_config(run_name="answer_llm") | StrOutputParser()
+    ).with_config(run_name="stuff_documents_chain")
+    retriever = retriever.with_config(run_name="retrieve_documents")
+
+    def retrieve(inputs, config):
+        # O embedding calculado para o cache de respostas serve também à busca
+        if "query_vector" in inputs and isinstance(retriever.bound, HybridRetriever):
+            return retriever.invoke(inputs["query"], config, embedding=inputs["query_vector"])
+        return retriever.invoke(inputs["query"], config)
+
+    retrieve_and_answer = RunnablePassthrough.assign(context=RunnableLambda(retrieve)).assign(answer=question_answer_chain)
+
+    chain = RunnablePassthrough.assign(query=create_question_rewriter(rewrite_llm, registry))
+    if answer_cache is None:
+        chain = chain | retrieve_and_answer
+    else:
+        def store_answer(run):
+            outputs = run.outputs
+            answer_cache.store(cache_scope, outputs["query_vector"], {"answer": outputs["answer"], "context": outputs["context"]})
+
+        chain = chain.assign(
+            query_vector=lambda inputs: embeddings.embed_query(inputs["query"])
+        ).assign(
+            cached=lambda inputs: answer_cache.lookup(cache_scope, inputs["query_vector"])
+        ) | RunnableBranch(
+            (lambda inputs: inputs["cached"] is not None, RunnableLambda(lambda inputs: {**inputs, **inputs["cached"]})),
+            retrieve_and_answer.with_listeners(on_end=store_answer),
+        )
+    return chain.pick(["input", "chat_history", "context", "answer"]).with_config(
+        run_name="retrieval_chain", callbacks=[MetricsCallbackHandler(registry)])
+
+def create_rag_chain(vector_store, api_key, temperature, model_name, rewrite_model=REWRITE_MODEL,
+                     answer_cache=None, index_version=None):
+    """A chain de busca + resposta com os modelos Gemini, sem histórico ligado à sessão do Streamlit."""
+    from langchain_google_genai import ChatGoogleGenerativeAI  # import lento, feito só ao criar a chain
+
+    llm = ChatGoogleGenerativeAI(model=model_name, google_api_key=api_key, temperature=temperature)
+    rewrite_llm = ChatGoogleGenerativeAI(model=rewrite_model, google_api_key=api_key, temperature=0)
+    return build_rag_chain(llm, rewrite_llm, HybridRetriever(vector_store=vector_store), vector_store.embeddings,
+                           answer_cache, cache_scope=(model_name, temperature, index_version))
+
+def get_conversational_rag_chain(vector_store, api_key, temperature, model_name, rewrite_model=REWRITE_MODEL,
+                                 answer_cache=None, index_version=None):
+    rag_chain = create_rag_chain(vector_store, api_key, temperature, model_name, rewrite_model, answer_cache,
+                                 index_version)
+    return RunnableWithMessageHistory(rag_chain, lambda s_id: StreamlitChatMessageHistory(key="chat_history"), input_messages_key="input", history_messages_key="chat_history", output_messages_key="answer")
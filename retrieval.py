@@ -0,0 +1,82 @@
+# retrieval.py
+
+import os
+import re
+
+from langchain_core.retrievers import BaseRetriever
+
+RETRIEVAL_K = int(os.getenv("LITERAGENT_RETRIEVAL_K", 4))               # trechos enviados ao modelo
+RETRIEVAL_FETCH_K = int(os.getenv("LITERAGENT_RETRIEVAL_FETCH_K", 20))  # candidatos de cada busca
+RRF_K = 60                                                              # constante da reciprocal-rank fusion
+MMR_LAMBDA = float(os.getenv("LITERAGENT_MMR_LAMBDA", 0.7))             # 1 desliga a diversificação
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Funde listas ordenadas de ids: cada id soma 1 / (k + posição) em cada lista em que aparece."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+def _terms(text):
+    return set(re.findall(r"\w+", text.lower()))
+
+def mmr_select(candidates, k, mmr_lambda=MMR_LAMBDA):
+    """Escolhe `k` documentos equilibrando relevância e diversidade (maximal marginal relevance).
+
+    `candidates` é uma lista de (documento, pontuação) em ordem de relevância. A
+    semelhança entre documentos é o índice de Jaccard dos seus vocabulários: barata,
+    local e suficiente para descartar trechos quase repetidos (como a sobreposição
+    entre chunks vizinhos).
+    """
+    if mmr_lambda >= 1 or len(candidates) <= k:
+        return [doc for doc, _ in candidates[:k]]
+    top_score = candidates[0][1] or 1.0
+    terms = [_terms(doc.page_content) for doc, _ in candidates]
+    selected = []
+    remaining = list(range(len(candidates)))
+    while remaining and len(selected) < k:
+        def marginal(i):
+            redundancy = max((len(terms[i] & terms[j]) / (len(terms[i] | terms[j]) or 1) for j in selected), default=0.0)
+            return mmr_lambda * candidates[i][1] / top_score - (1 - mmr_lambda) * redundancy
+        best = max(remaining, key=marginal)
+        selected.append(best)
+        remaining.remove(best)
+    return [candidates[i][0] for i in selected]
+
+class HybridRetriever(BaseRetriever):
+    """Busca híbrida: vetorial (FAISS) + palavras-chave (BM25 sobre o chunk store).
+
+    Os candidatos das duas buscas são fundidos por reciprocal-rank fusion, o que
+    recupera trechos com nomes e termos exatos que a busca vetorial deixa passar. Em
+    seguida, um passo opcional de MMR evita enviar ao modelo trechos redundantes, e
+    só os `k` melhores seguem para o prompt.
+
+    Quem já tem o embedding da consulta (a chain, quando consulta o cache de
+    respostas) o passa em `embedding`, e a busca não embeda a consulta de novo:
+    `retriever.invoke(query, embedding=vetor)`.
+    """
+
+    vector_store: object
+    k: int = RETRIEVAL_K
+    fetch_k: int = RETRIEVAL_FETCH_K
+    mmr_lambda: float = MMR_LAMBDA
+
+    def _get_relevant_documents(self, query, *, run_manager=None, embedding=None):
+        vector_store = self.vector_store
+        if embedding is None:
+            embedding = vector_store.embeddings.embed_query(query)
+        vector_docs = [doc for doc, _ in vector_store.similarity_search_with_score_by_vector(embedding, self.fetch_k)]
+        keyword_ids = vector_store.docstore.keyword_search(query, self.fetch_k)
+
+        documents = {doc.id: doc for doc in vector_docs}
+        fused = reciprocal_rank_fusion([[doc.id for doc in vector_docs], keyword_ids])
+        candidates = []
+        for doc_id, score in fused:
+            if doc_id not in documents:
+                doc = vector_store.docstore.search(doc_id)
+                if isinstance(doc, str):
+                    continue  # id sem chunk correspondente
+                documents[doc_id] = doc
+            candidates.append((documents[doc_id], score))
+        return mmr_select(candidates, self.k, self.mmr_lambda)
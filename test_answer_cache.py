@@ -0,0 +1,54 @@
+# test_answer_cache.py
+
+import unittest
+
+from answer_cache import AnswerCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAnswerCache(unittest.TestCase):
+    """Tests for the semantic answer cache lookup, scoping and eviction."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = AnswerCache(threshold=0.9, max_entries=2, ttl=60, clock=self.clock)
+
+    def test_returns_answer_of_similar_question(self):
+        self.cache.store("scope", [1.0, 0.0], "resposta")
+
+        self.assertEqual(self.cache.lookup("scope", [0.99, 0.05]), "resposta")
+        self.assertIsNone(self.cache.lookup("scope", [0.5, 0.5]))
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1})
+
+    def test_answers_are_scoped(self):
+        self.cache.store(("model", 0.3, "index-000001.faiss"), [1.0, 0.0], "resposta")
+
+        self.assertIsNone(self.cache.lookup(("model", 0.3, "index-000002.faiss"), [1.0, 0.0]))
+        self.assertIsNone(self.cache.lookup(("other", 0.3, "index-000001.faiss"), [1.0, 0.0]))
+
+    def test_evicts_least_recently_used(self):
+        self.cache.store("scope", [1.0, 0.0], "a")
+        self.cache.store("scope", [0.0, 1.0], "b")
+        self.cache.lookup("scope", [1.0, 0.0])  # "b" is now the oldest entry
+        self.cache.store("scope", [-1.0, 0.0], "c")
+
+        self.assertEqual(self.cache.lookup("scope", [1.0, 0.0]), "a")
+        self.assertIsNone(self.cache.lookup("scope", [0.0, 1.0]))
+
+    def test_entries_expire(self):
+        self.cache.store("scope", [1.0, 0.0], "resposta")
+        self.clock.now = 61
+
+        self.assertIsNone(self.cache.lookup("scope", [1.0, 0.0]))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
@@ -1,168 +1,75 @@
-# c:\Users\note teste\Documents\Agente RAG\test_assistente_livros.py
+# test_assistente_livros.py
 
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
-from unittest.mock import patch, MagicMock
-import io
-
-# Import functions from your Streamlit app file.
-# Ensure this test file is in the same directory as Assistente_livros.py
-# or that the path is configured correctly.
-from literagent import (
-    get_pdf_text,
-    get_text_chunks,
-    get_vector_store,
-    get_conversation_chain,
-    handle_user_input,
-)
+from unittest.mock import patch
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import gdrive
+import ingest
+import ingestion
+from fakes import FakeChatModel, FakeDriveService, add_synthetic_corpus, synthetic_pdf
+from rag_chain import build_rag_chain
+from retrieval import HybridRetriever
+from vector_index import read_vector_store
+
 
 class TestAssistenteLivros(unittest.TestCase):
-    """Unit tests for the core functions of the book assistant app."""
-
-    def test_get_pdf_text(self):
-        """Tests the PDF text extraction function."""
-        # Mock PyPDF2.PdfReader
-        mock_pdf_reader = MagicMock()
-        mock_page1 = MagicMock()
-        mock_page1.extract_text.return_value = "This is page 1. "
-        mock_page2 = MagicMock()
-        mock_page2.extract_text.return_value = "This is page 2."
-        mock_pdf_reader.pages = [mock_page1, mock_page2]
-
-        # Patch the PdfReader class in the context of the Assistente_livros module
-        with patch('Assistente_livros.PdfReader', return_value=mock_pdf_reader) as mock_pdf_reader_class:
-            # Create a dummy file-like object to simulate an uploaded PDF
-            pdf_docs = [io.BytesIO(b"dummy pdf content")]
-            text = get_pdf_text(pdf_docs)
-
-            # Assert that PdfReader was instantiated with the dummy file
-            mock_pdf_reader_class.assert_called_once_with(pdf_docs[0])
-            # Assert that the text from all pages was concatenated
-            self.assertEqual(text, "This is page 1. This is page 2.")
-
-    def test_get_text_chunks(self):
-        """Tests the text chunking function."""
-        # Create a long string to be chunked
-        long_text = "a" * 2000
-        chunks = get_text_chunks(long_text)
-
-        # Assert that the output is a list and has more than one chunk
-        self.assertIsInstance(chunks, list)
-        self.assertTrue(len(chunks) > 1)
-        # Assert the length of the first chunk matches the chunk_size parameter
-        self.assertEqual(len(chunks[0]), 1000)
-
-    @patch('Assistente_livros.FAISS')
-    @patch('Assistente_livros.GoogleGenerativeAIEmbeddings')
-    def test_get_vector_store_success(self, mock_embeddings, mock_faiss):
-        """Tests the vector store creation on success."""
-        text_chunks = ["chunk1", "chunk2"]
-        api_key = "test_api_key"
-
-        # Mock the return values of the external libraries
-        mock_embeddings_instance = MagicMock()
-        mock_embeddings.return_value = mock_embeddings_instance
-        mock_vector_store_instance = MagicMock()
-        mock_faiss.from_texts.return_value = mock_vector_store_instance
-
-        vector_store = get_vector_store(text_chunks, api_key)
-
-        # Assert that the embedding model was called correctly
-        mock_embeddings.assert_called_once_with(model="models/embedding-001", google_api_key=api_key)
-        # Assert that FAISS was used to create the vector store from texts
-        mock_faiss.from_texts.assert_called_once_with(text_chunks, embedding=mock_embeddings_instance)
-        # Assert that the function returns the created vector store
-        self.assertEqual(vector_store, mock_vector_store_instance)
-
-    @patch('Assistente_livros.st')
-    @patch('Assistente_livros.GoogleGenerativeAIEmbeddings')
-    def test_get_vector_store_failure(self, mock_embeddings, mock_st):
-        """Tests the vector store creation on failure (e.g., bad API key)."""
-        text_chunks = ["chunk1", "chunk2"]
-        api_key = "invalid_api_key"
-
-        # Configure the mock to raise an exception, simulating an API error
-        mock_embeddings.side_effect = Exception("API Key Error")
-
-        vector_store = get_vector_store(text_chunks, api_key)
-
-        # Assert that the function returns None on failure
-        self.assertIsNone(vector_store)
-        # Assert that error messages were shown to the user via Streamlit
-        self.assertEqual(mock_st.error.call_count, 2)
-        mock_st.error.assert_any_call("Erro ao criar o vector store: API Key Error")
-
-    @patch('Assistente_livros.ConversationalRetrievalChain')
-    @patch('Assistente_livros.ChatGoogleGenerativeAI')
-    @patch('Assistente_livros.ConversationBufferMemory')
-    def test_get_conversation_chain(self, mock_memory, mock_llm, mock_chain):
-        """Tests the creation of the conversational chain."""
-        mock_vector_store = MagicMock()
-        mock_retriever = MagicMock()
-        mock_vector_store.as_retriever.return_value = mock_retriever
-        api_key = "test_api_key"
-
-        # Mock the instances created within the function
-        mock_llm_instance = MagicMock()
-        mock_llm.return_value = mock_llm_instance
-        mock_memory_instance = MagicMock()
-        mock_memory.return_value = mock_memory_instance
-        mock_chain_instance = MagicMock()
-        mock_chain.from_llm.return_value = mock_chain_instance
-
-        conversation_chain = get_conversation_chain(mock_vector_store, api_key)
-
-        # Assert that the LLM and memory were configured correctly
-        mock_llm.assert_called_once_with(model="gemini-pro", google_api_key=api_key, temperature=0.3)
-        mock_memory.assert_called_once_with(memory_key="chat_history", return_messages=True)
-        
-        # Assert that the final chain was created with the correct components
-        mock_chain.from_llm.assert_called_once()
-        args, kwargs = mock_chain.from_llm.call_args
-        self.assertEqual(kwargs['llm'], mock_llm_instance)
-        self.assertEqual(kwargs['retriever'], mock_retriever)
-        self.assertEqual(kwargs['memory'], mock_memory_instance)
-        self.assertIn('prompt', kwargs['combine_docs_chain_kwargs'])
-        self.assertEqual(conversation_chain, mock_chain_instance)
-
-    @patch('Assistente_livros.st')
-    def test_handle_user_input_with_conversation(self, mock_st):
-        """Tests user input handling when a conversation is active."""
-        # Mock the conversation chain, which is a callable
-        mock_conversation = MagicMock()
-        mock_conversation.return_value = {'answer': 'This is the AI response.'}
-        
-        # Mock Streamlit's session state
-        mock_st.session_state.conversation = mock_conversation
-        mock_st.session_state.chat_history = []
-
-        user_question = "What is the summary?"
-        handle_user_input(user_question)
-
-        # Assert the conversation chain was called with the user's question
-        mock_conversation.assert_called_once_with({'question': user_question})
-
-        # Assert the chat history was updated correctly (user question first, then AI answer)
-        expected_history = [
-            {"role": "user", "content": "What is the summary?"},
-            {"role": "assistant", "content": "This is the AI response."}
-        ]
-        self.assertEqual(mock_st.session_state.chat_history, expected_history)
-
-        # Assert that the chat messages were displayed
-        self.assertEqual(mock_st.chat_message.call_count, 2)
-        self.assertEqual(mock_st.markdown.call_count, 2)
-
-    @patch('Assistente_livros.st')
-    def test_handle_user_input_no_conversation(self, mock_st):
-        """Tests user input handling when no conversation is active."""
-        # Set session state to have no active conversation
-        mock_st.session_state.conversation = None
-
-        handle_user_input("A question")
-
-        # Assert that a warning is shown to the user
-        mock_st.warning.assert_called_once_with("Por favor, processe seus PDFs primeiro.")
+    """End-to-end test of the book assistant without network access: Drive -> index -> answer."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.index_path = os.path.join(self.tmp_dir, "faiss_index")
+        for module, name, value in [(ingestion, "FAISS_MANIFEST_FILE", os.path.join(self.tmp_dir, "manifest.json")),
+                                    (ingest, "SYNC_LOCK_FILE", os.path.join(self.tmp_dir, "sync.lock")),
+                                    (ingest, "SYNC_STATUS_FILE", os.path.join(self.tmp_dir, "status.json")),
+                                    # Small download chunks, so each PDF arrives in several parts
+                                    (gdrive, "DOWNLOAD_CHUNK_SIZE", 1024)]:
+            patcher = patch.object(module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.embeddings = DeterministicFakeEmbedding(size=32)
+
+        self.drive = FakeDriveService()
+        add_synthetic_corpus(self.drive, "acervo", 4, files_per_folder=2, pages=2)
+        self.drive.add_file("casmurro", "acervo-0001", "Dom Casmurro.pdf",
+                            content=synthetic_pdf("casmurro", pages=1, words_per_page=20))
+
+    def test_synced_corpus_answers_with_sources(self):
+        summary = ingest.run_sync("acervo", self.embeddings, service_factory=lambda: self.drive,
+                                  index_path=self.index_path, extract_workers=1)
+        self.assertEqual((summary["processed"], summary["failed"]), (5, {}))
+        self.assertGreater(self.drive.calls["files.get_media"], 5)
+
+        vector_store = read_vector_store(self.index_path, self.embeddings, read_only=True)
+        self.addCleanup(vector_store.docstore.close)
+        question = vector_store.docstore.search("casmurro:0").page_content.split(".")[0]
+        llm = FakeChatModel(responses=["Resposta sobre Dom Casmurro."], latency=0.01)
+        chain = build_rag_chain(llm, FakeChatModel(responses=["reescrita"]), HybridRetriever(vector_store=vector_store))
+
+        result = chain.invoke({"input": question, "chat_history": []})
+
+        self.assertEqual(result["answer"], "Resposta sobre Dom Casmurro.")
+        self.assertIn("Dom Casmurro.pdf", [doc.metadata["file_name"] for doc in result["context"]])
+
+
+class TestLazyImports(unittest.TestCase):
+    """The app modules must not load the Drive, PDF, Gemini or speech stacks at import time."""
+
+    def test_heavy_subsystems_load_on_demand(self):
+        code = ("import sys, answer_cache, metrics, rag_chain, vector_index, gdrive, ingestion, ingest, voice; "
+                "print(sorted(m for m in ('fitz', 'googleapiclient', 'google.oauth2', 'langchain_google_genai', "
+                "'langchain.text_splitter', 'speech_recognition') if m in sys.modules))")
+        result = subprocess.run([sys.executable, "-W", "ignore", "-c", code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(result.stdout.strip().splitlines()[-1], "[]")
 
 
 if __name__ == '__main__':
-    unittest.main(argv=['first-arg-is-ignored'], exit=False)
\ No newline at end of file
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
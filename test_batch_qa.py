@@ -0,0 +1,157 @@
+# test_batch_qa.py
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from batch_qa import backoff_delay, classify_error, load_questions, main, retry_after, run_batch
+from metrics import Metrics
+from rag_chain import build_rag_chain
+
+
+class RateLimited(Exception):
+    """Mimics google.api_core's ResourceExhausted: HTTP status in `code`."""
+
+    code = 429
+
+
+class TestRetryPolicy(unittest.TestCase):
+    """Tests for recognising retryable errors and the backoff delays."""
+
+    def test_classify_error(self):
+        self.assertEqual(classify_error(RateLimited("slow down")), "rate_limit")
+        self.assertEqual(classify_error(RuntimeError("429 RESOURCE_EXHAUSTED: quota exceeded")), "rate_limit")
+        self.assertEqual(classify_error(TimeoutError()), "transient")
+        self.assertIsNone(classify_error(ValueError("invalid argument")))
+        try:
+            try:
+                raise RateLimited("inner")
+            except RateLimited as e:
+                raise RuntimeError("Error embedding content") from e
+        except RuntimeError as wrapped:
+            self.assertEqual(classify_error(wrapped), "rate_limit")
+
+    def test_backoff_grows_and_respects_server_hint(self):
+        self.assertEqual(retry_after(RuntimeError("429 quota exceeded. Please retry in 12.5s.")), 12.5)
+        self.assertIsNone(retry_after(RuntimeError("429")))
+        self.assertLessEqual(backoff_delay(0), 1.0)
+        self.assertGreaterEqual(backoff_delay(3), 4.0)
+        self.assertLessEqual(backoff_delay(20), 60.0)
+        self.assertEqual(backoff_delay(0, hint=30.0), 30.0)
+
+
+class TestBatchAnswers(unittest.TestCase):
+    """Tests for answering a batch of questions concurrently with the RAG chain."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.output = os.path.join(self.tmp_dir, "answers.jsonl")
+        self.registry = Metrics()
+        self.queries = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.failures = {}
+
+    def retrieve(self, query):
+        with self.lock:
+            self.queries.append(query)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.02)
+        with self.lock:
+            self.in_flight -= 1
+            failure = self.failures.get(query)
+            if failure:
+                self.failures[query] = failure[1:]
+                raise failure[0]
+        return [Document(page_content=f"trecho sobre {query}", id="1", metadata={"file_name": "livro.pdf", "page": 3})]
+
+    def make_chain(self):
+        rewrite_llm = RunnableLambda(lambda prompt: AIMessage(content="reescrita"))
+        return build_rag_chain(FakeListChatModel(responses=["resposta"]), rewrite_llm, RunnableLambda(self.retrieve),
+                               registry=self.registry)
+
+    def run_batch(self, questions, **options):
+        with mock.patch("batch_qa.backoff_delay", return_value=0.01):
+            return run_batch(self.make_chain(), questions, output_path=self.output, registry=self.registry, **options)
+
+    def test_answers_with_sources_in_input_order(self):
+        questions = [{"id": "q1", "question": "Quem é Capitu?"}, "Quem é Bentinho?", {"id": "q3", "question": "Quem é Capitu?"}]
+        records = self.run_batch(questions, concurrency=2)
+
+        self.assertEqual([record["question"] for record in records], ["Quem é Capitu?", "Quem é Bentinho?", "Quem é Capitu?"])
+        self.assertEqual([record["index"] for record in records], [0, 1, 2])
+        self.assertEqual(records[2]["id"], "q3")
+        self.assertEqual(records[0]["answer"], "resposta")
+        self.assertEqual(records[0]["sources"], [{"id": "1", "file_name": "livro.pdf", "page": 3,
+                                                  "content": "trecho sobre Quem é Capitu?"}])
+        self.assertIsNone(records[1]["error"])
+        self.assertEqual(sorted(self.queries), ["Quem é Bentinho?", "Quem é Capitu?"])  # repeated question asked once
+
+        with open(self.output, encoding="utf-8") as f:
+            written = sorted((json.loads(line) for line in f), key=lambda record: record["index"])
+        self.assertEqual(written, records)
+
+    def test_concurrency_limit(self):
+        self.run_batch([f"Pergunta número {i}?" for i in range(8)], concurrency=3)
+
+        self.assertEqual(len(self.queries), 8)
+        self.assertLessEqual(self.max_in_flight, 3)
+        self.assertGreater(self.max_in_flight, 1)
+
+    def test_rate_limited_questions_are_retried(self):
+        self.failures["Quem é Capitu?"] = [RateLimited("429 Too Many Requests"), TimeoutError("timeout")]
+        records = self.run_batch(["Quem é Capitu?", "Quem é Bentinho?"])
+
+        self.assertEqual(records[0]["answer"], "resposta")
+        self.assertEqual(records[0]["attempts"], 3)
+        self.assertEqual(records[1]["attempts"], 1)
+        counters = self.registry.snapshot()["counters"]
+        self.assertEqual(counters["batch.retries"], 2)
+        self.assertEqual(counters["batch.rate_limited"], 1)
+
+    def test_permanent_errors_are_recorded_without_retry(self):
+        self.failures["Quem é Capitu?"] = [ValueError("pergunta inválida")]
+        records = self.run_batch(["Quem é Capitu?", "Quem é Bentinho?"])
+
+        self.assertIsNone(records[0]["answer"])
+        self.assertEqual(records[0]["error"], "ValueError: pergunta inválida")
+        self.assertEqual(records[0]["attempts"], 1)
+        self.assertEqual(records[1]["answer"], "resposta")
+        self.assertEqual(self.registry.snapshot()["counters"]["batch.errors"], 1)
+
+    def test_load_questions(self):
+        text_path = os.path.join(self.tmp_dir, "perguntas.txt")
+        with open(text_path, "w", encoding="utf-8") as f:
+            f.write("Quem é Capitu?\n\nQuem é Bentinho?\n")
+        jsonl_path = os.path.join(self.tmp_dir, "perguntas.jsonl")
+        with open(jsonl_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"id": 7, "question": "Quem é Capitu?", "expected": "Personagem"}) + "\n")
+
+        self.assertEqual(load_questions(text_path), [{"question": "Quem é Capitu?"}, {"question": "Quem é Bentinho?"}])
+        self.assertEqual(load_questions(jsonl_path), [{"id": 7, "question": "Quem é Capitu?", "expected": "Personagem"}])
+
+    def test_cli_requires_a_published_index(self):
+        index_path = os.path.join(self.tmp_dir, "faiss_index")
+        os.makedirs(index_path)  # folder left behind without a published index
+        with mock.patch.dict(os.environ, {"GOOGLE_API_KEY": "key"}), mock.patch("batch_qa.load_dotenv"), \
+                mock.patch("batch_qa.read_vector_store") as read_vector_store, mock.patch("sys.stderr"):
+            with self.assertRaises(SystemExit):
+                main(["perguntas.txt", "--index", index_path])
+        read_vector_store.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
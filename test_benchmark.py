@@ -0,0 +1,61 @@
+# test_benchmark.py
+
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import benchmark
+
+
+class TestBenchmark(unittest.TestCase):
+    """Tests for the offline benchmark harness and its regression report."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+
+    def test_measure_small_corpus(self):
+        cwd = os.getcwd()
+        metrics = benchmark.measure(3, self.tmp_dir, queries=3, extract_workers=1)
+
+        self.assertEqual(os.getcwd(), cwd)
+        self.assertEqual((metrics["files"], metrics["failed"]), (3, 0))
+        self.assertGreater(metrics["chunks"], 3)
+        self.assertGreater(metrics["files_per_s"], 0)
+        self.assertLessEqual(metrics["retrieval_p50_ms"], metrics["retrieval_p99_ms"])
+        self.assertGreater(metrics["cold_start_ms"], 0)
+        # The sync state stays inside the benchmark directory
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, "faiss_manifest.json")))
+
+    def test_cold_start_failure_shows_the_app_error(self):
+        failed = subprocess.CompletedProcess([], returncode=1, stdout="", stderr="Traceback...\nImportError: boom\n")
+        with patch.object(benchmark.subprocess, "run", return_value=failed):
+            with self.assertRaisesRegex(RuntimeError, "ImportError: boom"):
+                benchmark.measure_cold_start(self.tmp_dir)
+
+    def test_compare_results_flags_slower_and_lower_throughput(self):
+        previous = {"10": {"files_per_s": 100.0, "retrieval_p50_ms": 10.0, "index_load_ms": 5.0, "files": 10}}
+        current = {"10": {"files_per_s": 70.0, "retrieval_p50_ms": 11.0, "index_load_ms": 9.0, "files": 10},
+                   "100": {"files_per_s": 1.0}}
+
+        regressions = benchmark.compare_results(previous, current, tolerance=0.2)
+
+        self.assertEqual(regressions, [("10", "files_per_s", 100.0, 70.0), ("10", "index_load_ms", 5.0, 9.0)])
+
+    def test_runs_are_appended_to_the_history(self):
+        path = os.path.join(self.tmp_dir, "results.json")
+        benchmark.save_run({"10": {"files_per_s": 1.0}}, {"queries": 1}, path)
+        benchmark.save_run({"10": {"files_per_s": 2.0}}, {"queries": 1}, path)
+
+        with open(path) as f:
+            runs = json.load(f)["runs"]
+        self.assertEqual([run["results"]["10"]["files_per_s"] for run in runs], [1.0, 2.0])
+        self.assertEqual(benchmark.load_runs(path), runs)
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
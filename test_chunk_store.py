@@ -0,0 +1,83 @@
+# test_chunk_store.py
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from langchain_core.documents import Document
+
+from chunk_store import ChunkStore, LazyPositions, published_chunk_store
+
+
+class TestChunkStore(unittest.TestCase):
+    """Tests for the SQLite-backed docstore and its lazy position mapping."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.store = ChunkStore.create(self.tmp_dir)
+        self.addCleanup(self.store.close)
+
+    def publish(self, texts, index_file, store=None):
+        store = store or self.store
+        store.add({chunk_id: Document(page_content=text, metadata={"page": 1}) for chunk_id, text in texts.items()})
+        store.write_positions(dict(enumerate(texts)))
+        store.set_meta("index_file", index_file)
+        store.commit()
+
+    def open_reader(self):
+        reader = ChunkStore.open_published(self.tmp_dir, read_only=True)
+        self.addCleanup(reader.close)
+        return reader
+
+    def test_search_and_delete(self):
+        self.publish({"a": "first", "b": "second"}, "index-1.faiss")
+
+        doc = self.store.search("a")
+        self.assertEqual((doc.id, doc.page_content, doc.metadata), ("a", "first", {"page": 1}))
+        self.store.delete(["a"])
+        self.assertEqual(self.store.search("a"), "ID a not found.")
+        with self.assertRaises(ValueError):
+            self.store.add({"b": Document(page_content="duplicate")})
+
+    def test_reader_keeps_its_snapshot(self):
+        self.publish({"a": "first"}, "index-1.faiss")
+        reader = self.open_reader()
+
+        self.publish({"b": "second"}, "index-2.faiss")
+
+        self.assertEqual(reader.get_meta("index_file"), "index-1.faiss")
+        self.assertEqual(reader.search("b"), "ID b not found.")
+        self.assertEqual(self.open_reader().get_meta("index_file"), "index-2.faiss")
+
+    def test_rebuild_never_touches_the_published_store(self):
+        self.publish({"a": "first"}, "index-1.faiss")
+        reader = self.open_reader()
+
+        rebuilt = ChunkStore.create(self.tmp_dir)
+        self.addCleanup(rebuilt.close)
+        self.assertEqual(published_chunk_store(self.tmp_dir), self.store.path)  # not published before commit
+        self.assertEqual(self.open_reader().get_meta("index_file"), "index-1.faiss")
+
+        self.publish({"b": "second"}, "index-2.faiss", store=rebuilt)
+
+        self.assertEqual(reader.search("a").page_content, "first")  # old snapshot still readable
+        self.assertEqual(self.open_reader().get_meta("index_file"), "index-2.faiss")
+        self.assertFalse(os.path.exists(self.store.path))
+        self.assertEqual(sorted(name for name in os.listdir(self.tmp_dir) if name.endswith(".sqlite")),
+                         [os.path.basename(rebuilt.path)])
+
+    def test_lazy_positions(self):
+        self.publish({"a": "first", "b": "second"}, "index-1.faiss")
+        positions = LazyPositions(self.open_reader())
+
+        self.assertEqual(len(positions), 2)
+        self.assertEqual(positions[1], "b")
+        self.assertEqual(dict(positions), {0: "a", 1: "b"})
+        with self.assertRaises(KeyError):
+            positions[5]
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
@@ -0,0 +1,75 @@
+# test_context_budget.py
+
+import unittest
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
+
+from context_budget import estimate_tokens, fit_context, fit_history, remove_chunk_overlap, trim_to_relevant_sentences
+
+
+def chunk(index, text, file_id="book"):
+    return Document(id=f"{file_id}:{index}", page_content=text, metadata={"file_id": file_id, "chunk_index": index})
+
+
+class TestContextBudget(unittest.TestCase):
+    """Tests for the prompt token budget: chunk overlap, sentence trimming and history trimming."""
+
+    def test_removes_overlap_between_adjacent_chunks(self):
+        docs = [chunk(1, "and the overlap between chunks. Second part."),
+                chunk(0, "First part and the overlap between chunks."), chunk(2, "Second part.", file_id="other")]
+        result = remove_chunk_overlap(docs)
+
+        self.assertEqual(result[0].page_content, "Second part.")
+        self.assertEqual(result[1].page_content, docs[1].page_content)
+        self.assertEqual(result[2].page_content, "Second part.")  # different file, no previous chunk
+
+    def test_short_coincidences_are_not_overlap(self):
+        docs = [chunk(0, "Bentinho voltou para casa"), chunk(1, "a noite caiu sobre o Rio."),
+                chunk(0, "Naquele ano chegou ao Rio de Janeiro", file_id="other"),
+                chunk(1, "chegou ao Rio de Janeirosa, a tia de Escobar.", file_id="other")]
+        result = remove_chunk_overlap(docs)
+
+        self.assertEqual([doc.page_content for doc in result], [doc.page_content for doc in docs])
+
+    def test_keeps_sentences_relevant_to_the_query(self):
+        text = "Bentinho era seminarista. O tempo estava bom. Capitu tinha olhos de ressaca. Choveu à tarde."
+        trimmed = trim_to_relevant_sentences(text, "Como eram os olhos de Capitu?", estimate_tokens(text) // 2)
+
+        self.assertIn("Capitu tinha olhos de ressaca.", trimmed)
+        self.assertNotIn("Choveu", trimmed)
+        self.assertEqual(trim_to_relevant_sentences(text, "Capitu", 1000), text)
+
+    def test_context_fits_budget(self):
+        docs = [chunk(i, " ".join(f"Frase {j} do trecho {i}." for j in range(100)), file_id=f"f{i}") for i in range(4)]
+        result = fit_context(docs, "trecho", max_tokens=400)
+
+        self.assertLessEqual(sum(estimate_tokens(doc.page_content) for doc in result), 400)
+        self.assertEqual([doc.id for doc in result], [doc.id for doc in docs])
+
+    def test_chunks_without_sentence_breaks_are_truncated_not_dropped(self):
+        # Verse, tables and OCR output often have no sentence punctuation at all
+        docs = [chunk(i, " ".join(f"verso {j} do poema {i}" for j in range(150))[:2400], file_id=f"f{i}")
+                for i in range(4)]
+        result = fit_context(docs, "poema", max_tokens=2000)
+
+        self.assertEqual([doc.id for doc in result], [doc.id for doc in docs])
+        self.assertLessEqual(sum(estimate_tokens(doc.page_content) for doc in result), 2000)
+        for doc, original in zip(result, docs):
+            self.assertGreater(len(doc.page_content), 1500)
+            self.assertTrue(original.page_content.startswith(doc.page_content))
+
+    def test_history_keeps_latest_turns(self):
+        history = []
+        for i in range(10):
+            history += [HumanMessage(content=f"pergunta {i} " * 20), AIMessage(content=f"resposta {i} " * 20)]
+        trimmed = fit_history(history, max_tokens=200)
+
+        self.assertLess(len(trimmed), len(history))
+        self.assertEqual(trimmed[-1], history[-1])
+        self.assertIsInstance(trimmed[0], HumanMessage)
+        self.assertEqual(fit_history(history[:2], max_tokens=200), history[:2])
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
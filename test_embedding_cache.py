@@ -0,0 +1,139 @@
+# test_embedding_cache.py
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from embedding_cache import CachedEmbeddings, _hash
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    """Deterministic fake embedding that records every batch sent to the "API"."""
+
+    calls: list = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return super().embed_documents(texts)
+
+
+class TaskTypeEmbedding(CountingEmbedding):
+    """Fake embedding whose batch call accepts a task type, like the Gemini embeddings."""
+
+    def embed_documents(self, texts, task_type=None):
+        self.calls.append((task_type, list(texts)))
+        return [self.embed_query(text) for text in texts]
+
+
+class TestCachedEmbeddings(unittest.TestCase):
+    """Tests for the persistent content-addressed embedding cache."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.path = os.path.join(self.tmp_dir, "cache.sqlite")
+        self.inner = CountingEmbedding(size=8, calls=[])
+
+    def make_cache(self, **kwargs):
+        return CachedEmbeddings(self.inner, "test-model", path=self.path, **kwargs)
+
+    def test_only_misses_are_embedded(self):
+        cache = self.make_cache()
+        first = cache.embed_documents(["a", "b"])
+        second = cache.embed_documents(["b", "c", "a"])
+
+        self.assertEqual(self.inner.calls, [["a", "b"], ["c"]])
+        self.assertEqual(second[0], first[1])
+        self.assertEqual(second[2], first[0])
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.stats()["misses"], 3)
+
+    def test_cache_persists_across_instances(self):
+        self.make_cache().embed_documents(["a", "b"])
+        cache = self.make_cache()
+        cache.embed_documents(["a", "b"])
+
+        self.assertEqual(len(self.inner.calls), 1)
+        self.assertEqual(cache.stats()["hit_rate"], 1.0)
+
+    def test_misses_are_sent_in_full_batches(self):
+        cache = self.make_cache(batch_size=2)
+        cache.embed_documents(["a"])
+        cache.embed_documents(["a", "b", "c", "d", "e", "b"])
+
+        self.assertEqual(self.inner.calls, [["a"], ["b", "c"], ["d", "e"]])
+
+    def test_entries_are_scoped_by_model(self):
+        self.make_cache().embed_documents(["a"])
+        CachedEmbeddings(self.inner, "other-model", path=self.path).embed_documents(["a"])
+
+        self.assertEqual(len(self.inner.calls), 2)
+
+    def test_evicts_least_recently_used(self):
+        cache = self.make_cache(max_entries=2, touch_interval=0)
+        cache.embed_documents(["a"])
+        cache.embed_documents(["b"])
+        cache.embed_documents(["a"])  # "b" is now the oldest entry
+        cache.embed_documents(["c"])
+        self.inner.calls.clear()
+
+        cache.embed_documents(["a", "b", "c"])
+        self.assertEqual(self.inner.calls, [["b"]])
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_entries_stored_twice_are_counted_once(self):
+        cache = self.make_cache(max_entries=3)
+        vector = cache.embed_documents(["a", "b"])[0]
+        with cache._lock:  # "a" stored again, as after two concurrent misses of the same text
+            cache._store("test-model", [(_hash("a"), vector)])
+            cache._conn.commit()
+        cache.embed_documents(["c"])
+
+        self.assertEqual(cache.stats()["entries"], 3)
+        self.inner.calls.clear()
+        cache.embed_documents(["a", "b", "c"])
+        self.assertEqual(self.inner.calls, [])  # nothing was evicted early
+
+    def test_recent_hits_do_not_write(self):
+        cache = self.make_cache()
+        cache.embed_documents(["a", "b"])
+        changes = cache._conn.total_changes
+
+        cache.embed_documents(["a", "b"])
+        self.assertEqual(cache._conn.total_changes, changes)
+        cache.touch_interval = 0
+        cache.embed_documents(["a"])
+        self.assertEqual(cache._conn.total_changes, changes + 1)
+
+    def test_counters_are_exact_across_threads(self):
+        cache = self.make_cache()
+        cache.embed_documents(["a", "b"])
+        threads = [threading.Thread(target=lambda: [cache.embed_documents(["a", "b"]) for _ in range(100)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(cache.stats()["hits"], 4 * 100 * 2)
+        self.assertEqual(cache.stats()["misses"], 2)
+
+    def test_query_batches_fill_the_query_cache(self):
+        self.inner = TaskTypeEmbedding(size=8, calls=[])
+        cache = self.make_cache(batch_size=2)
+        vectors = cache.embed_queries(["q1", "q2", "q3", "q1"])
+
+        self.assertEqual(self.inner.calls, [("RETRIEVAL_QUERY", ["q1", "q2"]), ("RETRIEVAL_QUERY", ["q3"])])
+        self.assertEqual(cache.embed_query("q2"), vectors[1])
+        self.assertEqual(vectors[3], vectors[0])
+        self.assertEqual(len(self.inner.calls), 2)
+        cache.embed_documents(["q1"])  # documents are cached apart from queries
+        self.assertEqual(self.inner.calls[-1], (None, ["q1"]))
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
@@ -0,0 +1,84 @@
+# test_gdrive.py
+
+import unittest
+
+from fakes import FakeDriveService
+from gdrive import LIST_PAGE_SIZE, get_gdrive_changes, get_start_page_token, list_gdrive_files_recursively
+
+
+class TestDriveListing(unittest.TestCase):
+    """Tests for the concurrent folder crawl and the Changes API delta, against a fake Drive."""
+
+    def setUp(self):
+        self.drive = FakeDriveService()
+        self.drive.add_folder("root")
+        self.drive.add_folder("a", "root")
+        self.drive.add_folder("b", "a")
+        self.drive.add_folder("outside")
+        self.drive.add_file("f1", "root")
+        self.drive.add_file("f2", "a")
+        self.drive.add_file("f3", "b")
+        self.drive.add_file("notes", "a", name="notes.txt", mime_type="text/plain")
+        self.drive.add_file("elsewhere", "outside")
+
+    def crawl(self):
+        return list_gdrive_files_recursively(lambda: self.drive, "root")
+
+    def test_crawl_lists_pdfs_of_the_whole_tree(self):
+        self.drive.trash("f2")
+        files, folders = self.crawl()
+
+        self.assertEqual(set(files), {"f1", "f3"})
+        self.assertEqual(files["f3"]["parent"], "b")
+        self.assertEqual(folders, {"root": None, "a": "root", "b": "a"})
+        self.assertEqual(self.drive.calls["files.list"], 3)
+        self.assertEqual(set(self.drive.page_sizes), {LIST_PAGE_SIZE})
+
+    def test_crawl_follows_pagination(self):
+        for i in range(LIST_PAGE_SIZE + 5):
+            self.drive.add_file(f"bulk{i}", "b")
+        files, _ = self.crawl()
+
+        self.assertEqual(len(files), LIST_PAGE_SIZE + 8)
+        self.assertEqual(self.drive.calls["files.list"], 4)
+
+    def delta(self, token, folders):
+        return get_gdrive_changes(lambda: self.drive, "root", token, folders)
+
+    def test_changes_report_only_the_delta(self):
+        token = get_start_page_token(self.drive)
+        _, folders = self.crawl()
+        self.drive.add_file("f4", "b")
+        self.drive.update_file("f1")
+        self.drive.trash("f2")
+        self.drive.delete("f3")
+        self.drive.add_file("elsewhere2", "outside")
+
+        changed, removed, new_folders, new_token = self.delta(token, folders)
+
+        self.assertEqual(set(changed), {"f4", "f1"})
+        self.assertEqual(changed["f1"]["modified_time"], self.drive.items["f1"]["modifiedTime"])
+        self.assertEqual(removed, {"f2", "f3", "elsewhere2"})
+        self.assertEqual(new_folders, folders)
+        self.assertEqual(self.delta(new_token, new_folders)[:2], ({}, set()))
+
+    def test_folder_moved_in_is_crawled_and_moved_out_is_pruned(self):
+        token = get_start_page_token(self.drive)
+        _, folders = self.crawl()
+        self.drive.move("outside", "a")
+        self.drive.move("b", "outside")
+        self.drive.move("a", "elsewhere-root")
+
+        changed, _, new_folders, _ = self.delta(token, folders)
+        self.assertEqual(new_folders, {"root": None})
+        self.assertEqual(changed, {})
+
+        token = get_start_page_token(self.drive)
+        self.drive.move("a", "root")
+        changed, _, new_folders, _ = self.delta(token, {"root": None})
+        self.assertEqual(set(changed), {"f2", "f3", "elsewhere"})
+        self.assertEqual(new_folders, {"root": None, "a": "root", "outside": "a", "b": "outside"})
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
@@ -0,0 +1,127 @@
+# test_ingest.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+from filelock import FileLock
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import ingest
+import ingestion
+from fakes import FakeDriveService
+from test_ingestion import make_pdf_bytes
+
+
+class TestHeadlessSync(unittest.TestCase):
+    """Tests for the locked, status-reporting sync entry point used by the CLI and the app."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.index_path = os.path.join(self.tmp_dir, "faiss_index")
+        for module, name, file_name in [(ingestion, "FAISS_MANIFEST_FILE", "manifest.json"),
+                                        (ingest, "SYNC_LOCK_FILE", "sync.lock"),
+                                        (ingest, "SYNC_STATUS_FILE", "status.json")]:
+            patcher = patch.object(module, name, os.path.join(self.tmp_dir, file_name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        lock_timeout_patch = patch.object(ingest, "SYNC_LOCK_TIMEOUT", 0.1)
+        lock_timeout_patch.start()
+        self.addCleanup(lock_timeout_patch.stop)
+        download_patch = patch.object(ingestion, "download_gdrive_file",
+                                      side_effect=lambda service, file_id, fh: fh.write(make_pdf_bytes(file_id)))
+        download_patch.start()
+        self.addCleanup(download_patch.stop)
+
+        self.drive = FakeDriveService()
+        self.drive.add_folder("root")
+        for i in range(3):
+            self.drive.add_file(f"file{i}", "root")
+
+    def run_sync(self):
+        return ingest.run_sync("root", DeterministicFakeEmbedding(size=16), service_factory=lambda: self.drive,
+                               index_path=self.index_path, extract_workers=1)
+
+    def test_sync_reports_status_and_writes_manifest(self):
+        summary = self.run_sync()
+
+        self.assertEqual(summary["processed"], 3)
+        status = ingest.read_sync_status()
+        self.assertEqual(status["state"], "finished")
+        self.assertEqual(status["summary"]["processed"], 3)
+        stages = status["metrics"]["stages"]
+        self.assertEqual(stages["sync.extract"]["items"], 3)
+        self.assertEqual(stages["sync.embedding"]["items"], summary["chunks"])
+        self.assertIn("drive.list", stages)
+        self.assertEqual(set(ingestion.load_manifest(self.index_path)["files"]), {"file0", "file1", "file2"})
+        self.assertFalse(ingest.is_sync_running())
+        # Only the final files are left behind: no temporary manifest or index files
+        self.assertEqual(sorted(name for name in os.listdir(self.tmp_dir) if name.startswith(".tmp")), [])
+
+    def test_concurrent_sync_is_refused(self):
+        with FileLock(ingest.SYNC_LOCK_FILE):
+            self.assertTrue(ingest.is_sync_running())
+            with self.assertRaises(ingest.SyncInProgress):
+                self.run_sync()
+        self.assertIsNone(ingest.read_sync_status())
+
+    def test_errors_are_reported(self):
+        self.drive = None  # the service factory now returns something that is not a Drive client
+        with self.assertRaises(AttributeError):
+            self.run_sync()
+        self.assertEqual(ingest.read_sync_status()["state"], "error")
+
+    def write_status(self, state, age=0):
+        started_at = (datetime.now(timezone.utc) - timedelta(seconds=age)).isoformat(timespec="seconds")
+        ingestion.write_json_atomic(ingest.SYNC_STATUS_FILE, {"state": state, "started_at": started_at,
+                                                              "updated_at": started_at})
+
+    def test_background_sync_is_not_started_while_locked(self):
+        with patch.object(ingest.subprocess, "Popen") as popen, FileLock(ingest.SYNC_LOCK_FILE):
+            self.assertIsNone(ingest.start_background_sync("key"))
+        popen.assert_not_called()
+        self.assertIsNone(ingest.read_sync_status())
+
+    def test_abandoned_status_is_stale(self):
+        self.write_status("starting")
+        self.assertFalse(ingest.is_status_stale(ingest.read_sync_status()))  # still within the grace period
+        self.write_status("starting", age=ingest.SYNC_START_GRACE + 1)
+        self.assertTrue(ingest.is_status_stale(ingest.read_sync_status()))
+        self.write_status("running")
+        self.assertTrue(ingest.is_status_stale(ingest.read_sync_status()))
+        with FileLock(ingest.SYNC_LOCK_FILE):
+            self.assertFalse(ingest.is_status_stale(ingest.read_sync_status()))
+
+    def run_cli(self, env):
+        with patch.dict(os.environ, env, clear=True), patch.object(ingest, "load_dotenv"), \
+                patch.object(ingest, "create_embeddings"), patch.object(ingest, "PageCache", MagicMock()):
+            return ingest.main([])
+
+    def test_cli_ends_the_starting_status_when_it_cannot_sync(self):
+        self.write_status("starting")
+        with FileLock(ingest.SYNC_LOCK_FILE):
+            self.assertEqual(self.run_cli({"GOOGLE_API_KEY": "key"}), 0)
+        self.assertEqual(ingest.read_sync_status()["state"], "skipped")
+
+        self.write_status("starting")
+        with self.assertRaises(SystemExit):
+            self.run_cli({})
+        status = ingest.read_sync_status()
+        self.assertEqual(status["state"], "error")
+        self.assertIn("GOOGLE_API_KEY", status["error"])
+
+    def test_cli_rejects_an_unknown_ocr_backend_before_syncing(self):
+        self.write_status("starting")
+        with patch.object(ingest, "OCR_BACKEND", "tesseract5"), patch.object(ingest, "run_sync") as run_sync:
+            with self.assertRaises(SystemExit):
+                self.run_cli({"GOOGLE_API_KEY": "key"})
+        run_sync.assert_not_called()
+        self.assertIn("tesseract5", ingest.read_sync_status()["error"])
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
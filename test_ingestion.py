@@ -0,0 +1,260 @@
+# test_ingestion.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import fitz  # PyMuPDF
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import ingestion
+from fakes import FakeDriveService
+from page_cache import PageCache
+from vector_index import get_index_version, read_vector_store
+
+
+def make_pdf_bytes(text, pages=1):
+    """Builds a small in-memory PDF with `text` on every page."""
+    with fitz.open() as doc:
+        for page_number in range(pages):
+            page = doc.new_page()
+            page.insert_text((72, 72), f"{text} page {page_number}")
+        return doc.tobytes()
+
+
+def page(file_id, number, text):
+    return Document(page_content=text, metadata={"file_id": file_id, "file_name": f"{file_id}.pdf", "page": number})
+
+
+class TestGetTextChunks(unittest.TestCase):
+    """Tests for the per-document chunking."""
+
+    def test_chunks_never_mix_files(self):
+        pages = [page("a", 1, "alpha " * 300), page("a", 2, "beta " * 300), page("b", 1, "gamma")]
+        chunks = list(ingestion.get_text_chunks(pages))
+
+        self.assertEqual(chunks[-1].page_content, "gamma")
+        self.assertEqual(chunks[-1].metadata["file_id"], "b")
+        self.assertTrue(all("gamma" not in c.page_content for c in chunks if c.metadata["file_id"] == "a"))
+
+    def test_chunk_metadata_points_to_starting_page(self):
+        pages = [page("a", 1, "alpha " * 500), page("a", 2, "beta " * 500)]
+        chunks = list(ingestion.get_text_chunks(pages))
+
+        self.assertEqual([c.metadata["chunk_index"] for c in chunks], list(range(len(chunks))))
+        self.assertEqual(chunks[0].metadata["page"], 1)
+        self.assertEqual(chunks[-1].metadata["page"], 2)
+        self.assertTrue(all(len(c.page_content) <= 2500 for c in chunks))
+        self.assertEqual(chunks[0].metadata["content_hash"], ingestion.content_hash(chunks[0].page_content))
+
+
+class TestSyncPipeline(unittest.TestCase):
+    """Tests for the staged Drive download / extraction / embedding pipeline."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.tmp_dir, "faiss_index")
+        manifest_patch = patch.object(ingestion, "FAISS_MANIFEST_FILE", os.path.join(self.tmp_dir, "manifest.json"))
+        manifest_patch.start()
+        self.addCleanup(manifest_patch.stop)
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.embeddings = DeterministicFakeEmbedding(size=16)
+        self.pdfs = {f"file{i}": make_pdf_bytes(f"book {i}", pages=2) for i in range(5)}
+        self.downloads = []
+
+    def fake_download(self, service, file_id, fh):
+        self.downloads.append(file_id)
+        if file_id == "broken":
+            raise IOError("download failed")
+        fh.write(self.pdfs[file_id])
+
+    def files(self, ids):
+        return {fid: {"name": f"{fid}.pdf", "modified_time": "2024-01-01T00:00:00.000Z"} for fid in ids}
+
+    def run_sync(self, files, manifest, **kwargs):
+        with patch.object(ingestion, "download_gdrive_file", side_effect=self.fake_download):
+            return ingestion.sync_drive_files(lambda: object(), files, manifest, self.embeddings,
+                                              index_path=self.index_path, extract_workers=2,
+                                              embed_batch_size=3, queue_size=2, **kwargs)
+
+    def test_indexes_all_files_and_updates_manifest(self):
+        files = self.files(self.pdfs)
+        progress = []
+        summary = self.run_sync(files, ingestion.new_manifest(), on_progress=lambda done, total: progress.append((done, total)))
+
+        self.assertEqual(summary["processed"], 5)
+        self.assertEqual(summary["failed"], {})
+        self.assertEqual(progress[-1], (5, 5))
+        manifest = ingestion.load_manifest(self.index_path)
+        self.assertEqual(set(manifest["files"]), set(files))
+        self.assertEqual(sum(entry["chunks"] for entry in manifest["files"].values()), summary["chunks"])
+        store = read_vector_store(self.index_path, self.embeddings, read_only=True)
+        self.assertEqual(store.index.ntotal, summary["chunks"])
+        indexed = {doc.metadata["file_id"] for doc in store.docstore.documents()}
+        self.assertEqual(indexed, set(files))
+
+    def test_failed_download_is_left_out_of_manifest(self):
+        files = self.files(["file0", "broken", "file1"])
+        summary = self.run_sync(files, ingestion.new_manifest())
+
+        self.assertEqual(set(summary["failed"]), {"broken"})
+        manifest = ingestion.load_manifest(self.index_path)
+        self.assertEqual(set(manifest["files"]), {"file0", "file1"})
+        # A next sync only picks up the file that failed
+        self.assertEqual(set(ingestion.get_files_to_process(files, manifest)), {"broken"})
+
+    def test_checkpoints_between_files(self):
+        files = self.files(self.pdfs)
+        saved = []
+        original_save = ingestion.save_manifest
+        with patch.object(ingestion, "save_manifest", side_effect=lambda data: saved.append(len(data["files"])) or original_save(data)):
+            self.run_sync(files, ingestion.new_manifest(), checkpoint_interval=0)
+
+        # One checkpoint per file, each one recording a complete file
+        self.assertEqual(saved, [1, 2, 3, 4, 5])
+
+    def load_store(self):
+        return read_vector_store(self.index_path, self.embeddings, read_only=True)
+
+    def indexed_files(self):
+        return sorted(doc.metadata["file_id"] for doc in self.load_store().docstore.documents())
+
+    def test_modified_file_replaces_its_old_chunks(self):
+        files = self.files(self.pdfs)
+        self.run_sync(files, ingestion.new_manifest())
+        before = self.indexed_files()
+
+        self.pdfs["file0"] = make_pdf_bytes("rewritten book", pages=2)
+        changed = {"file0": {"name": "file0.pdf", "modified_time": "2024-02-01T00:00:00.000Z"}}
+        manifest = ingestion.load_manifest(self.index_path)
+        self.assertEqual(ingestion.get_files_to_process({**files, **changed}, manifest), changed)
+        summary = self.run_sync(changed, manifest)
+
+        self.assertEqual(summary["deleted"], before.count("file0"))
+        self.assertEqual(self.indexed_files(), before)
+        texts = [doc.page_content for doc in self.load_store().docstore.documents() if doc.metadata["file_id"] == "file0"]
+        self.assertTrue(all("rewritten" in text for text in texts))
+
+    def test_unchanged_pages_are_never_extracted_again(self):
+        cache = PageCache(os.path.join(self.tmp_dir, "pages.sqlite"))
+        self.pdfs["file0"] = make_pdf_bytes("long book", pages=5)
+        files = self.files(self.pdfs)
+        first = self.run_sync(files, ingestion.new_manifest(), page_cache=cache, pages_per_task=2)
+        texts = sorted(doc.page_content for doc in self.load_store().docstore.documents())
+
+        # Rebuilding the index from scratch neither downloads nor parses the files again
+        shutil.rmtree(self.index_path)
+        self.downloads.clear()
+        second = self.run_sync(files, ingestion.new_manifest(), page_cache=cache, pages_per_task=2)
+        self.assertEqual(self.downloads, [])
+        self.assertEqual(second["chunks"], first["chunks"])
+        self.assertEqual(sorted(doc.page_content for doc in self.load_store().docstore.documents()), texts)
+
+        # A new version of a file is downloaded and extracted again
+        self.pdfs["file1"] = make_pdf_bytes("rewritten book", pages=2)
+        changed = {"file1": {"name": "file1.pdf", "modified_time": "2024-02-01T00:00:00.000Z"}}
+        self.run_sync(changed, ingestion.load_manifest(self.index_path), page_cache=cache)
+        self.assertEqual(self.downloads, ["file1"])
+        texts = [doc.page_content for doc in self.load_store().docstore.documents() if doc.metadata["file_id"] == "file1"]
+        self.assertTrue(texts and all("rewritten" in text for text in texts))
+        self.assertEqual(cache.stats()["pages"], 13)  # the old version's pages are gone
+
+    def test_removed_file_is_dropped_from_index_and_manifest(self):
+        files = self.files(self.pdfs)
+        self.run_sync(files, ingestion.new_manifest())
+        del files["file3"]
+
+        manifest = ingestion.load_manifest(self.index_path)
+        removed = ingestion.get_removed_files(files, manifest)
+        self.assertEqual(removed, ["file3"])
+        self.run_sync({}, manifest, removed_files=removed)
+
+        self.assertNotIn("file3", self.indexed_files())
+        self.assertNotIn("file3", ingestion.load_manifest(self.index_path)["files"])
+
+    def test_compacts_when_dead_ratio_is_high(self):
+        files = self.files(self.pdfs)
+        self.run_sync(files, ingestion.new_manifest())
+        manifest = ingestion.load_manifest(self.index_path)
+        removed = ["file0", "file1", "file2"]
+
+        self.run_sync({}, manifest, removed_files=removed, compaction_threshold=0.5)
+
+        manifest = ingestion.load_manifest(self.index_path)
+        self.assertEqual(manifest["deleted_since_rebuild"], 0)
+        self.assertEqual(self.load_store().index.ntotal, len(self.indexed_files()))
+
+    def test_recovers_chunks_missing_from_manifest(self):
+        files = self.files(self.pdfs)
+        self.run_sync(files, ingestion.new_manifest())
+        # Simulates a sync interrupted after publishing the index but before saving the manifest
+        manifest = ingestion.load_manifest(self.index_path)
+        del manifest["files"]["file2"]
+        ingestion.save_manifest(manifest)
+
+        manifest = ingestion.load_manifest(self.index_path)
+        self.run_sync(ingestion.get_files_to_process(files, manifest), manifest)
+
+        self.assertEqual(self.indexed_files().count("file2"), ingestion.load_manifest(self.index_path)["files"]["file2"]["chunks"])
+
+    def drive_delta(self, drive):
+        manifest = ingestion.load_manifest(self.index_path)
+        return manifest, *ingestion.get_drive_delta(lambda: drive, "root", manifest)
+
+    def test_incremental_sync_uses_the_change_log(self):
+        drive = FakeDriveService()
+        drive.add_folder("root")
+        drive.add_folder("sub", "root")
+        for i, fid in enumerate(self.pdfs):
+            drive.add_file(fid, "root" if i % 2 else "sub")
+        manifest, files, removed, state = self.drive_delta(drive)
+        self.assertEqual((set(files), removed), (set(self.pdfs), []))
+        self.run_sync(files, manifest, drive_state=state)
+        listings = drive.calls["files.list"]
+
+        drive.update_file("file0")
+        drive.trash("file1")
+        manifest, files, removed, state = self.drive_delta(drive)
+
+        self.assertEqual(drive.calls["files.list"], listings)
+        self.assertEqual((set(files), removed), ({"file0"}, ["file1"]))
+        self.pdfs["broken"] = b""
+        drive.add_file("broken", "root")
+        self.run_sync({**files, **self.files(["broken"])}, manifest, removed_files=removed, drive_state=state)
+        # A failed file keeps the old page token, so the next sync replays the same changes
+        manifest, files, removed, state = self.drive_delta(drive)
+        self.assertEqual((set(files), removed), ({"broken"}, []))
+
+        self.run_sync({}, manifest, drive_state=state)
+        drive.move("sub", "elsewhere")
+        manifest, files, removed, state = self.drive_delta(drive)
+        self.assertEqual(files, {})
+        self.assertEqual(sorted(removed), ["file0", "file2", "file4"])
+
+    def test_legacy_manifest_triggers_full_rebuild(self):
+        self.run_sync(self.files(["file0"]), ingestion.new_manifest())
+        ingestion.save_manifest({"file0": {"name": "file0.pdf", "modified_time": "2024-01-01T00:00:00.000Z"}})
+
+        manifest = ingestion.load_manifest(self.index_path)
+        self.assertEqual(manifest["files"], {})
+        self.assertEqual(set(ingestion.get_files_to_process(self.files(["file0"]), manifest)), {"file0"})
+
+    def test_rebuild_publishes_a_new_index_version(self):
+        files = self.files(self.pdfs)
+        self.run_sync(files, ingestion.new_manifest())
+        before = get_index_version(self.index_path)
+
+        # A rebuild starts again from an empty manifest (version 0) over the existing index
+        self.run_sync(files, ingestion.new_manifest())
+
+        after = get_index_version(self.index_path)
+        self.assertNotEqual(after, before)
+        self.assertEqual(ingestion.load_manifest(self.index_path)["index_version"], int(after[6:12]))
+        self.assertEqual(set(self.indexed_files()), set(files))
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
@@ -0,0 +1,185 @@
+# test_literagent.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import streamlit as st
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from streamlit.testing.v1 import AppTest
+
+import ingest
+import ingestion
+import rag_chain
+from vector_index import create_vector_store, write_vector_store
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "literagent.py")
+
+
+class FakeConversation:
+    """Stands in for the conversational chain: streams a fixed list of chunks."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.loaded_with_script_context = get_script_run_ctx(suppress_warning=True) is not None
+
+    def stream(self, inputs, config=None):
+        return iter(self.chunks)
+
+
+def source(file_name, page):
+    return Document(page_content=f"trecho de {file_name}", metadata={"file_name": file_name, "page": page})
+
+
+class AppTestCase(unittest.TestCase):
+    """Runs literagent.py with AppTest over a tiny published index and a fake chain."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.index_path = os.path.join(self.tmp_dir, "faiss_index")
+        self.embeddings = DeterministicFakeEmbedding(size=16)
+        self.publish_index(1)
+
+        self.chunks = []
+        self.embedding_clients = []
+        self.chains = []
+        for module, name, value in [(ingestion, "FAISS_INDEX_PATH", self.index_path),
+                                    (ingest, "SYNC_LOCK_FILE", os.path.join(self.tmp_dir, "sync.lock")),
+                                    (ingest, "SYNC_STATUS_FILE", os.path.join(self.tmp_dir, "status.json")),
+                                    (ingest, "create_embeddings", self.create_embeddings),
+                                    (rag_chain, "get_conversational_rag_chain", self.create_conversation)]:
+            patcher = patch.object(module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        env_patch = patch.dict(os.environ, {"GOOGLE_API_KEY": "fake"})
+        env_patch.start()
+        self.addCleanup(env_patch.stop)
+        # Shared resources are cached per process; every test starts from an empty cache
+        st.cache_resource.clear()
+        self.addCleanup(st.cache_resource.clear)
+
+    def create_embeddings(self, api_key):
+        self.embedding_clients.append(api_key)
+        return self.embeddings
+
+    def create_conversation(self, vector_store, api_key, temperature, model_name, **kwargs):
+        self.chains.append((vector_store, model_name, kwargs["index_version"]))
+        return FakeConversation(self.chunks)
+
+    def publish_index(self, version):
+        store = create_vector_store(self.index_path, [Document(id="a", page_content="Capitu", metadata={})],
+                                    self.embeddings)
+        write_vector_store(store, self.index_path, version)
+        store.docstore.close()
+
+
+class TestChatAnswer(AppTestCase):
+    """Tests for how the app streams an answer and lists its sources."""
+
+    def ask(self, question, chunks):
+        self.chunks[:] = chunks
+        app = AppTest.from_file(APP_FILE, default_timeout=30).run()
+        app.chat_input[0].set_value(question).run()
+        self.assertFalse(app.exception)
+        self.assertEqual(app.chat_message[0].markdown[0].value, question)
+        return app
+
+    def answer_and_sources(self, app):
+        assistant = app.chat_message[-1]
+        answer = "".join(markdown.value for markdown in assistant.markdown)
+        sources = [caption.value for caption in assistant.caption]
+        return answer, sources
+
+    def test_answer_tokens_follow_the_sources(self):
+        app = self.ask("Quem é Capitu?", [
+            {"input": "Quem é Capitu?"},
+            {"context": [source("Dom Casmurro.pdf", 12), source("Dom Casmurro.pdf", 12), source("Memórias.pdf", 3)]},
+            {"answer": "Capitu é "},
+            {"answer": "a narradora"},
+            {"answer": "... não, a amada de Bentinho."},
+        ])
+
+        self.assertEqual(self.answer_and_sources(app),
+                         ("Capitu é a narradora... não, a amada de Bentinho.",
+                          ["Fontes: Dom Casmurro.pdf (p. 12); Memórias.pdf (p. 3)"]))
+
+    def test_sources_without_origin_metadata_are_skipped(self):
+        app = self.ask("Quem é Capitu?", [
+            {"context": [Document(page_content="chunk antigo", metadata={})]},
+            {"answer": "Resposta."},
+        ])
+
+        self.assertEqual(self.answer_and_sources(app), ("Resposta.", []))
+
+    def test_stream_without_answer_chunks(self):
+        app = self.ask("Quem é Capitu?", [{"input": "Quem é Capitu?"}, {"context": [source("Dom Casmurro.pdf", 1)]}])
+
+        answer, sources = self.answer_and_sources(app)
+        self.assertEqual(answer, "")
+        self.assertEqual(sources, ["Fontes: Dom Casmurro.pdf (p. 1)"])
+
+
+class TestWarmUp(AppTestCase):
+    """Tests for loading the chain in the background, per session."""
+
+    def warm_up(self, app):
+        key, future = app.session_state["warm_up"]
+        return key, future.result(timeout=30)
+
+    def test_warm_up_is_per_session_and_reused_across_reruns(self):
+        first = AppTest.from_file(APP_FILE, default_timeout=30).run()
+        future = first.session_state["warm_up"][1]
+        first.run()
+        self.assertIs(first.session_state["warm_up"][1], future)
+
+        second = AppTest.from_file(APP_FILE, default_timeout=30).run()
+        self.assertIsNot(second.session_state["warm_up"][1], future)
+        conversation = self.warm_up(first)[1]
+        self.assertFalse(conversation.loaded_with_script_context)  # the loader thread never borrows a session
+
+        first.selectbox[0].set_value("gemini-2.5-flash").run()
+        key, other = self.warm_up(first)
+        self.assertEqual(key[2], "gemini-2.5-flash")
+        self.assertIsNot(other, conversation)
+
+
+class TestSharedResources(AppTestCase):
+    """Tests for the index, embeddings client and chain shared by all sessions."""
+
+    def conversation(self, app):
+        return app.session_state["warm_up"][1].result(timeout=30)
+
+    def test_sessions_share_one_index_and_chain_until_a_new_version(self):
+        first = AppTest.from_file(APP_FILE, default_timeout=30).run()
+        second = AppTest.from_file(APP_FILE, default_timeout=30).run()
+
+        self.assertIs(self.conversation(first), self.conversation(second))
+        self.assertEqual(len(self.chains), 1)
+        self.assertEqual(self.embedding_clients, ["fake"])
+        vector_store, _, version = self.chains[0]
+        self.assertEqual(version, "index-000001.faiss")
+
+        second.selectbox[0].set_value("gemini-2.5-flash").run()  # another model: new chain, same index
+        self.conversation(second)
+        self.assertIs(self.chains[1][0], vector_store)
+
+        self.publish_index(2)
+        first.run()
+        self.conversation(first)
+        new_store, _, version = self.chains[-1]
+        self.assertEqual(version, "index-000002.faiss")
+        self.assertIsNot(new_store, vector_store)
+        self.assertEqual(self.embedding_clients, ["fake"])
+
+        second.run()  # the other model is rebuilt on the new index, not served from the old one
+        self.conversation(second)
+        self.assertEqual([chain[2] for chain in self.chains[-2:]], ["index-000002.faiss"] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
@@ -0,0 +1,81 @@
+# test_metrics.py
+
+import unittest
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from fakes import FakeChatModel
+from metrics import Metrics, to_prometheus
+from rag_chain import build_rag_chain
+
+
+class TestMetrics(unittest.TestCase):
+    """Tests for the stage timers, counters and their exports."""
+
+    def test_timer_records_durations_items_and_errors(self):
+        registry = Metrics()
+        with registry.timer("sync.chunking") as span:
+            span["items"] = 3
+        registry.observe("sync.chunking", 0.5, items=2, nbytes=10)
+        with self.assertRaises(ValueError):
+            with registry.timer("sync.chunking"):
+                raise ValueError
+
+        stage = registry.snapshot()["stages"]["sync.chunking"]
+        self.assertEqual((stage["count"], stage["items"], stage["bytes"]), (2, 5, 10))
+        self.assertEqual(stage["max_s"], 0.5)
+        self.assertEqual(registry.snapshot()["counters"], {"sync.chunking.errors": 1})
+
+    def test_reset_by_prefix_keeps_other_stages(self):
+        registry = Metrics()
+        registry.observe("sync.embedding", 1.0)
+        registry.observe("chat.retrieval", 1.0)
+        registry.increment("drive.retries")
+        registry.reset(["sync.", "drive."])
+
+        self.assertEqual(list(registry.snapshot()["stages"]), ["chat.retrieval"])
+        self.assertEqual(registry.snapshot()["counters"], {})
+
+    def test_prometheus_export(self):
+        registry = Metrics()
+        registry.observe("drive.download", 0.25, items=1, nbytes=2048)
+        registry.increment("tokens.generation.input", 120)
+
+        text = to_prometheus(registry.snapshot())
+
+        self.assertIn('literagent_stage_seconds_count{stage="drive.download"} 1', text)
+        self.assertIn('literagent_stage_seconds{stage="drive.download",quantile="0.5"} 0.25', text)
+        self.assertIn('literagent_stage_bytes_total{stage="drive.download"} 2048', text)
+        self.assertIn("literagent_tokens_generation_input_total 120", text)
+        self.assertTrue(text.endswith("\n"))
+
+
+class TestChainMetrics(unittest.TestCase):
+    """Tests for the per-stage timing and token usage recorded by the RAG chain."""
+
+    def test_chain_records_each_stage_and_tokens(self):
+        registry = Metrics()
+        retriever = RunnableLambda(lambda query: [Document(page_content="Machado nasceu em 1839.")])
+        chain = build_rag_chain(FakeChatModel(responses=["Em 1839."]), FakeChatModel(responses=["Quando nasceu Machado?"]),
+                                retriever, registry=registry)
+        history = [HumanMessage(content="Quem escreveu Dom Casmurro?"), AIMessage(content="Machado de Assis.")]
+
+        list(chain.stream({"input": "E quando ele nasceu?", "chat_history": history}))
+        chain.invoke({"input": "Quem escreveu o romance Quincas Borba?", "chat_history": []})
+
+        snapshot = registry.snapshot()
+        stages = snapshot["stages"]
+        self.assertEqual(stages["chat.answer"]["count"], 2)
+        self.assertEqual(stages["chat.generation"]["count"], 2)
+        self.assertEqual(stages["chat.retrieval"]["count"], 2)
+        self.assertEqual(stages["chat.rewrite"]["count"], 1)
+        self.assertEqual(stages["chat.first_token"]["count"], 1)
+        self.assertEqual(snapshot["counters"]["chat.rewrite.skipped"], 1)
+        self.assertGreater(snapshot["counters"]["tokens.generation.input"], 0)
+        self.assertEqual(snapshot["counters"]["tokens.rewrite.output"], 6)  # estimated: 22 chars / 4
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
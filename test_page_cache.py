@@ -0,0 +1,62 @@
+# test_page_cache.py
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from page_cache import PageCache
+
+
+class TestPageCache(unittest.TestCase):
+    """Tests for the per-page extracted text cache."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.path = os.path.join(self.tmp_dir, "pages.sqlite")
+        self.cache = PageCache(self.path)
+
+    def test_pages_are_keyed_by_modified_time_and_version(self):
+        self.cache.store("f1", "t1", "v1", {1: "um", 2: ""}, page_count=3)
+
+        self.assertEqual(self.cache.get("f1", "t1", "v1"), (3, {1: "um", 2: ""}))
+        self.assertEqual(self.cache.get("f1", "t2", "v1"), (None, {}))
+        self.assertEqual(self.cache.get("f1", "t1", "v2"), (None, {}))
+        self.assertFalse(self.cache.is_complete("f1", "t1", "v1"))
+
+        self.cache.store("f1", "t1", "v1", {3: "três"})
+        self.assertTrue(self.cache.is_complete("f1", "t1", "v1"))
+        self.assertEqual(PageCache(self.path).get("f1", "t1", "v1")[1][3], "três")  # persisted
+
+    def test_new_version_replaces_old_pages(self):
+        self.cache.store("f1", "t1", "v1", {1: "antigo", 2: "antigo"}, page_count=2)
+        self.cache.store("f1", "t2", "v1", {1: "novo"}, page_count=1)
+
+        self.assertEqual(self.cache.get("f1", "t2", "v1"), (1, {1: "novo"}))
+        self.assertEqual(self.cache.stats()["pages"], 1)
+
+    def test_forget(self):
+        self.cache.store("f1", "t1", "v1", {1: "um"}, page_count=1)
+        self.cache.store("f2", "t1", "v1", {1: "dois"}, page_count=1)
+        self.cache.forget(["f1"])
+
+        self.assertEqual(self.cache.get("f1", "t1", "v1"), (None, {}))
+        self.assertTrue(self.cache.is_complete("f2", "t1", "v1"))
+        self.assertEqual(self.cache.stats()["files"], 1)
+
+    def test_hits_are_counted_across_threads(self):
+        self.cache.store("f1", "t1", "v1", {page: "texto" for page in range(1, 11)}, page_count=10)
+        threads = [threading.Thread(target=lambda: [self.cache.get("f1", "t1", "v1") for _ in range(50)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.cache.stats()["hits"], 4 * 50 * 10)
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
@@ -0,0 +1,117 @@
+# test_pdf_extraction.py
+
+import io
+import os
+import tempfile
+import unittest
+
+import fitz  # PyMuPDF
+
+from pdf_extraction import (OCR_BACKEND, content_hash, extract_pages, extract_pdf_file, get_ocr_backend, get_pdf_text,
+                            page_ranges, page_text)
+
+
+def make_pdf_bytes(page_texts):
+    """Builds an in-memory PDF with one page per entry of `page_texts`."""
+    with fitz.open() as doc:
+        for text in page_texts:
+            page = doc.new_page()
+            if text:
+                page.insert_text((72, 72), text)
+        return doc.tobytes()
+
+
+class TestGetPdfText(unittest.TestCase):
+    """Tests for the per-page PDF text extractor."""
+
+    def test_yields_one_document_per_page_with_metadata(self):
+        pdfs = [
+            ("a", "first.pdf", io.BytesIO(make_pdf_bytes(["Page one", "Page two"]))),
+            ("b", "second.pdf", make_pdf_bytes(["Other book"])),
+        ]
+        docs = list(get_pdf_text(pdfs))
+
+        self.assertEqual([(d.metadata["file_id"], d.metadata["page"]) for d in docs], [("a", 1), ("a", 2), ("b", 1)])
+        self.assertEqual(docs[1].metadata["file_name"], "first.pdf")
+        self.assertIn("Page two", docs[1].page_content)
+        self.assertEqual(docs[1].metadata["content_hash"], content_hash(docs[1].page_content))
+
+    def test_is_lazy_and_skips_empty_pages(self):
+        pages = get_pdf_text([("a", "a.pdf", make_pdf_bytes(["", "Text"]))])
+        self.assertNotIsInstance(pages, list)
+        self.assertEqual([d.metadata["page"] for d in pages], [2])
+
+    def test_extract_pdf_file_reads_from_path(self):
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(make_pdf_bytes(["On disk"]))
+        self.addCleanup(os.remove, f.name)
+
+        docs = extract_pdf_file(f.name, "id", "disk.pdf")
+        self.assertEqual(len(docs), 1)
+        self.assertEqual(docs[0].metadata["file_name"], "disk.pdf")
+
+
+def fake_ocr(page, language):
+    """OCR backend stand-in: reports which page it was asked to read."""
+    return f"texto reconhecido da página {page.number + 1} ({language})"
+
+
+def make_scanned_page(doc):
+    """Adds a page that holds only an image, like a scanned book page."""
+    page = doc.new_page()
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 20, 20), False)
+    pixmap.clear_with(200)
+    page.insert_image(fitz.Rect(72, 72, 300, 300), pixmap=pixmap)
+
+
+class TestLayoutAndOcr(unittest.TestCase):
+    """Tests for reading-order extraction, page ranges and the OCR fallback."""
+
+    def test_multi_column_page_is_read_column_by_column(self):
+        with fitz.open() as doc:
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 550, 90), "Capítulo primeiro")
+            page.insert_textbox(fitz.Rect(50, 100, 290, 300), "Esquerda alta. " * 6)
+            page.insert_textbox(fitz.Rect(310, 100, 550, 300), "Direita alta. " * 6)
+            page.insert_textbox(fitz.Rect(50, 320, 290, 400), "Esquerda baixa.")
+            page.insert_textbox(fitz.Rect(50, 700, 550, 750), "Rodapé que atravessa as duas colunas da página. " * 2)
+            text = page_text(page)
+
+        order = [text.index(marker) for marker in ("Capítulo", "Esquerda alta", "Esquerda baixa", "Direita alta", "Rodapé")]
+        self.assertEqual(order, sorted(order))
+        self.assertTrue(text.endswith("\n"))
+
+    def test_page_ranges_skip_cached_pages(self):
+        self.assertEqual(page_ranges(10, {3, 4}, pages_per_task=4), [(1, 3), (5, 9), (9, 11)])
+        self.assertEqual(page_ranges(2, {1, 2}), [])
+
+    def test_image_only_pages_go_to_ocr(self):
+        with fitz.open() as doc:
+            doc.new_page().insert_text((72, 72), "Texto digital da primeira página.")
+            make_scanned_page(doc)
+            doc.new_page()
+            data = doc.tobytes()
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(data)
+        self.addCleanup(os.remove, f.name)
+
+        texts, ocr_pages = extract_pages(f.name, 1, 4, fake_ocr, "por")
+        self.assertEqual(ocr_pages, [2])
+        self.assertEqual(texts[2], "texto reconhecido da página 2 (por)")
+        self.assertEqual(texts[3], "")  # blank pages are not OCR candidates, but are reported
+        self.assertEqual(extract_pages(f.name, 2, 3)[0], {2: ""})  # no backend: the scan stays empty
+
+        docs = list(get_pdf_text([("a", "a.pdf", data)], ocr=fake_ocr))
+        self.assertEqual([d.metadata["page"] for d in docs], [1, 2])
+
+    def test_ocr_backend_names(self):
+        self.assertIsNone(get_ocr_backend("none"))
+        self.assertIsNotNone(get_ocr_backend("tesseract"))
+        with self.assertRaisesRegex(ValueError, "tesseract5"):
+            get_ocr_backend("tesseract5")
+        if "LITERAGENT_OCR_BACKEND" not in os.environ:
+            self.assertEqual(OCR_BACKEND, "none")  # OCR is opt-in
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
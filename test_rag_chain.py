@@ -0,0 +1,118 @@
+# test_rag_chain.py
+
+import shutil
+import tempfile
+import unittest
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from answer_cache import AnswerCache
+from rag_chain import build_rag_chain, create_question_rewriter, is_standalone
+from retrieval import HybridRetriever
+from vector_index import create_vector_store
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    """Fake embeddings that count query embeddings."""
+
+    query_calls: int = 0
+
+    def embed_query(self, text):
+        self.query_calls += 1
+        return super().embed_query(text)
+
+
+class TestQuestionRewriting(unittest.TestCase):
+    """Tests for the fast path and memoization of the follow-up question rewrite."""
+
+    def setUp(self):
+        self.rewrites = []
+        self.rewrite_llm = RunnableLambda(lambda prompt: self.rewrites.append(prompt) or AIMessage(content="pergunta reescrita"))
+        self.history = [HumanMessage(content="Quem escreveu Dom Casmurro?"), AIMessage(content="Machado de Assis.")]
+
+    def test_is_standalone(self):
+        self.assertTrue(is_standalone("Quem escreveu o livro Memórias Póstumas de Brás Cubas?"))
+        self.assertFalse(is_standalone("E quando ele nasceu?"))
+        self.assertFalse(is_standalone("Fale mais sobre isso, por favor, com detalhes"))
+        self.assertFalse(is_standalone("Por quê?"))
+
+    def test_skips_rewrite_without_history_or_for_standalone_questions(self):
+        contextualize = create_question_rewriter(self.rewrite_llm)
+
+        self.assertEqual(contextualize({"input": "Por quê?", "chat_history": []}), "Por quê?")
+        question = "Qual é o enredo do romance Quincas Borba?"
+        self.assertEqual(contextualize({"input": question, "chat_history": self.history}), question)
+        self.assertEqual(self.rewrites, [])
+
+    def test_rewrites_follow_ups_once_per_history_and_question(self):
+        contextualize = create_question_rewriter(self.rewrite_llm)
+        inputs = {"input": "E quando ele nasceu?", "chat_history": self.history}
+
+        self.assertEqual(contextualize(inputs), "pergunta reescrita")
+        self.assertEqual(contextualize(dict(inputs)), "pergunta reescrita")
+        self.assertEqual(len(self.rewrites), 1)
+        contextualize({**inputs, "chat_history": self.history + [HumanMessage(content="Outra coisa")]})
+        self.assertEqual(len(self.rewrites), 2)
+
+    def test_chain_retrieves_with_rewritten_question(self):
+        queries = []
+        retriever = RunnableLambda(lambda query: queries.append(query) or [Document(page_content="Nasceu em 1839.")])
+        chain = build_rag_chain(FakeListChatModel(responses=["Em 1839."]), self.rewrite_llm, retriever)
+
+        result = chain.invoke({"input": "E quando ele nasceu?", "chat_history": self.history})
+
+        self.assertEqual(queries, ["pergunta reescrita"])
+        self.assertEqual(result["answer"], "Em 1839.")
+        self.assertEqual(result["context"][0].page_content, "Nasceu em 1839.")
+
+
+class TestAnswerCacheInChain(unittest.TestCase):
+    """Tests for serving repeated questions from the semantic answer cache."""
+
+    def setUp(self):
+        self.queries = []
+        self.seen = set()
+        retriever = RunnableLambda(lambda query: self.queries.append(query) or [Document(page_content="trecho")])
+        self.cache = AnswerCache(threshold=0.99)
+        self.llm = FakeListChatModel(responses=["primeira resposta", "segunda resposta"])
+        self.chain = build_rag_chain(self.llm, RunnableLambda(lambda prompt: AIMessage(content="reescrita")), retriever,
+                                     DeterministicFakeEmbedding(size=16), self.cache, cache_scope=("model", 0.3, 1))
+
+    def ask(self, question):
+        chunks = list(self.chain.stream({"input": question, "chat_history": []}))
+        keys = [key for chunk in chunks for key in chunk]
+        self.assertLess(keys.index("context"), keys.index("answer"))  # sources arrive before the answer tokens
+        self.assertTrue(keys.count("answer") > 1 or question in self.seen)  # streamed, unless served from cache
+        self.seen.add(question)
+        return "".join(chunk.get("answer", "") for chunk in chunks)
+
+    def test_repeated_question_skips_retrieval_and_generation(self):
+        question = "Qual é o tema central do livro Dom Casmurro?"
+        self.assertEqual(self.ask(question), "primeira resposta")
+        self.assertEqual(self.ask(question), "primeira resposta")
+
+        self.assertEqual(len(self.queries), 1)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.ask("Quem são os personagens principais de Dom Casmurro?"), "segunda resposta")
+
+    def test_cache_miss_embeds_the_query_once(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        embeddings = CountingEmbedding(size=16)
+        store = create_vector_store(tmp_dir, [Document(id="c1", page_content="Capitu tinha olhos de ressaca.")], embeddings)
+        self.addCleanup(store.docstore.close)
+        chain = build_rag_chain(self.llm, RunnableLambda(lambda prompt: AIMessage(content="reescrita")),
+                                HybridRetriever(vector_store=store), embeddings, self.cache, cache_scope=("model", 0.3, 1))
+
+        result = chain.invoke({"input": "Quem é Capitu?", "chat_history": []})
+
+        self.assertEqual([doc.id for doc in result["context"]], ["c1"])
+        self.assertEqual(embeddings.query_calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
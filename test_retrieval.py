@@ -0,0 +1,58 @@
+# test_retrieval.py
+
+import shutil
+import tempfile
+import unittest
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from retrieval import HybridRetriever, mmr_select, reciprocal_rank_fusion
+from vector_index import create_vector_store, delete_vectors
+
+
+class TestHybridRetrieval(unittest.TestCase):
+    """Tests for BM25 + vector retrieval with reciprocal-rank fusion and MMR."""
+
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        texts = [f"trecho genérico número {i} sobre literatura brasileira" for i in range(50)]
+        texts[17] = "Capitu tinha olhos de ressaca, segundo José Dias."
+        documents = [Document(id=f"c{i}", page_content=text) for i, text in enumerate(texts)]
+        # Random embeddings: the vector search knows nothing about the text
+        self.store = create_vector_store(tmp_dir, documents, DeterministicFakeEmbedding(size=16))
+
+    def test_keyword_search_finds_exact_names(self):
+        self.assertEqual(self.store.docstore.keyword_search("Quem é Capitu?", 5), ["c17"])
+        # Case and accents are ignored
+        self.assertEqual(self.store.docstore.keyword_search("jose dias", 5), ["c17"])
+
+    def test_keyword_index_follows_deletes(self):
+        delete_vectors(self.store, ["c17"])
+        self.assertEqual(self.store.docstore.keyword_search("Capitu", 5), [])
+
+    def test_hybrid_retriever_returns_keyword_hits_within_k(self):
+        retriever = HybridRetriever(vector_store=self.store, k=3, fetch_k=10)
+        docs = retriever.invoke("olhos de ressaca de Capitu")
+
+        self.assertEqual(len(docs), 3)
+        self.assertIn("c17", [doc.id for doc in docs])
+
+    def test_reciprocal_rank_fusion(self):
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+        self.assertEqual([doc_id for doc_id, _ in fused], ["a", "c", "b"])
+
+    def test_mmr_skips_near_duplicates(self):
+        candidates = [
+            (Document(page_content="o alienista simão bacamarte itaguaí"), 1.0),
+            (Document(page_content="o alienista simão bacamarte itaguaí casa verde"), 0.9),
+            (Document(page_content="dom casmurro bentinho capitu"), 0.8),
+        ]
+        selected = mmr_select(candidates, 2, mmr_lambda=0.5)
+        self.assertEqual([doc.page_content for doc in selected], [candidates[0][0].page_content, candidates[2][0].page_content])
+        self.assertEqual(mmr_select(candidates, 2, mmr_lambda=1.0), [candidates[0][0], candidates[1][0]])
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
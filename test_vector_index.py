@@ -0,0 +1,126 @@
+# test_vector_index.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import vector_index
+from embedding_cache import CachedEmbeddings
+
+
+def random_vectors(count, dimension=16, seed=0):
+    return np.random.default_rng(seed).random((count, dimension), dtype=np.float32)
+
+
+class TestIndexBackends(unittest.TestCase):
+    """Tests for building, upgrading and loading the configurable FAISS backends."""
+
+    def setUp(self):
+        self.embeddings = DeterministicFakeEmbedding(size=16)
+        texts = [f"chunk number {i}" for i in range(800)]
+        self.store = FAISS.from_texts(texts, self.embeddings, ids=[f"id{i}" for i in range(800)])
+
+    def test_build_index_for_every_backend(self):
+        vectors = random_vectors(2000)
+        for backend in vector_index.INDEX_BACKENDS:
+            with self.subTest(backend=backend):
+                index = vector_index.build_index(vectors, backend)
+                self.assertEqual(vector_index.get_index_backend(index), backend)
+                self.assertEqual(index.ntotal, 2000)
+
+    def test_upgrade_only_after_threshold(self):
+        with patch.object(vector_index, "ANN_TRAIN_THRESHOLD", 1000):
+            self.assertFalse(vector_index.maybe_upgrade_index(self.store, "ivf_flat"))
+        with patch.object(vector_index, "ANN_TRAIN_THRESHOLD", 500):
+            self.assertTrue(vector_index.maybe_upgrade_index(self.store, "ivf_flat"))
+
+        self.assertEqual(vector_index.get_index_backend(self.store.index), "ivf_flat")
+        # Positions are preserved, so the docstore mapping still matches
+        doc = self.store.similarity_search("chunk number 7", k=1)[0]
+        self.assertEqual(doc.page_content, "chunk number 7")
+
+    def test_delete_from_hnsw_rebuilds_without_removed_vectors(self):
+        with patch.object(vector_index, "ANN_TRAIN_THRESHOLD", 1):
+            vector_index.maybe_upgrade_index(self.store, "hnsw")
+
+        vector_index.delete_vectors(self.store, ["id7", "id8"])
+
+        self.assertEqual(self.store.index.ntotal, 798)
+        self.assertEqual(len(self.store.index_to_docstore_id), 798)
+        results = [doc.page_content for doc in self.store.similarity_search("chunk number 7", k=3)]
+        self.assertNotIn("chunk number 7", results)
+        doc = self.store.similarity_search("chunk number 9", k=1)[0]
+        self.assertEqual(doc.page_content, "chunk number 9")
+
+    def test_delete_from_ivf_keeps_training_and_mapping(self):
+        with patch.object(vector_index, "ANN_TRAIN_THRESHOLD", 1):
+            vector_index.maybe_upgrade_index(self.store, "ivf_flat")
+        quantizer_before = vector_index.reconstruct_vectors(self.store.index.quantizer)
+
+        vector_index.delete_vectors(self.store, ["id1"])
+        self.store.add_texts(["a brand new chunk"], ids=["new"])
+
+        self.assertEqual(self.store.index.ntotal, 800)
+        np.testing.assert_array_equal(vector_index.reconstruct_vectors(self.store.index.quantizer), quantizer_before)
+        self.assertEqual(self.store.similarity_search("a brand new chunk", k=1)[0].id, "new")
+        self.assertEqual(self.store.similarity_search("chunk number 799", k=1)[0].id, "id799")
+
+    def test_pq_compaction_and_deletes_use_the_original_vectors(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        embeddings = CachedEmbeddings(self.embeddings, "fake", path=os.path.join(tmp_dir, "cache.sqlite"))
+        self.store.embedding_function = embeddings
+        embeddings.embed_documents([doc.page_content for doc in self.store.docstore._dict.values()])
+        with patch.object(vector_index, "ANN_TRAIN_THRESHOLD", 1):
+            vector_index.maybe_upgrade_index(self.store, "ivf_pq")
+        queries = [self.embeddings.embed_query(f"chunk number {i}") for i in range(0, 800, 40)]
+
+        def search():
+            return [[doc.id for doc, _ in self.store.similarity_search_with_score_by_vector(query, k=4)] for query in queries]
+
+        before = search()
+        for _ in range(2):
+            vector_index.rebuild_vector_store_index(self.store, "ivf_pq")
+            self.assertEqual(search(), before)
+
+        vector_index.delete_vectors(self.store, ["id799"])
+        vector_index.delete_vectors(self.store, ["id798"])
+        expected = [[doc_id for doc_id in ids if doc_id not in ("id798", "id799")] for ids in before]
+        self.assertEqual([ids[:len(kept)] for ids, kept in zip(search(), expected)], expected)
+
+    def test_read_only_vector_store_keeps_its_snapshot(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        documents = list(self.store.docstore._dict.values())
+        writer = vector_index.create_vector_store(tmp_dir, documents[:400], self.embeddings)
+        vector_index.write_vector_store(writer, tmp_dir, 1)
+
+        loaded = vector_index.read_vector_store(tmp_dir, self.embeddings, read_only=True)
+        writer.add_documents(documents[400:])
+        vector_index.write_vector_store(writer, tmp_dir, 2)
+
+        self.assertEqual(loaded.index.ntotal, 400)
+        self.assertEqual(len(loaded.index_to_docstore_id), 400)
+        self.assertEqual(loaded.similarity_search("chunk number 3", k=1)[0].page_content, "chunk number 3")
+        self.assertEqual(vector_index.get_index_version(tmp_dir), "index-000002.faiss")
+        self.assertEqual(sorted(name for name in os.listdir(tmp_dir) if name.endswith(".faiss")), ["index-000002.faiss"])
+        reloaded = vector_index.read_vector_store(tmp_dir, self.embeddings, read_only=True)
+        self.assertEqual(reloaded.index.ntotal, 800)
+        self.assertEqual(reloaded.similarity_search("chunk number 799", k=1)[0].id, "id799")
+
+    def test_evaluate_index_against_flat(self):
+        report = vector_index.evaluate_index(random_vectors(3000), "hnsw", k=4, queries=50)
+
+        self.assertEqual(report["vectors"], 3000)
+        self.assertGreater(report["recall_at_k"], 0.8)
+        self.assertEqual(vector_index.evaluate_index(random_vectors(500), "flat", queries=20)["recall_at_k"], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
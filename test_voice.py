@@ -0,0 +1,117 @@
+# test_voice.py
+
+import io
+import threading
+import time
+import unittest
+import wave
+
+import numpy as np
+
+import voice
+from voice import Transcriber, TranscriptionError, preprocess_audio, register_backend
+
+
+def make_wav(segments, rate=48000, channels=2):
+    """Builds a 16-bit WAV from (seconds, amplitude) segments of a 440 Hz tone (0 = silence)."""
+    parts = []
+    for seconds, amplitude in segments:
+        t = np.arange(int(seconds * rate)) / rate
+        parts.append(amplitude * np.sin(2 * np.pi * 440 * t))
+    samples = (np.concatenate(parts) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(np.repeat(samples, channels).tobytes())
+    return buffer.getvalue()
+
+
+def wav_info(wav_bytes):
+    with wave.open(io.BytesIO(wav_bytes)) as wav:
+        return wav.getnchannels(), wav.getframerate(), wav.getnframes() / wav.getframerate()
+
+
+class TestAudioPreprocessing(unittest.TestCase):
+    """Tests for downsampling and silence trimming before upload."""
+
+    def test_downsamples_to_mono_16khz_and_trims_silence(self):
+        audio = make_wav([(1.0, 0), (0.5, 0.5), (2.0, 0), (0.5, 0.5), (1.0, 0)])
+
+        channels, rate, seconds = wav_info(preprocess_audio(audio))
+
+        self.assertEqual((channels, rate), (1, 16000))
+        # 1 s of speech, the 2 s pause shortened to 0.4 s, and 0.2 s kept at each end
+        self.assertAlmostEqual(seconds, 1.0 + 0.4 + 0.4, delta=0.05)
+
+    def test_non_integer_ratio_and_silent_audio(self):
+        _, rate, seconds = wav_info(preprocess_audio(make_wav([(1.0, 0.5)], rate=44100, channels=1)))
+        self.assertEqual(rate, 16000)
+        self.assertAlmostEqual(seconds, 1.0, delta=0.05)
+        self.assertEqual(wav_info(preprocess_audio(make_wav([(1.0, 0)])))[2], 0)
+
+    def test_quiet_recordings_keep_their_speech(self):
+        # Peak around -32 dBFS, over a faint background hiss instead of digital silence
+        speech = make_wav([(1.0, 0.0005), (1.0, 0.025), (1.0, 0.0005)])
+
+        _, _, seconds = wav_info(preprocess_audio(speech))
+        self.assertAlmostEqual(seconds, 1.0 + 0.4, delta=0.05)
+        _, _, seconds = wav_info(preprocess_audio(make_wav([(3.0, 0.025)])))
+        self.assertAlmostEqual(seconds, 3.0, delta=0.05)
+
+
+class TestTranscriber(unittest.TestCase):
+    """Tests for off-thread, memoized transcription with a local backend."""
+
+    def setUp(self):
+        self.calls = []
+        self.release = threading.Event()
+
+        def recognize(wav_bytes, language):
+            self.calls.append((threading.current_thread().name, wav_info(wav_bytes)[1], language))
+            self.release.wait(5)
+            return "quem escreveu dom casmurro"
+
+        register_backend("test", recognize)
+        self.addCleanup(voice.BACKENDS.pop, "test")
+        self.audio = make_wav([(0.2, 0), (0.5, 0.5), (0.2, 0)])
+
+    def test_transcribes_off_the_calling_thread_once_per_audio(self):
+        transcriber = Transcriber(backend="test")
+        first = transcriber.submit(self.audio)
+        second = transcriber.submit(self.audio)  # while the first one is still running
+
+        self.assertFalse(first.done())
+        self.release.set()
+        self.assertEqual(first.result(timeout=5), "quem escreveu dom casmurro")
+        self.assertIs(second, first)
+        self.assertEqual(transcriber.transcribe(self.audio), "quem escreveu dom casmurro")
+
+        self.assertEqual(len(self.calls), 1)
+        thread_name, rate, language = self.calls[0]
+        self.assertTrue(thread_name.startswith("literagent-voice"))
+        self.assertEqual((rate, language), (16000, "pt-BR"))
+        self.assertEqual(transcriber.stats(), {"hits": 2, "misses": 1, "entries": 1})
+
+    def test_failures_are_not_memoized(self):
+        attempts = []
+
+        def flaky(wav_bytes, language):
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise TranscriptionError("offline")
+            return "ok"
+
+        register_backend("flaky", flaky)
+        self.addCleanup(voice.BACKENDS.pop, "flaky")
+        transcriber = Transcriber(backend="flaky")
+
+        with self.assertRaises(TranscriptionError):
+            transcriber.transcribe(self.audio)
+        self.assertEqual(transcriber.transcribe(self.audio), "ok")
+        self.assertEqual(len(attempts), 2)
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
@@ -0,0 +1,315 @@
+# vector_index.py
+
+import argparse
+import math
+import os
+import re
+import time
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from chunk_store import ChunkStore, LazyPositions, published_chunk_store
+
+# --- CONFIGURAÇÃO DO ÍNDICE ---
+# Abaixo de ANN_TRAIN_THRESHOLD chunks o índice plano (busca exata) é sempre usado:
+# é rápido o bastante e não precisa de treino. Acima dele, a sincronização troca o
+# índice pelo backend configurado em LITERAGENT_INDEX_BACKEND.
+INDEX_BACKENDS = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+INDEX_BACKEND = os.getenv("LITERAGENT_INDEX_BACKEND", "flat")
+ANN_TRAIN_THRESHOLD = _env_int("LITERAGENT_ANN_THRESHOLD", 50_000)
+IVF_NPROBE = _env_int("LITERAGENT_IVF_NPROBE", 16)          # listas visitadas por busca
+HNSW_M = _env_int("LITERAGENT_HNSW_M", 32)                  # vizinhos por nó do grafo
+HNSW_EF_SEARCH = _env_int("LITERAGENT_HNSW_EF_SEARCH", 64)  # candidatos avaliados por busca
+
+def get_index_backend(index):
+    """Identifica o backend de um índice FAISS já construído."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+def _ivf_nlist(count):
+    # Regra usual: ~4·√n listas, com pelo menos 39 pontos de treino por lista
+    return max(1, min(int(4 * math.sqrt(count)), count // 39, 65536))
+
+def _pq_subquantizers(dimension):
+    # Um byte por subvetor de 8 dimensões; `m` precisa dividir a dimensão
+    m = max(1, dimension // 8)
+    while dimension % m:
+        m -= 1
+    return m
+
+def configure_index(index):
+    """Aplica os parâmetros de busca do backend (não fazem parte do treino)."""
+    backend = get_index_backend(index)
+    if backend in ("ivf_flat", "ivf_pq"):
+        faiss.extract_index_ivf(index).nprobe = IVF_NPROBE
+    elif backend == "hnsw":
+        faiss.downcast_index(index).hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+def build_index(vectors, backend):
+    """Constrói (e treina, se preciso) um índice do backend pedido com `vectors`, na mesma ordem."""
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Backend de índice desconhecido: {backend}")
+    count, dimension = vectors.shape
+    if backend == "flat" or count == 0:
+        index = faiss.IndexFlatL2(dimension)
+    elif backend == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M)
+    elif backend == "ivf_flat":
+        index = faiss.index_factory(dimension, f"IVF{_ivf_nlist(count)},Flat")
+    else:
+        index = faiss.index_factory(dimension, f"IVF{_ivf_nlist(count)},PQ{_pq_subquantizers(dimension)}")
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return configure_index(index)
+
+def reconstruct_vectors(index):
+    """Lê todos os vetores do índice, na ordem das posições (aproximados no caso do PQ)."""
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        return index.reconstruct_n(0, index.ntotal)
+    ivf.make_direct_map()
+    try:
+        return index.reconstruct_n(0, index.ntotal)
+    finally:
+        # Com o mapa direto em array o IVF não aceita remoções
+        ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+
+def original_vectors(vector_store, positions):
+    """Vetores das `positions` do índice, sem a perda da quantização sempre que possível.
+
+    O PQ guarda só uma aproximação de cada vetor, e retreinar ou preencher o índice de
+    novo a partir dela acumularia erro a cada remoção ou compactação. Por isso, nesse
+    backend, os vetores vêm do cache de embeddings (`cached_documents`, pelo texto de
+    cada chunk); só os que não estão lá são reconstruídos do índice.
+    """
+    vectors = reconstruct_vectors(vector_store.index)[positions]
+    cached_documents = getattr(vector_store.embeddings, "cached_documents", None)
+    if get_index_backend(vector_store.index) != "ivf_pq" or cached_documents is None:
+        return np.ascontiguousarray(vectors)
+    rows, texts = [], []
+    for row, position in enumerate(positions):
+        doc = vector_store.docstore.search(vector_store.index_to_docstore_id[position])
+        if not isinstance(doc, str):
+            rows.append(row)
+            texts.append(doc.page_content)
+    for row, vector in zip(rows, cached_documents(texts)):
+        if vector is not None:
+            vectors[row] = vector
+    return np.ascontiguousarray(vectors)
+
+def rebuild_vector_store_index(vector_store, backend, keep_positions=None):
+    """Substitui o índice do vector store por um recém-treinado, opcionalmente só com `keep_positions`."""
+    if keep_positions is None:
+        keep_positions = list(range(vector_store.index.ntotal))
+    vector_store.index = build_index(original_vectors(vector_store, keep_positions), backend)
+
+def target_backend(count, backend=None):
+    """Backend que um índice com `count` vetores deve usar."""
+    backend = backend or INDEX_BACKEND
+    return backend if count >= ANN_TRAIN_THRESHOLD else "flat"
+
+def maybe_upgrade_index(vector_store, backend=None):
+    """Treina o backend configurado quando o índice cruza o limiar de tamanho.
+
+    Retorna True se o índice foi reconstruído.
+    """
+    wanted = target_backend(vector_store.index.ntotal, backend)
+    if get_index_backend(vector_store.index) == wanted:
+        return False
+    rebuild_vector_store_index(vector_store, wanted)
+    return True
+
+def _refill_index(index, vectors):
+    """Novo índice do mesmo backend contendo apenas `vectors`, aproveitando o treino do atual."""
+    if get_index_backend(index) == "hnsw":
+        return build_index(vectors, "hnsw")
+    refilled = faiss.clone_index(index)
+    refilled.reset()
+    refilled.add(vectors)
+    return configure_index(refilled)
+
+def delete_vectors(vector_store, ids):
+    """Remove os chunks `ids` do vector store, em qualquer backend.
+
+    Só o índice plano renumera as posições ao remover, como o LangChain espera. O IVF
+    mantém os ids antigos (o mapeamento para o docstore sairia do lugar) e o HNSW não
+    suporta remoção; nesses casos o índice é preenchido de novo só com os vetores
+    restantes (os originais, no caso do PQ: ver `original_vectors`), reaproveitando o
+    treino do IVF/PQ.
+    """
+    if get_index_backend(vector_store.index) == "flat":
+        vector_store.delete(ids)
+        return
+    to_delete = set(ids)
+    mapping = vector_store.index_to_docstore_id
+    keep = [pos for pos in sorted(mapping) if mapping[pos] not in to_delete]
+    vector_store.index = _refill_index(vector_store.index, original_vectors(vector_store, keep))
+    vector_store.docstore.delete(list(to_delete))
+    vector_store.index_to_docstore_id = {new_pos: mapping[old_pos] for new_pos, old_pos in enumerate(keep)}
+
+# --- CARREGAMENTO ---
+
+def read_index(path, mmap=False):
+    """Lê um índice FAISS do disco.
+
+    Com `mmap=True` os vetores ficam mapeados em memória, somente leitura: a
+    inicialização não copia o índice e as páginas são carregadas sob demanda.
+    """
+    if mmap:
+        try:
+            return configure_index(faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY))
+        except RuntimeError:
+            pass  # backend ou plataforma sem suporte a mmap: leitura normal
+    return configure_index(faiss.read_index(path))
+
+def index_exists(index_path):
+    return published_chunk_store(index_path) is not None
+
+def get_index_version(index_path):
+    """Nome do arquivo de índice publicado por último, ou None se não houver índice."""
+    if not index_exists(index_path):
+        return None
+    store = ChunkStore.open_published(index_path, read_only=True)
+    try:
+        return store.get_meta("index_file")
+    finally:
+        store.close()
+
+def read_vector_store(index_path, embeddings, read_only=False):
+    """Carrega o vector store de `index_path`.
+
+    Com `read_only=True` (uso da aplicação) o índice é mapeado em memória e tanto o
+    mapeamento posição → chunk quanto os próprios chunks são lidos sob demanda do
+    SQLite, então o tempo de carga não cresce com o acervo. O retrato do chunk store
+    fica fixo, coerente com o arquivo de índice que ele aponta.
+    """
+    store = ChunkStore.open_published(index_path, read_only=read_only)
+    index = read_index(os.path.join(index_path, store.get_meta("index_file")), mmap=read_only)
+    index_to_docstore_id = LazyPositions(store) if read_only else store.load_positions()
+    return FAISS(embeddings, index, store, index_to_docstore_id)
+
+def create_vector_store(index_path, documents, embeddings, vectors=None):
+    """Cria um vector store novo em `index_path` a partir de `documents`, descartando o anterior.
+
+    `vectors`, se informado, traz os embeddings já calculados dos documentos.
+    """
+    os.makedirs(index_path, exist_ok=True)
+    store = ChunkStore.create(index_path)
+    if vectors is None:
+        return FAISS.from_documents(documents, embeddings, docstore=store, index_to_docstore_id={})
+    return FAISS.from_embeddings(zip([doc.page_content for doc in documents], vectors), embeddings,
+                                 metadatas=[doc.metadata for doc in documents], ids=[doc.id for doc in documents],
+                                 docstore=store, index_to_docstore_id={})
+
+def _published_version(index_path):
+    """Maior versão entre os arquivos de índice em `index_path` (0 se não houver nenhum)."""
+    versions = [int(match.group(1)) for match in map(re.compile(r"index-(\d+)\.faiss$").match, os.listdir(index_path))
+                if match]
+    return max(versions, default=0)
+
+def write_vector_store(vector_store, index_path, version):
+    """Grava o índice e publica-o junto com os chunks, em uma única transação do SQLite.
+
+    Cada versão vai para um arquivo novo, gravado em um temporário e renomeado: quem
+    ainda tem a versão anterior mapeada em memória não é afetado. O ponteiro para o
+    arquivo é confirmado na mesma transação que os chunks e as posições.
+
+    A versão gravada nunca repete uma já publicada em `index_path`, mesmo que `version`
+    tenha recomeçado (manifesto descartado, reconstrução do índice): a aplicação
+    reconhece um índice novo pelo nome do arquivo. Retorna a versão usada.
+    """
+    version = max(version, _published_version(index_path) + 1)
+    index_file = f"index-{version:06d}.faiss"
+    tmp_path = os.path.join(index_path, index_file + ".tmp")
+    faiss.write_index(vector_store.index, tmp_path)
+    os.replace(tmp_path, os.path.join(index_path, index_file))
+
+    store = vector_store.docstore
+    store.write_positions(vector_store.index_to_docstore_id)
+    store.set_meta("index_file", index_file)
+    store.commit()
+
+    for name in os.listdir(index_path):
+        if name.endswith(".faiss") and name != index_file:
+            try:
+                os.remove(os.path.join(index_path, name))
+            except OSError:
+                pass  # ainda aberto por outro processo (Windows); sai na próxima gravação
+    return version
+
+# --- AVALIAÇÃO ---
+
+def evaluate_index(vectors, backend, k=4, queries=200, seed=0):
+    """Mede recall@k e latência de um backend contra a busca exata do índice plano.
+
+    As consultas são vetores do próprio corpus com um pouco de ruído, o que
+    aproxima perguntas sobre trechos existentes.
+    """
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), size=min(queries, len(vectors)), replace=False)]
+    sample = (sample + rng.normal(scale=0.01, size=sample.shape)).astype(np.float32)
+
+    def timed_search(index):
+        latencies, results = [], []
+        for query in sample:
+            start = time.perf_counter()
+            _, ids = index.search(query[None, :], k)
+            latencies.append(time.perf_counter() - start)
+            results.append(ids[0])
+        return results, np.array(latencies) * 1000
+
+    build_start = time.perf_counter()
+    candidate = build_index(vectors, backend)
+    build_seconds = time.perf_counter() - build_start
+    exact, flat_ms = timed_search(build_index(vectors, "flat"))
+    approx, ann_ms = timed_search(candidate)
+    recall = np.mean([len(set(a) & set(e)) / k for a, e in zip(approx, exact)])
+    return {
+        "backend": backend,
+        "vectors": len(vectors),
+        "recall_at_k": float(recall),
+        "k": k,
+        "build_seconds": build_seconds,
+        "latency_ms_p50": float(np.percentile(ann_ms, 50)),
+        "latency_ms_p99": float(np.percentile(ann_ms, 99)),
+        "flat_latency_ms_p50": float(np.percentile(flat_ms, 50)),
+        "flat_latency_ms_p99": float(np.percentile(flat_ms, 99)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara os backends de índice com a busca exata sobre o índice atual.")
+    parser.add_argument("--index-path", default="faiss_index")
+    parser.add_argument("--backends", nargs="+", default=list(INDEX_BACKENDS[1:]), choices=INDEX_BACKENDS)
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    index_file = get_index_version(args.index_path)
+    if index_file is None:
+        parser.error(f"Nenhum índice encontrado em {args.index_path}")
+    vectors = reconstruct_vectors(read_index(os.path.join(args.index_path, index_file)))
+    print(f"{len(vectors)} vetores de {vectors.shape[1]} dimensões")
+    print(f"{'backend':<10} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p99 ms':>8} {'plano p50':>10} {'treino s':>9}")
+    for backend in args.backends:
+        r = evaluate_index(vectors, backend, k=args.k, queries=args.queries)
+        print(f"{backend:<10} {r['recall_at_k']:>9.3f} {r['latency_ms_p50']:>8.3f} {r['latency_ms_p99']:>8.3f} "
+              f"{r['flat_latency_ms_p50']:>10.3f} {r['build_seconds']:>9.2f}")
+
+if __name__ == "__main__":
+    main()
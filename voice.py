@@ -0,0 +1,205 @@
+# voice.py
+
+import hashlib
+import io
+import os
+import threading
+import wave
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from metrics import metrics
+
+# speech_recognition só é importado quando alguém grava uma pergunta: a maior parte das
+# sessões nunca usa a voz e não precisa pagar por esse import na inicialização.
+
+# --- CONSTANTES ---
+VOICE_BACKEND = os.getenv("LITERAGENT_VOICE_BACKEND", "google")   # ver BACKENDS
+WHISPER_MODEL = os.getenv("LITERAGENT_WHISPER_MODEL", "base")
+TRANSCRIBE_WORKERS = 2         # transcrições simultâneas
+TRANSCRIPT_CACHE_SIZE = 256    # transcrições memorizadas por hash do áudio
+TARGET_SAMPLE_RATE = 16000     # suficiente para voz; os navegadores gravam a 44,1 ou 48 kHz
+SILENCE_RATIO = 0.1            # trechos com RMS abaixo disso (fração do volume da fala na gravação) são silêncio
+SILENCE_FLOOR = 0.001          # RMS (fração do volume máximo, ~-60 dBFS) abaixo do qual sempre é silêncio
+FRAME_SECONDS = 0.02           # janela da detecção de silêncio
+MAX_PAUSE_SECONDS = 0.4        # silêncio mantido no início, no fim e em cada pausa
+
+class TranscriptionError(Exception):
+    """O serviço de reconhecimento de fala não respondeu."""
+
+def audio_hash(audio_bytes):
+    return hashlib.sha256(audio_bytes).hexdigest()
+
+# --- PRÉ-PROCESSAMENTO ---
+
+def _read_wav(wav_bytes):
+    """Amostras em float32 mono (entre -1 e 1) e a taxa de amostragem de um WAV PCM."""
+    with wave.open(io.BytesIO(wav_bytes)) as wav:
+        channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    else:
+        dtype = {2: np.int16, 4: np.int32}[width]
+        samples = np.frombuffer(frames, dtype=dtype).astype(np.float32) / np.iinfo(dtype).max
+    return samples.reshape(-1, channels).mean(axis=1), rate
+
+def _write_wav(samples, rate):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((np.clip(samples, -1, 1) * 32767).astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+def downsample(samples, rate, target_rate=TARGET_SAMPLE_RATE):
+    """Reduz a taxa de amostragem para `target_rate` (média das amostras ou interpolação linear)."""
+    if rate <= target_rate:
+        return samples, rate
+    if rate % target_rate == 0:
+        factor = rate // target_rate
+        usable = len(samples) - len(samples) % factor
+        return samples[:usable].reshape(-1, factor).mean(axis=1), target_rate
+    positions = np.arange(0, len(samples), rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32), target_rate
+
+def trim_silence(samples, rate, ratio=SILENCE_RATIO, max_pause=MAX_PAUSE_SECONDS):
+    """Corta o silêncio do início e do fim e encurta as pausas longas para `max_pause` segundos.
+
+    O limiar do silêncio é relativo à própria gravação (`ratio` do volume dos trechos
+    mais altos), então um microfone baixo não faz a fala inteira passar por silêncio.
+    Só uma gravação toda abaixo de `SILENCE_FLOOR` volta vazia; se o corte fosse
+    remover todo o resto, o áudio volta sem cortes.
+    """
+    frame = max(1, int(rate * FRAME_SECONDS))
+    count = len(samples) // frame
+    if count == 0:
+        return samples
+    frames = samples[:count * frame].reshape(count, frame)
+    rms = np.sqrt((frames ** 2).mean(axis=1))
+    loudest = np.percentile(rms, 95)  # e não o máximo: um estalo isolado não define o volume da fala
+    if loudest < SILENCE_FLOOR:
+        return samples[:0]
+    voiced = rms >= max(SILENCE_FLOOR, ratio * loudest)
+    if not voiced.any():
+        return samples
+    keep = voiced.copy()
+    pause_frames = int(max_pause / FRAME_SECONDS)
+    silent_run = pause_frames  # o silêncio inicial conta como uma pausa já longa
+    for i in range(count):
+        silent_run = 0 if voiced[i] else silent_run + 1
+        if not voiced[i] and silent_run <= pause_frames // 2:
+            keep[i] = True   # metade da pausa fica depois da fala...
+    silent_run = pause_frames
+    for i in range(count - 1, -1, -1):
+        silent_run = 0 if voiced[i] else silent_run + 1
+        if not voiced[i] and silent_run <= pause_frames // 2:
+            keep[i] = True   # ...e metade antes da próxima
+    return frames[keep].reshape(-1)
+
+def preprocess_audio(wav_bytes, target_rate=TARGET_SAMPLE_RATE):
+    """WAV mono de 16 bits em `target_rate`, sem os silêncios longos: menos dados para enviar e reconhecer."""
+    samples, rate = _read_wav(wav_bytes)
+    samples, rate = downsample(samples, rate, target_rate)
+    return _write_wav(trim_silence(samples, rate), rate)
+
+# --- BACKENDS ---
+# Cada backend recebe os bytes de um WAV e o idioma ("pt-BR") e retorna o texto, ou None
+# se não entendeu a fala. "google" usa o serviço gratuito do Google (rede); "sphinx"
+# (pocketsphinx) e "whisper" (openai-whisper) reconhecem localmente, sem rede, se o
+# pacote correspondente estiver instalado.
+
+def _recognize(wav_bytes, method, **kwargs):
+    import speech_recognition as sr
+
+    recognizer = sr.Recognizer()
+    with sr.AudioFile(io.BytesIO(wav_bytes)) as source:
+        audio = recognizer.record(source)
+    try:
+        return getattr(recognizer, method)(audio, **kwargs)
+    except sr.UnknownValueError:
+        return None
+    except (sr.RequestError, ImportError) as e:
+        raise TranscriptionError(str(e)) from e
+
+def recognize_google(wav_bytes, language):
+    return _recognize(wav_bytes, "recognize_google", language=language)
+
+def recognize_sphinx(wav_bytes, language):
+    return _recognize(wav_bytes, "recognize_sphinx", language=language)
+
+def recognize_whisper(wav_bytes, language):
+    return _recognize(wav_bytes, "recognize_whisper", model=WHISPER_MODEL, language=language.split("-")[0])
+
+BACKENDS = {"google": recognize_google, "sphinx": recognize_sphinx, "whisper": recognize_whisper}
+
+def register_backend(name, recognize):
+    """Disponibiliza `recognize(wav_bytes, language)` como backend `name`."""
+    BACKENDS[name] = recognize
+
+# --- TRANSCRIÇÃO ---
+
+class Transcriber:
+    """Transcreve áudios em um pool de threads, memorizando o resultado pelo hash do áudio.
+
+    `submit` retorna um Future na hora: o script do Streamlit não fica bloqueado
+    esperando a rede. O mesmo áudio (mesmos bytes, idioma e backend) só é transcrito
+    uma vez, mesmo que seja enviado de novo enquanto a primeira transcrição ainda
+    roda. Falhas não são memorizadas.
+    """
+
+    def __init__(self, backend=VOICE_BACKEND, workers=TRANSCRIBE_WORKERS, cache_size=TRANSCRIPT_CACHE_SIZE,
+                 preprocess=True):
+        self.backend = backend
+        self.cache_size = cache_size
+        self.preprocess = preprocess
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="literagent-voice")
+
+    def submit(self, audio_bytes, language="pt-BR"):
+        key = (audio_hash(audio_bytes), language, self.backend)
+        with self._lock:
+            future = self._results.get(key)
+            if future is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                metrics.increment("voice.cache_hits")
+                return future
+            self.misses += 1
+            future = self._executor.submit(self._transcribe, key, audio_bytes, language)
+            self._results[key] = future
+            if len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+        return future
+
+    def transcribe(self, audio_bytes, language="pt-BR"):
+        return self.submit(audio_bytes, language).result()
+
+    def _transcribe(self, key, audio_bytes, language):
+        try:
+            return self._preprocess_and_recognize(audio_bytes, language)
+        except BaseException:
+            # Esquece a falha antes de entregá-la: uma nova tentativa chama o backend de novo
+            with self._lock:
+                self._results.pop(key, None)
+            raise
+
+    def _preprocess_and_recognize(self, audio_bytes, language):
+        if self.preprocess:
+            try:
+                with metrics.timer("voice.preprocess", nbytes=len(audio_bytes)):
+                    audio_bytes = preprocess_audio(audio_bytes)
+            except (wave.Error, EOFError, KeyError):
+                pass  # formato que o pré-processamento não entende: envia o áudio original
+        recognize = BACKENDS[self.backend]
+        with metrics.timer("voice.transcribe", items=1, nbytes=len(audio_bytes)):
+            return recognize(audio_bytes, language)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._results)}